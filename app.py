@@ -1,4 +1,5 @@
 import os
+import multiprocessing
 from app import create_app
 from app.utils.path_utils import setup_resource_directories, get_upload_dir, get_results_dir
 
@@ -6,6 +7,9 @@ from app.utils.path_utils import setup_resource_directories, get_upload_dir, get
 app = create_app()
 
 if __name__ == '__main__':
+    # 打包后的程序中，批量检测任务的工作进程需要由此入口识别
+    multiprocessing.freeze_support()
+    
     # 设置资源目录
     setup_resource_directories()
     
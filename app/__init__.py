@@ -53,7 +53,7 @@ def create_app(test_config=None):
     
     # 初始化日志系统
     log_dir = get_logs_dir()  # 使用新的日志目录
-    from app.yolomodel.logger import ensure_log_dir, get_logger
+    from app.yolomodel.logger import ensure_log_dir, get_logger, configure_logging
     ensure_log_dir(log_dir)   # 确保日志目录存在
     app_logger = get_logger("APP", "info")
     
@@ -118,6 +118,10 @@ def create_app(test_config=None):
                     app.config['ALLOWED_EXTENSIONS'] = set(upload_config.get('allowed_extensions', 
                                                                          ['jpg', 'jpeg', 'png']))
                 
+                # 日志输出方式、轮转和格式
+                if 'logging' in config_data:
+                    configure_logging(config_data)
+                
                 app_logger.info(f"从 {config_path} 加载配置成功")
             except Exception as e:
                 app_logger.error(f"加载配置文件失败: {str(e)}")
@@ -143,7 +147,9 @@ def create_app(test_config=None):
     
     # 初始化扩展
     bootstrap.init_app(app)
-    socketio.init_app(app, cors_allowed_origins="*", async_mode='threading')
+    # 允许通过WebSocket直接发送与HTTP上传同样大小的图像数据
+    socketio.init_app(app, cors_allowed_origins="*", async_mode='threading',
+                      max_http_buffer_size=app.config['MAX_CONTENT_LENGTH'])
     app_logger.info("初始化Flask扩展完成")
     
     # 注册蓝图
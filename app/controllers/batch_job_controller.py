@@ -0,0 +1,63 @@
+"""
+批量检测任务控制器模块
+处理批量检测任务的提交、查询和取消请求
+"""
+from flask import request, jsonify
+from app.services.batch_job_service import (
+    start_batch_job, get_batch_job, list_batch_jobs, cancel_batch_job
+)
+from app.controllers.detection_controller import parse_bool
+
+def handle_start_batch_job(progress_callback=None):
+    """
+    处理提交批量检测任务请求
+    
+    Args:
+        progress_callback: 任务进度回调，由路由层提供（用于Socket.IO推送）
+    """
+    data = request.json
+    if not data:
+        return jsonify({'error': '无效的请求数据'}), 400
+    
+    source = data.get('source')
+    if not source:
+        return jsonify({'error': '必须提供图像目录或通配符'}), 400
+    
+    success, result = start_batch_job(
+        source,
+        model_name=data.get('model'),
+        rule_name=data.get('rule_name'),
+        output=data.get('output') or None,
+        workers=data.get('workers'),
+        batch_size=data.get('batch_size'),
+        coordinate_space=data.get('coordinate_space', 'original'),
+        resume=parse_bool(data.get('resume'), True),
+        progress_callback=progress_callback
+    )
+    
+    if success:
+        return jsonify({'success': True, 'job': result})
+    else:
+        return jsonify({'error': result}), 400
+
+def handle_list_batch_jobs():
+    """处理获取所有批量检测任务请求"""
+    return jsonify({'success': True, 'jobs': list_batch_jobs()})
+
+def handle_get_batch_job(job_id):
+    """处理获取批量检测任务状态请求"""
+    success, result = get_batch_job(job_id)
+    
+    if success:
+        return jsonify({'success': True, 'job': result})
+    else:
+        return jsonify({'error': result}), 404
+
+def handle_cancel_batch_job(job_id):
+    """处理取消批量检测任务请求"""
+    success, message = cancel_batch_job(job_id)
+    
+    if success:
+        return jsonify({'success': True, 'message': message})
+    else:
+        return jsonify({'error': message}), 400
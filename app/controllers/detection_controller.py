@@ -0,0 +1,79 @@
+"""
+检测控制器模块
+处理直接上传图像数据进行检测的路由请求
+"""
+import base64
+from flask import request, jsonify
+from app.utils.file_utils import allowed_file
+from app.services.detection_service import detect_image_bytes
+from app.services.inference_service import get_inference_stats
+
+def parse_bool(value, default=False):
+    """
+    解析请求参数中的布尔值
+
+    Args:
+        value: 参数值（字符串、布尔值或None）
+        default: 参数缺失时的默认值
+
+    Returns:
+        布尔值
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+def handle_detect_image():
+    """
+    处理图像数据检测请求
+
+    支持multipart表单上传(file字段)或直接以请求体发送编码后的图像数据。
+    参数(查询字符串或表单): rule_name、return_image、save_upload、save_result、
+    coordinate_space('canvas'或'original'，默认canvas)
+
+    Returns:
+        包含检测结果的JSON响应，return_image为真时附带base64编码的标注图像
+    """
+    filename = None
+    if 'file' in request.files:
+        file = request.files['file']
+        if file.filename and not allowed_file(file.filename):
+            return jsonify({'error': '不支持的文件类型'}), 400
+        filename = file.filename or None
+        image_bytes = file.read()
+    else:
+        image_bytes = request.get_data()
+
+    if not image_bytes:
+        return jsonify({'error': '没有图像数据'}), 400
+
+    return_image = parse_bool(request.values.get('return_image'))
+    success, result = detect_image_bytes(
+        image_bytes,
+        selected_rule_name=request.values.get('rule_name') or None,
+        return_image=return_image,
+        save_upload=parse_bool(request.values.get('save_upload')),
+        save_result=parse_bool(request.values.get('save_result')),
+        filename=filename,
+        coordinate_space=request.values.get('coordinate_space') or 'canvas'
+    )
+
+    if not success:
+        return jsonify({'error': result}), 400
+
+    # 不渲染模式下没有标注图像
+    if return_image and 'result_image_data' in result:
+        result['result_image_data'] = base64.b64encode(result['result_image_data']).decode('ascii')
+        result['result_image_type'] = 'image/jpeg'
+
+    result['success'] = True
+    return jsonify(result)
+
+def handle_get_inference_stats():
+    """处理获取推理执行器统计信息请求"""
+    try:
+        return jsonify({'success': True, 'stats': get_inference_stats()})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
@@ -3,7 +3,9 @@
 处理与逻辑规则相关的路由请求
 """
 from flask import request, jsonify, current_app
-from app.services.logic_service import get_logic_rules, save_logic_rule, delete_logic_rule, validate_detection_results
+from app.services.logic_service import (
+    get_logic_rules, save_logic_rule, delete_logic_rule, validate_detection_results, validate_detection_batch
+)
 
 def handle_get_logic_rules():
     """
@@ -174,3 +176,47 @@ def handle_validate_detection():
             'success': False,
             'message': f"验证失败: {str(e)}"
         }), 500
+
+def handle_validate_detection_batch():
+    """
+    处理批量验证检测结果的请求
+    
+    请求体为多帧检测结果的数组（或包含frames数组的对象），每帧为检测结果数组或包含detections的对象
+    
+    Returns:
+        JSON响应: 汇总结果和每帧的验证结果
+    """
+    try:
+        rule_name = request.args.get('rule_name')
+        data = request.json
+        
+        if not rule_name:
+            return jsonify({
+                'success': False,
+                'message': "规则名称不能为空"
+            }), 400
+            
+        frames = data.get('frames') if isinstance(data, dict) else data
+        if not isinstance(frames, list):
+            return jsonify({
+                'success': False,
+                'message': "检测结果数据无效"
+            }), 400
+            
+        success, result = validate_detection_batch(frames, rule_name)
+        if not success:
+            return jsonify({
+                'success': False,
+                'message': result
+            }), 404 if "未找到" in result else 400
+            
+        return jsonify({
+            'success': True,
+            'data': result
+        })
+    except Exception as e:
+        current_app.logger.error(f"批量验证检测结果失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f"验证失败: {str(e)}"
+        }), 500
@@ -0,0 +1,17 @@
+"""
+指标控制器模块
+导出检测流程各阶段的耗时统计
+"""
+from flask import jsonify, Response
+from app.yolomodel.metrics import get_registry
+
+# Prometheus文本格式的内容类型
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def handle_prometheus_metrics():
+    """处理Prometheus抓取请求，返回各阶段耗时直方图和分位数"""
+    return Response(get_registry().render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+def handle_get_metrics_summary():
+    """处理获取各阶段耗时汇总(p50/p95/p99)请求"""
+    return jsonify({'success': True, 'stages': get_registry().get_summary()})
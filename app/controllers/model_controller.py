@@ -2,21 +2,20 @@
 模型控制器模块
 处理与模型相关的路由请求
 """
-from flask import request, jsonify, current_app
-import os
+from flask import request, jsonify
 from app.services.model_service import (
     get_config, get_models, add_model, 
     delete_model as service_delete_model, 
-    set_current_model as service_set_current_model
+    set_current_model as service_set_current_model,
+    get_batching_stats, get_model_runtime, warm_model_cache,
+    get_registry_stats
 )
 
 def handle_get_config():
     """处理获取配置文件请求"""
-    config_path = os.path.join(current_app.config['ROOT_DIR'], 'config.json')
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = get_config()
-            return jsonify(config)
+        config = get_config()
+        return jsonify(config)
     except Exception as e:
         return jsonify({'error': f'无法读取配置文件: {str(e)}'}), 500
 
@@ -38,11 +37,13 @@ def handle_add_model():
     path = data.get('path')
     model_type = data.get('type')
     description = data.get('description', '')
+    runtime = data.get('runtime')
+    postprocess = data.get('postprocess')
     
     if not name or not path:
         return jsonify({'error': '模型名称和路径为必填项'}), 400
     
-    success, result = add_model(name, path, model_type, description)
+    success, result = add_model(name, path, model_type, description, runtime, postprocess)
     
     if success:
         return jsonify({'success': True, 'model': result})
@@ -78,3 +79,36 @@ def handle_set_current_model():
         })
     else:
         return jsonify({'error': result}), 500
+
+def handle_get_batching_stats():
+    """处理获取微批处理统计信息请求"""
+    stats = get_batching_stats()
+    
+    if stats is None:
+        return jsonify({'error': '检测器未初始化，请先加载模型'}), 404
+    return jsonify({'success': True, 'stats': stats})
+
+def handle_get_model_runtime(model_name):
+    """处理获取模型运行时设置请求"""
+    success, result = get_model_runtime(model_name)
+    
+    if success:
+        return jsonify({'success': True, 'runtime': result})
+    else:
+        return jsonify({'error': result}), 404
+
+def handle_warm_model_cache():
+    """处理预热优化模型缓存请求"""
+    try:
+        results = warm_model_cache()
+        success = all(r['status'] != 'error' for r in results)
+        return jsonify({'success': success, 'results': results})
+    except Exception as e:
+        return jsonify({'error': f'预热模型缓存失败: {str(e)}'}), 500
+
+def handle_get_registry_stats():
+    """处理获取模型注册表统计信息请求"""
+    try:
+        return jsonify({'success': True, 'stats': get_registry_stats()})
+    except Exception as e:
+        return jsonify({'error': f'无法获取模型注册表信息: {str(e)}'}), 500
@@ -3,9 +3,20 @@ Socket控制器模块
 处理WebSocket通信相关的逻辑
 """
 import os
+import base64
 from flask import current_app
-from app.services.model_service import get_config, set_current_model, get_detector
-from app.services.detection_service import detect_objects
+from app.services.model_service import ensure_current_model_loaded
+from app.services.detection_service import (
+    detect_objects, detect_image_bytes, detect_image_packed, forget_packed_client
+)
+from app.services.stream_service import subscribe_stream, unsubscribe_stream, unsubscribe_client
+from app.services.logic_service import update_rule_state, reset_rule_states
+from app.services.inference_service import submit_inference, cancel_client_inference
+from app.controllers.detection_controller import parse_bool
+from app.utils.frame_protocol import parse_protocol_version
+from app.yolomodel.logger import get_logger
+
+logger = get_logger("APP")
 
 def handle_connect():
     """
@@ -14,49 +25,104 @@ def handle_connect():
     Returns:
         连接状态信息
     """
-    print('客户端已连接')
+    logger.info('客户端已连接')
     message = {'status': 'connected'}
     
-    # 尝试在连接时自动加载当前模型
+    # 确保当前模型已加载（已加载且模型文件未变化时直接复用，不会重新加载）
     try:
-        config = get_config()
-        current_model_name = config.get('model', {}).get('current_model')
+        success, result, detector = ensure_current_model_loaded()
         
-        if current_model_name:
-            print(f"尝试自动加载模型: {current_model_name}")
-            success, result, detector = set_current_model(current_model_name)
-            
-            if success:
-                print(f"自动加载模型成功: {current_model_name}")
-                message['model_loaded'] = {
-                    'success': True,
-                    'model': result,
-                    'message': f'已自动加载模型: {current_model_name}'
-                }
-            else:
-                print(f"自动加载模型失败: {result}")
-                message['model_error'] = {'error': result}
+        if success:
+            message['model_loaded'] = {
+                'success': True,
+                'model': result,
+                'message': f"已自动加载模型: {result['name']}"
+            }
+        elif result:
+            logger.warning(f"自动加载模型失败: {result}")
+            message['model_error'] = {'error': result}
     except Exception as e:
-        print(f"检查当前模型配置失败: {str(e)}")
+        logger.error(f"检查当前模型配置失败: {str(e)}")
         message['error'] = str(e)
     
     return message
 
-def handle_disconnect():
-    """处理WebSocket断开连接"""
-    print('客户端断开连接')
+def handle_disconnect(client_id=None):
+    """
+    处理WebSocket断开连接
+    
+    Args:
+        client_id: 客户端会话ID，用于取消该客户端等待中的检测请求和视频源订阅
+    """
+    logger.info('客户端断开连接', client_id=client_id)
+    if client_id is not None:
+        cancel_client_inference(client_id)
+        unsubscribe_client(client_id)
+        forget_packed_client(client_id)
+        reset_rule_states(client_id)
     return {'status': 'disconnected'}
 
-def handle_detect(data):
+def submit_detection(client_id, request_id, func, deliver):
+    """
+    将检测请求提交到推理执行器，结果、丢弃和拒绝都通过deliver回调通知
+    
+    Args:
+        client_id: 客户端会话ID
+        request_id: 客户端提供的请求ID
+        func: 执行检测的无参函数，返回结果字典
+        deliver: 通知回调，参数为(类型, 数据)，类型为'result'、'dropped'、'busy'或'rule_state'
+    """
+    def on_result(result, timing):
+        if isinstance(result, Exception):
+            result = {'error': f'检测过程中出错: {str(result)}', 'request_id': request_id}
+        transition = result.pop('rule_state', None)
+        # 排队等待时间和检测耗时分开返回
+        result.update(timing)
+        deliver('result', result)
+        if transition is not None:
+            deliver('rule_state', transition)
+    
+    def on_dropped(dropped_request_id, reason):
+        deliver('dropped', {'request_id': dropped_request_id, 'reason': reason})
+    
+    if not submit_inference(client_id, func, on_result, on_dropped, request_id):
+        deliver('busy', {'request_id': request_id, 'error': '服务器繁忙，请稍后重试'})
+
+def handle_detect(data, client_id, deliver):
     """
-    处理目标检测请求
+    处理目标检测请求，同一客户端只保留最新一个等待中的请求
     
     Args:
         data: 包含检测请求信息的字典
+        client_id: 客户端会话ID
+        deliver: 通知回调，参数为(类型, 数据)，由路由层提供
+    """
+    submit_detection(client_id, data.get('request_id'), lambda: process_detect(data, client_id), deliver)
+
+def handle_detect_image(data, client_id, deliver):
+    """
+    处理直接发送图像数据的目标检测请求，同一客户端只保留最新一个等待中的请求
+    
+    Args:
+        data: 包含图像数据和检测参数的字典，见process_detect_image
+        client_id: 客户端会话ID
+        deliver: 通知回调，参数为(类型, 数据)，由路由层提供
+    """
+    submit_detection(client_id, data.get('request_id'),
+                     lambda: process_detect_image(data, client_id), deliver)
+
+def process_detect(data, client_id=None):
+    """
+    执行目标检测请求
+    
+    Args:
+        data: 包含检测请求信息的字典，track_rule为真时在该客户端的连续请求上跟踪规则状态
+        client_id: 客户端会话ID
         
     Returns:
         检测结果或错误信息
     """
+    request_id = data.get('request_id')
     image_path = data.get('image_path', '')
     selected_rule_name = data.get('rule_name', None)  # 获取选中的规则名称
     
@@ -65,11 +131,137 @@ def handle_detect(data):
     
     if success:
         # 添加规则名称到结果中，以便前端知道使用了哪个规则
-        return {
+        result = {
             'success': True,
             'results': results,
             'result_image': result_url,
-            'rule_name': selected_rule_name
+            'rule_name': selected_rule_name,
+            'request_id': request_id
         }
+        track_rule_state(data, client_id, result)
+        return result
+    else:
+        return {'error': results, 'request_id': request_id}
+
+def process_detect_image(data, client_id=None):
+    """
+    执行直接发送图像数据的目标检测请求
+    
+    Args:
+        data: 包含image(二进制数据或base64字符串)、rule_name、return_image、
+              save_upload、save_result、coordinate_space和可选request_id的字典；
+              protocol为二进制帧协议版本时结果按该协议打包，缺省时返回JSON结果；
+              track_rule为真时在该客户端的连续请求上跟踪规则状态（仅JSON结果）
+        client_id: 客户端会话ID，二进制结果中每个模型的类别名称只向同一客户端发送一次
+        
+    Returns:
+        检测结果或错误信息，return_image为真时result_image_data为标注图像的二进制数据；
+        二进制结果包含协议版本字段v
+    """
+    request_id = data.get('request_id')
+    image_data = data.get('image')
+    
+    try:
+        protocol = parse_protocol_version(data.get('protocol'))
+    except ValueError as e:
+        return {'error': str(e), 'request_id': request_id}
+    
+    # 兼容base64字符串和data URL
+    if isinstance(image_data, str):
+        try:
+            image_data = base64.b64decode(image_data.split(',', 1)[-1])
+        except Exception:
+            return {'error': '无法解析base64图像数据', 'request_id': request_id}
+    
+    selected_rule_name = data.get('rule_name', None)
+    if protocol is not None:
+        # 二进制结果不在磁盘上保存上传图像和结果图像
+        success, result = detect_image_packed(
+            image_data,
+            selected_rule_name=selected_rule_name,
+            return_image=parse_bool(data.get('return_image')),
+            coordinate_space=data.get('coordinate_space') or 'canvas',
+            client_id=client_id
+        )
+        if success:
+            result['success'] = True
+            result['request_id'] = request_id
+            return result
+        else:
+            return {'error': result, 'request_id': request_id}
+    
+    success, result = detect_image_bytes(
+        image_data,
+        selected_rule_name=selected_rule_name,
+        return_image=parse_bool(data.get('return_image')),
+        save_upload=parse_bool(data.get('save_upload')),
+        save_result=parse_bool(data.get('save_result')),
+        filename=data.get('filename'),
+        coordinate_space=data.get('coordinate_space') or 'canvas'
+    )
+    
+    if success:
+        result['success'] = True
+        result['request_id'] = request_id
+        track_rule_state(data, client_id, result)
+        return result
+    else:
+        return {'error': result, 'request_id': request_id}
+
+def track_rule_state(data, client_id, result):
+    """
+    请求带有track_rule时用本次检测结果更新客户端的规则状态，状态变化时放入结果的rule_state字段，
+    由submit_detection作为单独的rule_state事件发送
+    
+    Args:
+        data: 检测请求字典
+        client_id: 客户端会话ID
+        result: 检测结果字典
+    """
+    rule_name = data.get('rule_name')
+    if client_id is None or not rule_name or not parse_bool(data.get('track_rule')):
+        return
+    transition = update_rule_state(client_id, rule_name, result['results'])
+    if transition is not None:
+        result['rule_state'] = {'request_id': result.get('request_id'), **transition}
+
+def handle_subscribe_stream(data, client_id):
+    """
+    处理订阅服务端视频源检测结果的请求
+    
+    Args:
+        data: 包含source_id的字典
+        client_id: 客户端会话ID
+        
+    Returns:
+        订阅信息(包含需要加入的房间名)或错误信息
+    """
+    source_id = data.get('source_id')
+    if not source_id:
+        return {'error': '必须提供视频源ID'}
+    
+    success, result = subscribe_stream(source_id, client_id)
+    if success:
+        result['success'] = True
+        return result
+    else:
+        return {'error': result, 'source_id': source_id}
+
+def handle_unsubscribe_stream(data, client_id):
+    """
+    处理取消订阅视频源的请求
+    
+    Args:
+        data: 包含source_id的字典
+        client_id: 客户端会话ID
+        
+    Returns:
+        订阅信息(包含需要离开的房间名)或错误信息
+    """
+    source_id = data.get('source_id')
+    success, result = unsubscribe_stream(source_id, client_id)
+    if success:
+        result['success'] = True
+        return result
     else:
-        return {'error': results}
+        return {'error': result, 'source_id': source_id}
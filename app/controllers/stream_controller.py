@@ -0,0 +1,92 @@
+"""
+视频流控制器模块
+处理服务端视频源的启动、停止和状态查询请求
+"""
+import math
+from flask import request, jsonify, Response
+from app.services.stream_service import (
+    start_stream, stop_stream, get_stream, list_streams, open_stream_viewer
+)
+from app.services.video_source import MJPEG_BOUNDARY
+from app.controllers.detection_controller import parse_bool
+
+def handle_start_stream(result_callback=None, status_callback=None, rule_callback=None):
+    """
+    处理启动视频源请求
+    
+    Args:
+        result_callback: 检测结果回调，由路由层提供（用于Socket.IO推送）
+        status_callback: 状态变化回调，由路由层提供
+        rule_callback: 规则通过状态变化回调，由路由层提供
+    """
+    data = request.json
+    if not data:
+        return jsonify({'error': '无效的请求数据'}), 400
+    
+    source = data.get('source')
+    if source is None or source == '':
+        return jsonify({'error': '必须提供视频文件路径、流地址或设备编号'}), 400
+    
+    realtime = data.get('realtime')
+    success, result = start_stream(
+        source,
+        source_id=data.get('source_id'),
+        rule_name=data.get('rule_name'),
+        coordinate_space=data.get('coordinate_space') or 'canvas',
+        loop=parse_bool(data.get('loop')),
+        realtime=None if realtime is None else parse_bool(realtime),
+        result_callback=result_callback,
+        status_callback=status_callback,
+        rule_callback=rule_callback
+    )
+    
+    if success:
+        return jsonify({'success': True, 'stream': result})
+    else:
+        return jsonify({'error': result}), 400
+
+def handle_list_streams():
+    """处理获取所有视频源请求"""
+    return jsonify({'success': True, 'streams': list_streams()})
+
+def handle_get_stream(source_id):
+    """处理获取视频源状态请求"""
+    success, result = get_stream(source_id)
+    
+    if success:
+        return jsonify({'success': True, 'stream': result})
+    else:
+        return jsonify({'error': result}), 404
+
+def handle_stop_stream(source_id):
+    """处理停止视频源请求"""
+    success, result = stop_stream(source_id)
+    
+    if success:
+        return jsonify({'success': True, 'stream': result})
+    else:
+        return jsonify({'error': result}), 400
+
+def handle_stream_mjpeg(source_id):
+    """
+    处理观看视频源标注画面的请求
+    
+    以multipart/x-mixed-replace推送内存中编码的JPEG帧，可选查询参数fps限制该观看者的帧率
+    """
+    max_fps = None
+    fps = request.args.get('fps')
+    if fps is not None:
+        try:
+            max_fps = float(fps)
+        except ValueError:
+            max_fps = 0.0
+        if not math.isfinite(max_fps) or max_fps <= 0:
+            return jsonify({'error': 'fps 必须是正数'}), 400
+    
+    success, result = open_stream_viewer(source_id, max_fps)
+    
+    if not success:
+        return jsonify({'error': result}), 404
+    
+    return Response(result, mimetype=f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}',
+                    headers={'Cache-Control': 'no-cache, no-store', 'X-Accel-Buffering': 'no'})
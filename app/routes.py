@@ -1,12 +1,13 @@
 from flask import Blueprint, render_template, request, jsonify, current_app
-from flask_socketio import emit
+from flask_socketio import emit, join_room, leave_room
 import os
 from app import socketio
 
 # 导入控制器模块
 from app.controllers.model_controller import (
     handle_get_config, handle_get_models, handle_add_model,
-    handle_delete_model, handle_set_current_model
+    handle_delete_model, handle_set_current_model, handle_get_batching_stats,
+    handle_get_model_runtime, handle_warm_model_cache, handle_get_registry_stats
 )
 from app.controllers.roi_controller import (
     handle_get_roi_configs, handle_save_roi_configs,
@@ -14,14 +15,28 @@ from app.controllers.roi_controller import (
     handle_get_roi_config_detail
 )
 from app.controllers.file_controller import handle_upload_file
+from app.controllers.detection_controller import handle_detect_image, handle_get_inference_stats
+from app.controllers.metrics_controller import handle_prometheus_metrics, handle_get_metrics_summary
+from app.controllers.batch_job_controller import (
+    handle_start_batch_job, handle_list_batch_jobs,
+    handle_get_batch_job, handle_cancel_batch_job
+)
+from app.controllers.stream_controller import (
+    handle_start_stream, handle_list_streams, handle_get_stream, handle_stop_stream,
+    handle_stream_mjpeg
+)
 from app.controllers.logic_controller import (
     handle_get_logic_rules, handle_save_logic_rule, handle_delete_logic_rule,
-    handle_validate_detection  # 添加验证检测结果处理函数
+    handle_validate_detection,  # 添加验证检测结果处理函数
+    handle_validate_detection_batch
 )
 from app.controllers.socket_controller import (
     handle_connect as socket_handle_connect,
     handle_disconnect as socket_handle_disconnect,
-    handle_detect as socket_handle_detect
+    handle_detect as socket_handle_detect,
+    handle_detect_image as socket_handle_detect_image,
+    handle_subscribe_stream as socket_handle_subscribe_stream,
+    handle_unsubscribe_stream as socket_handle_unsubscribe_stream
 )
 
 # 创建蓝图
@@ -89,6 +104,26 @@ def set_current_model():
     
     return result
 
+@bp.route('/api/models/<model_name>/runtime', methods=['GET'])
+def get_model_runtime(model_name):
+    """获取指定模型的ONNX Runtime会话设置"""
+    return handle_get_model_runtime(model_name)
+
+@bp.route('/api/models/cache/warm', methods=['POST'])
+def warm_model_cache():
+    """为所有模型预热优化模型缓存"""
+    return handle_warm_model_cache()
+
+@bp.route('/api/models/registry', methods=['GET'])
+def get_registry_stats():
+    """获取已加载模型注册表的命中、淘汰和加载耗时统计"""
+    return handle_get_registry_stats()
+
+@bp.route('/api/models/batching-stats', methods=['GET'])
+def get_batching_stats():
+    """获取微批处理队列深度和批次大小分布"""
+    return handle_get_batching_stats()
+
 @bp.route('/upload', methods=['POST'])
 def upload_file():
     """
@@ -99,6 +134,94 @@ def upload_file():
     """
     return handle_upload_file()
 
+@bp.route('/api/inference/stats', methods=['GET'])
+def get_inference_stats():
+    """获取WebSocket检测请求的并发、排队等待时间和推理时间统计"""
+    return handle_get_inference_stats()
+
+@bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """以Prometheus文本格式导出检测流程各阶段的耗时，按模型名称和输入分辨率分组"""
+    return handle_prometheus_metrics()
+
+@bp.route('/api/metrics', methods=['GET'])
+def get_metrics_summary():
+    """获取检测流程各阶段耗时的p50/p95/p99汇总"""
+    return handle_get_metrics_summary()
+
+@bp.route('/api/detect', methods=['POST'])
+def detect_image():
+    """
+    直接上传图像数据进行检测，默认不在磁盘上保存上传图像和结果图像
+    
+    Returns:
+        包含检测结果的JSON响应
+    """
+    return handle_detect_image()
+
+def broadcast_batch_job_progress(status):
+    """通过socketio向所有客户端推送批量检测任务进度"""
+    socketio.emit('batch_job_progress', status)
+
+@bp.route('/api/batch-jobs', methods=['POST'])
+def start_batch_job():
+    """提交批量检测任务，进度通过batch_job_progress事件推送"""
+    return handle_start_batch_job(progress_callback=broadcast_batch_job_progress)
+
+@bp.route('/api/batch-jobs', methods=['GET'])
+def list_batch_jobs():
+    """获取所有批量检测任务的状态"""
+    return handle_list_batch_jobs()
+
+@bp.route('/api/batch-jobs/<job_id>', methods=['GET'])
+def get_batch_job(job_id):
+    """获取批量检测任务的进度和吞吐量"""
+    return handle_get_batch_job(job_id)
+
+@bp.route('/api/batch-jobs/<job_id>/cancel', methods=['POST'])
+def cancel_batch_job(job_id):
+    """取消批量检测任务，可以重新提交从检查点继续"""
+    return handle_cancel_batch_job(job_id)
+
+def broadcast_stream_detections(room, payload):
+    """通过socketio向订阅视频源的客户端推送检测结果"""
+    socketio.emit('stream_detections', payload, to=room)
+
+def broadcast_stream_status(status):
+    """通过socketio向所有客户端推送视频源状态变化（启动、结束、失败）"""
+    socketio.emit('stream_status', status)
+
+def broadcast_rule_state(room, payload):
+    """向订阅视频源的客户端推送规则通过状态的变化"""
+    socketio.emit('rule_state', payload, to=room)
+
+@bp.route('/api/streams', methods=['POST'])
+def start_stream():
+    """启动服务端视频源，检测结果通过stream_detections事件推送给订阅的客户端"""
+    return handle_start_stream(result_callback=broadcast_stream_detections,
+                               status_callback=broadcast_stream_status,
+                               rule_callback=broadcast_rule_state)
+
+@bp.route('/api/streams', methods=['GET'])
+def list_streams():
+    """获取所有视频源的状态和统计信息"""
+    return handle_list_streams()
+
+@bp.route('/api/streams/<source_id>', methods=['GET'])
+def get_stream(source_id):
+    """获取视频源的帧率、丢帧数量和端到端延迟"""
+    return handle_get_stream(source_id)
+
+@bp.route('/api/streams/<source_id>/mjpeg', methods=['GET'])
+def stream_mjpeg(source_id):
+    """以MJPEG推送视频源的标注画面，可直接作为<img>的src"""
+    return handle_stream_mjpeg(source_id)
+
+@bp.route('/api/streams/<source_id>/stop', methods=['POST'])
+def stop_stream(source_id):
+    """停止视频源"""
+    return handle_stop_stream(source_id)
+
 @bp.route('/api/roi-configs', methods=['GET'])
 def get_roi_configs():
     """获取所有ROI配置"""
@@ -144,6 +267,11 @@ def validate_detection():
     """验证检测结果"""
     return handle_validate_detection()
 
+@bp.route('/api/validate-detection/batch', methods=['POST'])
+def validate_detection_batch():
+    """批量验证多帧检测结果"""
+    return handle_validate_detection_batch()
+
 @socketio.on('connect')
 def handle_connect():
     """处理新的WebSocket连接"""
@@ -160,19 +288,79 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """处理WebSocket断开连接"""
-    socket_handle_disconnect()
+    socket_handle_disconnect(request.sid)
+
+def get_client_deliver(sid):
+    """
+    创建向指定客户端发送检测通知的回调，检测在推理执行器线程中完成后调用
+    
+    Args:
+        sid: 客户端会话ID
+    """
+    def deliver(kind, payload):
+        if kind == 'busy':
+            event = 'server_busy'
+        elif kind == 'dropped':
+            event = 'detection_dropped'
+        elif kind == 'rule_state':
+            event = 'rule_state'
+        elif 'success' in payload and payload['success']:
+            # 按二进制帧协议打包的结果使用单独的事件，JSON结果保持不变
+            event = 'detection_packed' if 'v' in payload else 'detection_results'
+        else:
+            event = 'detection_error'
+        socketio.emit(event, payload, to=sid)
+    return deliver
 
 @socketio.on('detect')
 def handle_detect(data):
     """
-    处理目标检测的WebSocket事件
+    处理目标检测的WebSocket事件，检测在推理执行器中排队执行
     
     Args:
         data: 包含检测请求信息的字典
     """
-    result = socket_handle_detect(data)
+    socket_handle_detect(data or {}, request.sid, get_client_deliver(request.sid))
+
+@socketio.on('detect_image')
+def handle_detect_image_event(data):
+    """
+    处理直接发送图像数据的目标检测WebSocket事件，检测在推理执行器中排队执行
+    
+    Args:
+        data: 包含图像数据和检测参数的字典，protocol指定二进制帧协议版本时
+              结果通过detection_packed事件返回
+    """
+    socket_handle_detect_image(data or {}, request.sid, get_client_deliver(request.sid))
+
+@socketio.on('subscribe_stream')
+def handle_subscribe_stream(data):
+    """
+    订阅服务端视频源的检测结果
+    
+    Args:
+        data: 包含source_id的字典
+    """
+    result = socket_handle_subscribe_stream(data or {}, request.sid)
+    
+    if 'success' in result and result['success']:
+        join_room(result['room'])
+        emit('stream_subscribed', result)
+    else:
+        emit('stream_error', result)
+
+@socketio.on('unsubscribe_stream')
+def handle_unsubscribe_stream(data):
+    """
+    取消订阅服务端视频源
+    
+    Args:
+        data: 包含source_id的字典
+    """
+    result = socket_handle_unsubscribe_stream(data or {}, request.sid)
     
     if 'success' in result and result['success']:
-        emit('detection_results', result)
+        leave_room(result['room'])
+        emit('stream_unsubscribed', result)
     else:
-        emit('detection_error', result)
+        emit('stream_error', result)
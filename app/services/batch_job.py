@@ -0,0 +1,572 @@
+"""
+批量检测任务模块
+遍历目录或通配符匹配的图像，分发给多个工作进程执行检测（每个进程持有自己的YOLODetector），
+结果逐行写入JSONL文件，并通过检查点文件支持中断后从停止处继续。
+
+该模块不依赖Flask应用上下文，可以直接通过命令行运行：
+    python -m app.services.batch_job <目录或通配符> --model <模型名称> [--rule <规则名称>]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import cv2
+import numpy as np
+
+from app.services.rule_compiler import compile_logic_rule
+from app.yolomodel.logger import get_logger
+
+logger = get_logger("APP")
+
+# 进度回调失败时同一任务的错误日志最短间隔(秒)
+_ERROR_LOG_INTERVAL = 5.0
+
+# 支持的图像扩展名
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# 默认的批量任务配置(config.json中的batch_job字段)
+DEFAULT_BATCH_JOB_CONFIG = {
+    'workers': 2,
+    'chunk_size': 32,
+    'batch_size': 8,
+    'decode_threads': 2,
+    'progress_interval': 1.0
+}
+
+# 任务状态
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_CANCELLED = 'cancelled'
+JOB_FAILED = 'failed'
+
+
+def get_batch_job_settings(config, overrides=None):
+    """
+    合并默认值、配置文件和调用参数中的批量任务设置
+
+    Args:
+        config: 配置字典
+        overrides: 调用方指定的设置，值为None的项被忽略
+
+    Returns:
+        设置字典
+    """
+    settings = dict(DEFAULT_BATCH_JOB_CONFIG)
+    settings.update(config.get('batch_job', {}))
+    if overrides:
+        settings.update({k: v for k, v in overrides.items() if v is not None})
+
+    for key in ('workers', 'chunk_size', 'batch_size', 'decode_threads'):
+        value = settings[key]
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f"{key} 必须是正整数")
+    return settings
+
+
+def list_images(source):
+    """
+    列出任务的输入图像
+
+    Args:
+        source: 目录（递归遍历）、通配符（支持**）或单个图像文件
+
+    Returns:
+        排序后的图像路径列表
+    """
+    if glob.has_magic(source):
+        paths = [p for p in glob.glob(source, recursive=True) if os.path.isfile(p)]
+    elif os.path.isdir(source):
+        paths = []
+        for dirpath, _, filenames in os.walk(source):
+            paths.extend(os.path.join(dirpath, name) for name in filenames)
+    elif os.path.isfile(source):
+        paths = [source]
+    else:
+        raise ValueError(f"输入路径不存在: {source}")
+
+    return sorted(os.path.abspath(p) for p in paths if p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def build_job_spec(config, model_name, rule_name, root_dir, cache_dir=None, batch_size=8,
+                   coordinate_space='original'):
+    """
+    根据配置生成工作进程所需的任务描述（只包含可序列化的数据）
+
+    Args:
+        config: 配置字典
+        model_name: 模型名称，为None时使用规则指定的模型或当前模型
+        rule_name: 逻辑规则名称，可选
+        root_dir: 解析相对模型路径的根目录
+        cache_dir: 优化模型缓存目录
+        batch_size: 每次推理的图像数量
+        coordinate_space: 结果中检测框的坐标系，'original'或'canvas'
+
+    Returns:
+        任务描述字典
+
+    Raises:
+        ValueError: 模型或规则不存在，或规则无效
+    """
+    rule = None
+    roi_config = None
+    if rule_name:
+        rule = config.get('logic_rules', {}).get(rule_name)
+        if rule is None:
+            raise ValueError(f"规则配置 '{rule_name}' 不存在")
+        # 提前编译，规则无效时在提交任务前报错
+        compile_logic_rule(rule)
+        roi_config = config.get('roi_configs', {}).get(rule.get('roi_config'))
+        model_name = model_name or rule.get('model')
+
+    model_name = model_name or config.get('model', {}).get('current_model')
+    if not model_name:
+        raise ValueError("必须指定模型")
+
+    model = next((m for m in config.get('models', []) if m.get('name') == model_name), None)
+    if model is None:
+        raise ValueError(f"没有找到名为 {model_name} 的模型")
+
+    model_path = model['path']
+    if not os.path.isabs(model_path):
+        model_path = os.path.join(root_dir, model_path)
+    if not os.path.exists(model_path):
+        raise ValueError(f"模型文件不存在: {model_path}")
+
+    return {
+        'model': {
+            'name': model_name,
+            'path': model_path,
+            'type': model.get('type', 'yolov8'),
+            'runtime': model.get('runtime'),
+            'postprocess': model.get('postprocess')
+        },
+        'cache_dir': cache_dir,
+        'rule_name': rule_name,
+        'rule': rule,
+        'roi_config': roi_config,
+        'batch_size': batch_size,
+        'coordinate_space': coordinate_space
+    }
+
+
+def get_job_id(spec, source):
+    """
+    由输入、模型和规则生成任务ID，相同的任务总是得到相同的ID，便于续跑
+
+    Returns:
+        12位十六进制字符串
+    """
+    key = json.dumps([os.path.abspath(source) if not glob.has_magic(source) else source,
+                      spec['model']['name'], spec['rule_name']], ensure_ascii=False)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+
+# 每个工作进程的检测器和解码线程池，由_init_worker创建
+_worker = {}
+
+
+def _init_worker(spec, decode_threads, intra_op_threads):
+    """工作进程初始化：加载该进程自己的检测器"""
+    from app.yolomodel.detector import YOLODetector
+
+    # 未指定线程数时按进程数平分CPU核心，避免多个进程的推理线程互相争抢
+    runtime = dict(spec['model']['runtime'] or {})
+    if 'intra_op_num_threads' not in runtime and 'intra_op_cores' not in runtime:
+        runtime['intra_op_num_threads'] = intra_op_threads
+
+    detector = YOLODetector(spec['model']['path'], spec['model']['type'], runtime,
+                            cache_dir=spec['cache_dir'], postprocess_config=spec['model']['postprocess'])
+    # 批量任务自行组批，不需要微批处理调度器
+    detector.disable_batching()
+
+    _worker['spec'] = spec
+    _worker['detector'] = detector
+    _worker['rule_plan'] = compile_logic_rule(spec['rule']) if spec['rule'] is not None else None
+    _worker['decode_pool'] = ThreadPoolExecutor(decode_threads, thread_name_prefix='BatchDecode')
+
+
+def read_image(path):
+    """
+    读取图像文件，支持非ASCII路径
+
+    Returns:
+        BGR图像，无法读取时返回None
+    """
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+    except OSError:
+        return None
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+def _process_chunk(paths):
+    """
+    在工作进程中检测一组图像
+
+    图像由解码线程池提前读取，与推理并行进行
+
+    Returns:
+        与输入一一对应的结果记录列表
+    """
+    from app.services.detection_service import build_detection_results
+
+    spec = _worker['spec']
+    detector = _worker['detector']
+    plan = _worker['rule_plan']
+    records = []
+    batch = []
+
+    def flush():
+        try:
+            results = detector.detect_batch([image for _, image in batch], render=False,
+                                            coordinate_space=spec['coordinate_space'])
+        except Exception as e:
+            records.extend({'path': path, 'success': False, 'error': f'检测过程中出错: {str(e)}'}
+                           for path, _ in batch)
+            batch.clear()
+            return
+
+        batch_records = []
+        for (path, image), (boxes, scores, class_ids, _) in zip(batch, results):
+            detections = build_detection_results(detector, image.shape, boxes, scores, class_ids,
+                                                 spec['roi_config'], spec['coordinate_space'])
+            batch_records.append({
+                'path': path,
+                'success': True,
+                'image_size': [image.shape[1], image.shape[0]],
+                'detections': detections
+            })
+        # 整个批次的规则验证一次完成
+        if plan is not None:
+            rule_passed, actual = plan.evaluate_batch([record['detections'] for record in batch_records])
+            for i, record in enumerate(batch_records):
+                record['rule_passed'], record['rule_message'] = plan.describe(rule_passed[i], actual[i])
+        records.extend(batch_records)
+        batch.clear()
+
+    # map立即提交全部读取任务，按顺序取结果时后续图像已在后台解码
+    for path, image in zip(paths, _worker['decode_pool'].map(read_image, paths)):
+        if image is None:
+            records.append({'path': path, 'success': False, 'error': '无法读取图像'})
+            continue
+        batch.append((path, image))
+        if len(batch) >= spec['batch_size']:
+            flush()
+    if batch:
+        flush()
+
+    return records
+
+
+class BatchJob:
+    """
+    批量检测任务
+
+    输入图像按 chunk_size 分组提交到进程池，同时在途的分组数不超过进程数的两倍。
+    每完成一组即把结果追加写入JSONL文件并更新检查点（记录已落盘的文件长度）；
+    续跑时先把输出文件截断到检查点位置，再跳过其中已有结果的图像。
+    """
+
+    def __init__(self, spec, source, output_path, settings, resume=True, progress_callback=None, job_id=None):
+        """
+        初始化任务
+
+        Args:
+            spec: build_job_spec生成的任务描述
+            source: 输入目录、通配符或文件
+            output_path: 结果JSONL文件路径
+            settings: get_batch_job_settings返回的设置
+            resume: 输出文件已存在时是否从检查点继续
+            progress_callback: 进度回调，参数为get_status()返回的字典
+            job_id: 任务ID，为None时按输入、模型和规则生成
+        """
+        self.spec = spec
+        self.source = source
+        self.output_path = os.path.abspath(output_path)
+        self.checkpoint_path = self.output_path + '.checkpoint'
+        self.settings = settings
+        self.resume = resume
+        self.progress_callback = progress_callback
+        self.job_id = job_id or get_job_id(spec, source)
+
+        self._lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        self._status = JOB_PENDING
+        self._error = None
+        self._total = 0
+        self._skipped = 0
+        self._processed = 0
+        self._failed = 0
+        self._started_at = None
+        self._finished_at = None
+        self._last_report = 0.0
+
+    def cancel(self):
+        """请求取消任务，在途的分组完成并写入后停止"""
+        self._cancel_event.set()
+
+    def is_active(self):
+        """任务是否尚未结束"""
+        with self._lock:
+            return self._status in (JOB_PENDING, JOB_RUNNING)
+
+    def get_status(self):
+        """
+        获取任务状态
+
+        Returns:
+            状态字典，包含进度和吞吐量(images_per_second)
+        """
+        with self._lock:
+            end = self._finished_at or time.time()
+            elapsed = end - self._started_at if self._started_at else 0.0
+            throughput = self._processed / elapsed if elapsed > 0 else 0.0
+            remaining = self._total - self._skipped - self._processed
+            return {
+                'job_id': self.job_id,
+                'status': self._status,
+                'source': self.source,
+                'model': self.spec['model']['name'],
+                'rule_name': self.spec['rule_name'],
+                'output': self.output_path,
+                'total': self._total,
+                'skipped': self._skipped,
+                'processed': self._processed,
+                'failed': self._failed,
+                'completed': self._skipped + self._processed,
+                'elapsed_seconds': round(elapsed, 3),
+                'images_per_second': round(throughput, 2),
+                'eta_seconds': round(remaining / throughput, 1) if throughput > 0 else None,
+                'error': self._error
+            }
+
+    def run(self):
+        """
+        执行任务，阻塞直到完成、取消或失败
+
+        Returns:
+            最终的状态字典
+        """
+        with self._lock:
+            self._status = JOB_RUNNING
+            self._started_at = time.time()
+        try:
+            self._run()
+            with self._lock:
+                self._status = JOB_CANCELLED if self._cancel_event.is_set() else JOB_COMPLETED
+        except Exception as e:
+            with self._lock:
+                self._status = JOB_FAILED
+                self._error = str(e) or type(e).__name__
+        finally:
+            with self._lock:
+                self._finished_at = time.time()
+            self._report_progress(force=True)
+        return self.get_status()
+
+    def _run(self):
+        paths = list_images(self.source)
+        output_dir = os.path.dirname(self.output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        done = self._restore_checkpoint() if self.resume else self._reset_output()
+        pending = [path for path in paths if path not in done]
+
+        with self._lock:
+            self._total = len(paths)
+            self._skipped = len(paths) - len(pending)
+
+        chunk_size = self.settings['chunk_size']
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        self._save_checkpoint()
+        self._report_progress(force=True)
+        if not chunks:
+            return
+
+        workers = min(self.settings['workers'], len(chunks))
+        intra_op_threads = max(1, (os.cpu_count() or 1) // workers)
+        chunk_iter = iter(chunks)
+        in_flight = set()
+
+        with open(self.output_path, 'a', encoding='utf-8') as output, \
+                ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                    initializer=_init_worker,
+                                    initargs=(self.spec, self.settings['decode_threads'],
+                                              intra_op_threads)) as pool:
+            while True:
+                # 保持每个进程都有下一组任务在排队，取消后不再提交
+                while not self._cancel_event.is_set() and len(in_flight) < workers * 2:
+                    chunk = next(chunk_iter, None)
+                    if chunk is None:
+                        break
+                    in_flight.add(pool.submit(_process_chunk, chunk))
+
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, timeout=self.settings['progress_interval'],
+                                           return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._write_records(output, future.result())
+                if finished:
+                    output.flush()
+                    os.fsync(output.fileno())
+                    self._save_checkpoint(output.tell())
+                self._report_progress()
+
+    def _write_records(self, output, records):
+        """将一组结果写入输出文件并更新计数"""
+        failed = 0
+        for record in records:
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if not record.get('success'):
+                failed += 1
+        with self._lock:
+            self._processed += len(records)
+            self._failed += failed
+
+    def _checkpoint_identity(self):
+        """检查点中用于确认属于同一任务的字段"""
+        return {
+            'job_id': self.job_id,
+            'source': self.source,
+            'model': self.spec['model']['name'],
+            'rule_name': self.spec['rule_name']
+        }
+
+    def _save_checkpoint(self, output_size=None):
+        """原子写入检查点，记录已完整落盘的输出文件长度"""
+        if output_size is None:
+            output_size = os.path.getsize(self.output_path) if os.path.exists(self.output_path) else 0
+        checkpoint = self._checkpoint_identity()
+        checkpoint.update(output_size=output_size, updated_at=time.time())
+
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+
+    def _reset_output(self):
+        """不续跑时清空输出文件"""
+        open(self.output_path, 'w', encoding='utf-8').close()
+        return set()
+
+    def _restore_checkpoint(self):
+        """
+        按检查点恢复输出文件
+
+        Returns:
+            已有结果的图像路径集合
+
+        Raises:
+            ValueError: 检查点属于另一个任务
+        """
+        if not os.path.exists(self.checkpoint_path) or not os.path.exists(self.output_path):
+            return self._reset_output()
+
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        identity = self._checkpoint_identity()
+        if any(checkpoint.get(key) != value for key, value in identity.items()):
+            raise ValueError(f"输出文件 {self.output_path} 属于另一个任务，请更换输出路径或关闭续跑")
+
+        # 丢弃检查点之后可能只写了一半的结果
+        with open(self.output_path, 'r+b') as f:
+            f.truncate(min(checkpoint.get('output_size', 0), os.path.getsize(self.output_path)))
+
+        done = set()
+        failed = 0
+        with open(self.output_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    done.add(record['path'])
+                    if not record.get('success'):
+                        failed += 1
+
+        # 失败数量包含之前运行中失败的图像
+        with self._lock:
+            self._failed = failed
+        return done
+
+    def _report_progress(self, force=False):
+        """按progress_interval节流调用进度回调"""
+        if self.progress_callback is None:
+            return
+        now = time.time()
+        if not force and now - self._last_report < self.settings['progress_interval']:
+            return
+        self._last_report = now
+        try:
+            self.progress_callback(self.get_status())
+        except Exception as e:
+            logger.throttled(('progress_callback', self.job_id), _ERROR_LOG_INTERVAL,
+                             f"批量任务 {self.job_id} 进度回调失败: {str(e)}", level='error')
+
+
+def main(argv=None):
+    """命令行入口：python -m app.services.batch_job <目录或通配符> --model <模型名称>"""
+    import argparse
+    from app.utils.path_utils import get_base_path, get_model_cache_dir, get_batch_jobs_dir
+
+    parser = argparse.ArgumentParser(description='批量检测目录中的图像')
+    parser.add_argument('source', help='图像目录、通配符(如 "archive/**/*.jpg")或单个图像文件')
+    parser.add_argument('--model', help='模型名称，默认使用规则指定的模型或当前模型')
+    parser.add_argument('--rule', help='逻辑规则名称，指定时为每张图像分配ROI并验证规则')
+    parser.add_argument('--output', help='结果JSONL文件路径，默认写入结果目录下的batch_jobs')
+    parser.add_argument('--workers', type=int, help='工作进程数量')
+    parser.add_argument('--chunk-size', type=int, help='每次分发给工作进程的图像数量')
+    parser.add_argument('--batch-size', type=int, help='每次推理的图像数量')
+    parser.add_argument('--coordinate-space', choices=('original', 'canvas'), default='original',
+                        help='结果中检测框的坐标系')
+    parser.add_argument('--no-resume', action='store_true', help='忽略已有的检查点，重新开始')
+    parser.add_argument('--config', default=os.path.join(get_base_path(), 'config.json'), help='配置文件路径')
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    try:
+        settings = get_batch_job_settings(config, {'workers': args.workers, 'chunk_size': args.chunk_size,
+                                                   'batch_size': args.batch_size})
+        cache_dir = get_model_cache_dir() if config.get('model', {}).get('optimized_model_cache', True) else None
+        spec = build_job_spec(config, args.model, args.rule, get_base_path(), cache_dir,
+                              settings['batch_size'], args.coordinate_space)
+    except ValueError as e:
+        print(f"错误: {str(e)}")
+        return 2
+
+    job_id = get_job_id(spec, args.source)
+    output = args.output or os.path.join(get_batch_jobs_dir(), f'{job_id}.jsonl')
+
+    def print_progress(status):
+        eta = f", 预计剩余 {status['eta_seconds']:.0f} 秒" if status['eta_seconds'] is not None else ''
+        print(f"[{status['status']}] {status['completed']}/{status['total']} 张, 失败 {status['failed']}, "
+              f"{status['images_per_second']:.1f} 张/秒{eta}")
+
+    job = BatchJob(spec, args.source, output, settings, not args.no_resume, print_progress, job_id)
+    try:
+        status = job.run()
+    except KeyboardInterrupt:
+        job.cancel()
+        print("已中断，再次运行相同命令可从检查点继续")
+        return 130
+
+    print(f"结果文件: {status['output']}")
+    if status['error']:
+        print(f"错误: {status['error']}")
+    return 0 if status['status'] == JOB_COMPLETED else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+批量检测任务服务模块
+在后台线程中运行批量检测任务，管理任务状态并转发进度
+"""
+import os
+import threading
+from flask import current_app
+
+from app.services.batch_job import (
+    BatchJob, build_job_spec, get_batch_job_settings, get_job_id
+)
+from app.services.model_service import get_cache_dir
+from app.utils.config_store import get_app_config_store
+from app.utils.path_utils import get_batch_jobs_dir
+
+# 已提交的任务，按任务ID索引
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def start_batch_job(source, model_name=None, rule_name=None, output=None, workers=None,
+                    batch_size=None, coordinate_space='original', resume=True, progress_callback=None):
+    """
+    在后台启动批量检测任务
+    
+    相同输入、模型和规则的任务使用相同的任务ID和默认输出文件，重新提交时从检查点继续
+    
+    Args:
+        source: 图像目录、通配符或单个图像文件，相对路径基于应用根目录
+        model_name: 模型名称，为None时使用规则指定的模型或当前模型
+        rule_name: 逻辑规则名称，可选
+        output: 结果JSONL文件名（不能包含路径），写入结果目录下的batch_jobs；为None时使用任务ID命名
+        workers: 工作进程数量，为None时使用配置
+        batch_size: 每次推理的图像数量，为None时使用配置
+        coordinate_space: 结果中检测框的坐标系，'original'或'canvas'
+        resume: 是否从检查点继续
+        progress_callback: 进度回调，参数为任务状态字典
+        
+    Returns:
+        (成功标志, 任务状态或错误信息)
+    """
+    if coordinate_space not in ('original', 'canvas'):
+        return False, f'不支持的坐标系: {coordinate_space}'
+    
+    root_dir = current_app.config['ROOT_DIR']
+    if not os.path.isabs(source):
+        source = os.path.join(root_dir, source)
+    
+    config = get_app_config_store().snapshot()
+    try:
+        settings = get_batch_job_settings(config, {'workers': workers, 'batch_size': batch_size})
+        spec = build_job_spec(config, model_name, rule_name, root_dir, get_cache_dir(config),
+                              settings['batch_size'], coordinate_space)
+    except ValueError as e:
+        return False, str(e)
+    
+    job_id = get_job_id(spec, source)
+    if output is None:
+        output = f'{job_id}.jsonl'
+    elif not is_bare_filename(output):
+        # 客户端只能指定文件名，不能在结果目录以外创建或覆盖文件（任意路径只能通过命令行指定）
+        return False, f'输出文件名无效: {output}'
+    output = os.path.join(get_batch_jobs_dir(), output)
+    
+    with _jobs_lock:
+        existing = _jobs.get(job_id)
+        if existing is not None and existing.is_active():
+            return False, f'任务 {job_id} 正在运行'
+        
+        job = BatchJob(spec, source, output, settings, resume, progress_callback, job_id)
+        _jobs[job_id] = job
+    
+    thread = threading.Thread(target=job.run, name=f"BatchJob-{job_id}", daemon=True)
+    thread.start()
+    return True, job.get_status()
+
+def is_bare_filename(name):
+    """
+    检查是否为不含路径的文件名
+    
+    Args:
+        name: 文件名
+        
+    Returns:
+        不包含路径分隔符、盘符且不是.或..时返回True
+    """
+    if not isinstance(name, str) or not name or name in ('.', '..'):
+        return False
+    if '/' in name or '\\' in name or ':' in name or '\0' in name:
+        return False
+    return os.path.basename(name) == name
+
+def get_batch_job(job_id):
+    """
+    获取任务状态
+    
+    Args:
+        job_id: 任务ID
+        
+    Returns:
+        (成功标志, 任务状态或错误信息)
+    """
+    job = _jobs.get(job_id)
+    if job is None:
+        return False, f'任务 {job_id} 不存在'
+    return True, job.get_status()
+
+def list_batch_jobs():
+    """
+    获取所有任务的状态
+    
+    Returns:
+        任务状态列表
+    """
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    return [job.get_status() for job in jobs]
+
+def cancel_batch_job(job_id):
+    """
+    取消任务，在途的图像完成并写入后停止，之后可以从检查点继续
+    
+    Args:
+        job_id: 任务ID
+        
+    Returns:
+        (成功标志, 消息)
+    """
+    job = _jobs.get(job_id)
+    if job is None:
+        return False, f'任务 {job_id} 不存在'
+    if not job.is_active():
+        return False, f'任务 {job_id} 已结束'
+    job.cancel()
+    return True, f'已请求取消任务 {job_id}'
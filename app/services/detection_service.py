@@ -8,10 +8,27 @@ import numpy as np
 from flask import current_app
 
 from app.yolomodel.preprocessor import ImagePreprocessor
-from app.services.model_service import get_detector
+from app.services.model_service import (
+    get_detector, load_model, ensure_current_model_loaded, get_current_model_name
+)
 from app.services.roi_service import get_roi_config_detail, get_roi_configs
 from app.services.logic_service import get_logic_rules
+from app.services.roi_index import get_roi_index, get_assignment_settings
+from app.services.roi_overlay import get_roi_overlay
+from app.utils.file_utils import get_unique_filename
+from app.utils.frame_protocol import PROTOCOL_VERSION, NO_ROI, ClassTableTracker, pack_detections
+from app.yolomodel.metrics import (
+    traced, stage, STAGE_DISK_READ, STAGE_IMAGE_DECODE, STAGE_ROI_ASSIGN, STAGE_RENDER,
+    STAGE_IMAGE_ENCODE, STAGE_DISK_WRITE
+)
 
+# 检测结果支持的坐标系：模型输入尺寸的填充画布(ROI画布)或原始图像
+COORDINATE_SPACES = ('canvas', 'original')
+
+# 二进制结果中每个客户端已收到的类别名称列表
+_class_tables = ClassTableTracker()
+
+@traced
 def detect_objects(image_path, selected_rule_name=None):
     """
     对图像进行目标检测
@@ -23,193 +40,431 @@ def detect_objects(image_path, selected_rule_name=None):
     Returns:
         (成功标志, 检测结果或错误信息, 处理后的图像路径)
     """ 
-    detector = get_detector()
-    
-    if detector is None:
-        return False, '检测器未初始化，请先加载模型', None
-    
     if not os.path.exists(image_path):
         return False, f'图像文件不存在: {image_path}', None
     
     try:
-        # 读取图像
-        image = cv2.imread(image_path)
+        # 读取图像（文件读取和解码分开计时）
+        with stage(STAGE_DISK_READ):
+            data = np.fromfile(image_path, dtype=np.uint8)
+        with stage(STAGE_IMAGE_DECODE):
+            image = cv2.imdecode(data, cv2.IMREAD_COLOR)
         if image is None:
             return False, '无法读取图像', None
         
-        # 获取ROI配置（如果指定了规则名称）
-        roi_config = None
-        if selected_rule_name:
-            logic_rules = get_logic_rules()
-            if selected_rule_name in logic_rules:
-                rule = logic_rules[selected_rule_name]
-                roi_config_name = rule.get('roi_config')
-                if roi_config_name:
-                    # 获取ROI配置详情
-                    roi_configs = get_roi_configs()
-                    if roi_config_name in roi_configs:
-                        roi_config = roi_configs[roi_config_name]
+        success, results, processed_image = detect_image(image, selected_rule_name)
+        if not success:
+            return False, results, None
         
-        # 使用ImagePreprocessor实例的resize_with_padding方法处理图像
-        preprocessor = get_detector().preprocessor 
-        processed_image, preprocess_paramsUseless = preprocessor.resize_with_padding(image,640,640)
-        #暂时不处理版本
-        #processed_image = image
+        # 保存处理后的图像（不渲染模式下没有结果图像）
+        result_url = None
+        if processed_image is not None:
+            result_url = save_result_image(processed_image, os.path.basename(image_path))
         
-        # 执行检测
-        boxes, scores, class_ids, processed_image = detector.detect(processed_image)
+        # 返回结果
+        return True, results, result_url
+    except Exception as e:
+        return False, f'检测过程中出错: {str(e)}', None
+
+def run_detection(image, selected_rule_name=None, render=True, coordinate_space='canvas'):
+    """
+    按规则选择模型执行检测，返回检测器的原始输出
+    
+    Args:
+        image: BGR格式的图像数组
+        selected_rule_name: 选中的逻辑规则名称（可选）
+        render: 是否绘制检测框和ROI区域
+        coordinate_space: 检测框坐标和绘制图像所在的坐标系，'canvas'或'original'
         
-        # 如果有ROI配置，在处理后的图像上绘制ROI区域
-        if roi_config:
-            # 在检测后的图像上绘制ROI区域
-            processed_image = draw_roi_on_image(processed_image, roi_config)
+    Returns:
+        (成功标志, 检测输出字典或错误信息)
+        检测输出字典包含detector、model_name、boxes、scores、class_ids、roi_config和
+        processed_image(render为False时为None)
+    """
+    if coordinate_space not in COORDINATE_SPACES:
+        return False, f'不支持的坐标系: {coordinate_space}'
+    
+    # 获取规则对应的ROI配置和模型（如果指定了规则名称）
+    roi_config = None
+    rule_model_name = None
+    if selected_rule_name:
+        logic_rules = get_logic_rules()
+        if selected_rule_name in logic_rules:
+            rule = logic_rules[selected_rule_name]
+            rule_model_name = rule.get('model')
+            roi_config_name = rule.get('roi_config')
+            if roi_config_name:
+                # 获取ROI配置详情
+                roi_configs = get_roi_configs()
+                if roi_config_name in roi_configs:
+                    roi_config = roi_configs[roi_config_name]
+    
+    # 规则指定了模型时使用该模型的检测器，否则使用当前模型
+    if rule_model_name:
+        success, error, detector = load_model(rule_model_name)
+        if not success:
+            return False, error
+    else:
+        detector = get_detector()
+        if detector is None:
+            # 不经过WebSocket连接的入口（如HTTP接口）按需加载配置中的当前模型
+            success, error, detector = ensure_current_model_loaded()
+            if not success and error:
+                return False, error
+    
+    if detector is None:
+        return False, '检测器未初始化，请先加载模型'
+    
+    # 不渲染模式下只返回结构化的检测结果，也不需要ROI叠加层
+    render = render and detector.visualizer.enabled
+    
+    # 如果有ROI配置，使用缓存的ROI叠加层，由检测器在绘制检测框的同一次绘制中合成
+    overlay = None
+    if roi_config and render:
+        # ROI定义在模型输入尺寸的画布上，原始图像坐标系下需要换算
+        if coordinate_space == 'original':
+            preprocess_params = detector.preprocessor.get_letterbox_params(image.shape[1], image.shape[0])
+            overlay = get_roi_overlay(roi_config, image.shape, preprocess_params)
+        else:
+            canvas_shape = (detector.preprocessor.input_height, detector.preprocessor.input_width)
+            overlay = get_roi_overlay(roi_config, canvas_shape)
+    
+    # 执行检测（图像只在检测器内缩放一次到模型输入尺寸）
+    boxes, scores, class_ids, processed_image = detector.detect(
+        image, render=render, coordinate_space=coordinate_space, overlay=overlay)
+    
+    return True, {
+        'detector': detector,
+        'model_name': rule_model_name or get_current_model_name(),
+        'boxes': boxes,
+        'scores': scores,
+        'class_ids': class_ids,
+        'roi_config': roi_config,
+        'processed_image': processed_image
+    }
+
+@traced
+def detect_image(image, selected_rule_name=None, render=True, coordinate_space='canvas'):
+    """
+    对内存中的图像进行目标检测，不读写磁盘
+    
+    Args:
+        image: BGR格式的图像数组
+        selected_rule_name: 选中的逻辑规则名称（可选）
+        render: 是否绘制检测框和ROI区域
+        coordinate_space: 检测框坐标和绘制图像所在的坐标系，
+                          'canvas'为模型输入尺寸的填充画布(与ROI画布一致)，'original'为原始图像
         
-        # 准备结果
-        results = []
-        for i, box in enumerate(boxes):
-            # 转换box为列表
-            bbox = box.tolist() if hasattr(box, 'tolist') else box
-            
-            # 创建检测结果对象
-            detection = {
-                'bbox': bbox,
-                'score': float(scores[i]),
-                'class_id': int(class_ids[i]),
-                'class_name': detector.get_class_name(class_ids[i])
-            }
-            
-            # 确定该对象位于哪个ROI区域（如果有）
-            detection['roi_id'] = None  # 默认不在任何ROI区域内
-            
-            # 添加到结果列表
-            results.append(detection)
+    Returns:
+        (成功标志, 检测结果或错误信息, 绘制后的图像；render为False时为None)
+    """
+    try:
+        success, output = run_detection(image, selected_rule_name, render, coordinate_space)
+        if not success:
+            return False, output, None
         
-        # 如果有ROI配置，为检测结果分配ROI区域
-        if roi_config:
-            assign_roi_to_detections(results, image.shape, roi_config)
+        results = build_detection_results(output['detector'], image.shape, output['boxes'], output['scores'],
+                                          output['class_ids'], output['roi_config'], coordinate_space)
+        return True, results, output['processed_image']
+    except Exception as e:
+        return False, f'检测过程中出错: {str(e)}', None
+
+def build_detection_results(detector, image_shape, boxes, scores, class_ids, roi_config=None,
+                            coordinate_space='canvas'):
+    """
+    将检测器输出转换为检测结果列表，并按ROI配置分配ROI区域
+    
+    Args:
+        detector: 产生检测结果的YOLODetector
+        image_shape: 原始图像尺寸 (height, width, channels)
+        boxes: 检测框，位于coordinate_space指定的坐标系
+        scores: 置信度分数
+        class_ids: 类别ID
+        roi_config: ROI配置，为None时不分配ROI区域
+        coordinate_space: 检测框所在的坐标系，'canvas'或'original'
         
-        # 保存处理后的图像
-        result_filename = f"result_{os.path.basename(image_path)}"
-        result_path = os.path.join(current_app.config['RESULT_FOLDER'], result_filename)
-        cv2.imwrite(result_path, processed_image)
+    Returns:
+        检测结果列表
+    """
+    # 准备结果
+    results = []
+    for i, box in enumerate(boxes):
+        # 转换box为列表
+        bbox = box.tolist() if hasattr(box, 'tolist') else box
         
-        # 结果URL
-        result_url = f"/static/results/{result_filename}"
+        # 创建检测结果对象
+        detection = {
+            'bbox': bbox,
+            'score': float(scores[i]),
+            'class_id': int(class_ids[i]),
+            'class_name': detector.get_class_name(class_ids[i])
+        }
         
-        # 返回结果
-        return True, results, result_url
-    except Exception as e:
-        return False, f'检测过程中出错: {str(e)}', None
+        # 确定该对象位于哪个ROI区域（如果有）
+        detection['roi_id'] = None  # 默认不在任何ROI区域内
+        
+        # 添加到结果列表
+        results.append(detection)
+    
+    # 如果有ROI配置，为检测结果分配ROI区域
+    if roi_config:
+        canvas_shape = (detector.input_height, detector.input_width, 3)
+        roi_boxes = None
+        if coordinate_space == 'original' and len(boxes) > 0:
+            roi_boxes = get_canvas_boxes(detector, image_shape, boxes, coordinate_space)
+        with stage(STAGE_ROI_ASSIGN):
+            assign_roi_to_detections(results, canvas_shape, roi_config, roi_boxes)
+    
+    return results
 
-def draw_roi_on_image(image, roi_config):
+def get_canvas_boxes(detector, image_shape, boxes, coordinate_space='canvas'):
     """
-    在图像上绘制ROI区域
+    获取与ROI同一坐标系（模型输入尺寸的画布）的检测框
     
     Args:
-        image: 原始图像
+        detector: 产生检测结果的YOLODetector
+        image_shape: 原始图像尺寸 (height, width, channels)
+        boxes: 检测框，位于coordinate_space指定的坐标系
+        coordinate_space: 检测框所在的坐标系，'canvas'或'original'
+        
+    Returns:
+        (N, 4) 画布坐标系下的检测框
+    """
+    if coordinate_space == 'original' and len(boxes) > 0:
+        preprocess_params = detector.preprocessor.get_letterbox_params(image_shape[1], image_shape[0])
+        return detector.postprocessor.map_boxes_to_canvas(boxes, preprocess_params)
+    return np.asarray(boxes)
+
+def get_roi_ids(detector, image_shape, boxes, roi_config, coordinate_space='canvas'):
+    """
+    计算每个检测框所在的ROI区域ID，与assign_roi_to_detections使用相同的规则
+    
+    Args:
+        detector: 产生检测结果的YOLODetector
+        image_shape: 原始图像尺寸 (height, width, channels)
+        boxes: 检测框，位于coordinate_space指定的坐标系
         roi_config: ROI配置
+        coordinate_space: 检测框所在的坐标系，'canvas'或'original'
         
     Returns:
-        添加了ROI区域的图像
+        (N,) ROI区域ID数组，不在任何ROI区域内为NO_ROI
     """
-    if not roi_config or 'rois' not in roi_config:
-        return image
+    roi_ids = np.full(len(boxes), NO_ROI, dtype=np.int64)
+    if not roi_config or 'rois' not in roi_config or len(boxes) == 0:
+        return roi_ids
     
-    # 创建图像副本，避免修改原图
-    result_image = image.copy()
+    canvas_shape = (detector.input_height, detector.input_width, 3)
+    canvas_boxes = get_canvas_boxes(detector, image_shape, boxes, coordinate_space)
+    with stage(STAGE_ROI_ASSIGN):
+        settings = get_assignment_settings(roi_config)
+        roi_ids, _ = get_roi_index(roi_config, canvas_shape).assign(canvas_boxes, settings['overlap'],
+                                                                    settings['min_coverage'])
+    return roi_ids
+
+@traced
+def detect_image_bytes(image_bytes, selected_rule_name=None, return_image=False,
+                       save_upload=False, save_result=False, filename=None, image_format='.jpg',
+                       coordinate_space='canvas'):
+    """
+    对编码后的图像数据进行目标检测，默认全程在内存中完成
     
-    # 遍历所有ROI区域
-    for roi_id, roi in enumerate(roi_config['rois']):
-        # 获取ROI类型和坐标
-        roi_type = roi.get('type')
+    Args:
+        image_bytes: 编码后的图像数据(JPEG/PNG等)
+        selected_rule_name: 选中的逻辑规则名称（可选）
+        return_image: 是否返回编码后的标注图像数据
+        save_upload: 是否将上传的原始图像保存到上传目录
+        save_result: 是否将标注图像保存到结果目录
+        filename: 原始文件名，保存文件时用于生成文件名
+        image_format: 返回标注图像时使用的编码格式
+        coordinate_space: 检测框坐标所在的坐标系，'canvas'或'original'
         
-        # 获取颜色，默认为蓝色
-        color_hex = roi.get('color', '#007bff')
-        # 将16进制颜色转换为BGR
-        color = hex_to_bgr(color_hex)
+    Returns:
+        (成功标志, 结果字典或错误信息)
+        结果字典包含results、rule_name、coordinate_space、image_size(原始图像宽高)，以及按需生成的
+        result_image_data(标注图像字节)、result_image(结果URL)、upload_url(上传图像URL)
+    """
+    if not image_bytes:
+        return False, '没有图像数据'
+    
+    # 直接从内存解码，不经过磁盘
+    with stage(STAGE_IMAGE_DECODE):
+        image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return False, '无法解码图像数据'
+    
+    render = return_image or save_result
+    success, results, processed_image = detect_image(image, selected_rule_name, render=render,
+                                                     coordinate_space=coordinate_space)
+    if not success:
+        return False, results
+    
+    response = {
+        'results': results,
+        'rule_name': selected_rule_name,
+        'coordinate_space': coordinate_space,
+        'image_size': [image.shape[1], image.shape[0]],
+        'result_image': None
+    }
+    
+    try:
+        filename = filename or f'upload{image_format}'
         
-        # ROI编号从1开始
-        roi_display_id = roi_id + 1
+        if save_upload:
+            upload_folder = current_app.config['UPLOAD_FOLDER']
+            os.makedirs(upload_folder, exist_ok=True)
+            upload_name = get_unique_filename(filename)
+            with stage(STAGE_DISK_WRITE), open(os.path.join(upload_folder, upload_name), 'wb') as f:
+                f.write(image_bytes)
+            response['upload_url'] = f"/static/uploads/{upload_name}"
         
-        # 绘制ROI区域
-        if roi_type == 'rectangle':
-            x1, y1 = int(roi.get('x1', 0)), int(roi.get('y1', 0))
-            x2, y2 = int(roi.get('x2', 0)), int(roi.get('y2', 0))
-            
-            # 绘制矩形
-            cv2.rectangle(result_image, (x1, y1), (x2, y2), color, 2)
-            
-            # 添加ROI ID标签
-            cv2.putText(result_image, f"ROI {roi_display_id}", (x1, y1 - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        # 不渲染模式下没有结果图像可以保存或返回
+        if save_result and processed_image is not None:
+            response['result_image'] = save_result_image(processed_image, get_unique_filename(filename))
         
-        elif roi_type == 'polygon':
-            points = roi.get('points', [])
-            if points:
-                # 转换点数组
-                poly_points = np.array([[p['x'], p['y']] for p in points], np.int32)
-                poly_points = poly_points.reshape((-1, 1, 2))
-                
-                # 绘制多边形
-                cv2.polylines(result_image, [poly_points], True, color, 2)
-                
-                # 添加ROI ID标签（使用第一个点作为标签位置）
-                if len(points) > 0:
-                    label_x, label_y = points[0]['x'], points[0]['y']
-                    cv2.putText(result_image, f"ROI {roi_display_id}", (label_x, label_y - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-    
-    return result_image
+        if return_image and processed_image is not None:
+            with stage(STAGE_IMAGE_ENCODE):
+                encoded, buffer = cv2.imencode(image_format, processed_image)
+            if not encoded:
+                return False, f'无法编码标注图像: {image_format}'
+            response['result_image_data'] = buffer.tobytes()
+    except Exception as e:
+        return False, f'保存检测结果时出错: {str(e)}'
+    
+    return True, response
 
-def hex_to_bgr(hex_color):
+@traced
+def detect_image_packed(image_bytes, selected_rule_name=None, return_image=False, coordinate_space='canvas',
+                        image_format='.jpg', client_id=None):
     """
-    将16进制颜色转换为BGR
+    对编码后的图像数据进行检测，结果按二进制帧协议打包
     
     Args:
-        hex_color: 16进制颜色代码（例如#FF0000）
+        image_bytes: 编码后的图像数据(JPEG/PNG等)
+        selected_rule_name: 选中的逻辑规则名称（可选）
+        return_image: 是否返回编码后的标注图像数据
+        coordinate_space: 检测框坐标所在的坐标系，'canvas'或'original'
+        image_format: 返回标注图像时使用的编码格式
+        client_id: 客户端ID，模型的类别名称列表对每个客户端只发送一次
         
     Returns:
-        BGR颜色元组
+        (成功标志, 结果字典或错误信息)
+        结果字典包含协议版本v、model、count、boxes、class_ids、scores、roi_ids（二进制数组），
+        首次发送该模型结果时包含classes，return_image为真时包含result_image_data
     """
-    # 去除#号
-    hex_color = hex_color.lstrip('#')
+    if not image_bytes:
+        return False, '没有图像数据'
     
-    # 转换为RGB
-    r = int(hex_color[0:2], 16)
-    g = int(hex_color[2:4], 16)
-    b = int(hex_color[4:6], 16)
+    with stage(STAGE_IMAGE_DECODE):
+        image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return False, '无法解码图像数据'
     
-    # 返回BGR（OpenCV使用BGR）
-    return (b, g, r)
+    try:
+        success, output = run_detection(image, selected_rule_name, return_image, coordinate_space)
+        if not success:
+            return False, output
+        
+        detector = output['detector']
+        roi_config = output['roi_config']
+        boxes = output['boxes']
+        roi_ids = get_roi_ids(detector, image.shape, boxes, roi_config, coordinate_space)
+        
+        response = {
+            'v': PROTOCOL_VERSION,
+            'model': output['model_name'],
+            'rule_name': selected_rule_name,
+            'roi_config': roi_config.get('name') if roi_config else None,
+            'coordinate_space': coordinate_space,
+            'image_size': [image.shape[1], image.shape[0]],
+            **pack_detections(boxes, output['scores'], output['class_ids'], roi_ids)
+        }
+        
+        if _class_tables.needs_classes(client_id, output['model_name'], detector.classes):
+            response['classes'] = [detector.get_class_name(i) for i in range(len(detector.classes))]
+        
+        if return_image and output['processed_image'] is not None:
+            with stage(STAGE_IMAGE_ENCODE):
+                encoded, buffer = cv2.imencode(image_format, output['processed_image'])
+            if not encoded:
+                return False, f'无法编码标注图像: {image_format}'
+            response['result_image_data'] = buffer.tobytes()
+    except Exception as e:
+        return False, f'检测过程中出错: {str(e)}'
+    
+    return True, response
+
+def forget_packed_client(client_id):
+    """客户端断开连接时清除其类别名称列表的发送记录"""
+    _class_tables.forget(client_id)
 
-def assign_roi_to_detections(detections, image_shape, specific_roi_config=None):
+def save_result_image(image, filename):
+    """
+    将标注图像保存到结果目录
+    
+    Args:
+        image: 标注后的图像
+        filename: 原始文件名
+        
+    Returns:
+        结果图像的URL
+    """
+    result_filename = f"result_{filename}"
+    result_path = os.path.join(current_app.config['RESULT_FOLDER'], result_filename)
+    
+    # 按文件扩展名编码后写入，编码和写盘分开计时
+    with stage(STAGE_IMAGE_ENCODE):
+        encoded, buffer = cv2.imencode(os.path.splitext(result_filename)[1], image)
+    if not encoded:
+        raise ValueError(f'无法编码结果图像: {result_filename}')
+    with stage(STAGE_DISK_WRITE):
+        buffer.tofile(result_path)
+    
+    # 结果URL
+    return f"/static/results/{result_filename}"
+
+def draw_roi_on_image(image, roi_config, preprocess_params=None):
+    """
+    在图像上绘制ROI区域
+    
+    ROI边框和标签使用按(ROI配置, 图像尺寸)缓存的叠加层，不逐次重新绘制
+    
+    Args:
+        image: 原始图像
+        roi_config: ROI配置
+        preprocess_params: 预处理参数，提供时将ROI从画布坐标换算到原始图像坐标
+        
+    Returns:
+        添加了ROI区域的图像
+    """
+    if not roi_config or 'rois' not in roi_config:
+        return image
+    
+    # 在图像副本上合成，避免修改原图
+    with stage(STAGE_RENDER):
+        return get_roi_overlay(roi_config, image.shape, preprocess_params).apply(image.copy())
+
+def assign_roi_to_detections(detections, image_shape, specific_roi_config=None, roi_boxes=None):
     """
     为每个检测结果分配ROI区域ID
     
+    ROI配置编译为缓存的ROI索引后，所有检测框一次向量化完成分配。
+    ROI配置中assignment的overlap为'all'时，检测结果还包含全部匹配区域的roi_ids列表
+    
     Args:
         detections: 检测结果列表
-        image_shape: 图像尺寸 (height, width, channels)
+        image_shape: ROI画布尺寸 (height, width, channels)
         specific_roi_config: 特定的ROI配置（如果有）
+        roi_boxes: 与ROI同一坐标系的检测框列表，默认使用检测结果中的bbox
     """
+    if not detections:
+        return
+    boxes = np.asarray(roi_boxes if roi_boxes is not None else [d['bbox'] for d in detections],
+                       dtype=np.float64).reshape(-1, 4)
+    
     # 如果提供了特定的ROI配置，就只检查这个配置
     if specific_roi_config and 'rois' in specific_roi_config:
-        rois = specific_roi_config['rois']
-        config_name = specific_roi_config.get('name', '')
-        
-        # 查找每个检测框是否在任何ROI区域内
-        for detection in detections:
-            bbox = detection['bbox']
-            
-            # 计算检测框中心点
-            center_x = (bbox[0] + bbox[2]) / 2
-            center_y = (bbox[1] + bbox[3]) / 2
-            
-            # 检查点是否在任何ROI区域内
-            for roi_id, roi in enumerate(rois):
-                if is_point_in_roi(center_x, center_y, roi, image_shape):
-                    detection['roi_id'] = roi_id
-                    detection['roi_config'] = config_name
-                    break
+        apply_roi_assignment(detections, np.arange(len(detections)), boxes, specific_roi_config,
+                             specific_roi_config.get('name', ''), image_shape)
         return
     
     # 否则，检查所有ROI配置
@@ -223,66 +478,42 @@ def assign_roi_to_detections(detections, image_shape, specific_roi_config=None):
     if not logic_rules or not roi_configs:
         return
     
-    # 查找每个检测框是否在任何ROI区域内
-    for detection in detections:
-        bbox = detection['bbox']
-        
-        # 计算检测框中心点
-        center_x = (bbox[0] + bbox[2]) / 2
-        center_y = (bbox[1] + bbox[3]) / 2
+    # 按逻辑规则的顺序依次检查其ROI配置，已分配的检测结果不再参与后面的配置
+    pending = np.arange(len(detections))
+    for rule_name, rule in logic_rules.items():
+        roi_config_name = rule.get('roi_config')
+        if not roi_config_name or roi_config_name not in roi_configs:
+            continue
         
-        # 遍历所有逻辑规则中可能用到的ROI配置
-        for rule_name, rule in logic_rules.items():
-            roi_config_name = rule.get('roi_config')
-            if not roi_config_name or roi_config_name not in roi_configs:
-                continue
-                
-            roi_config = roi_configs[roi_config_name]
-            rois = roi_config.get('rois', [])
-            
-            # 检查点是否在任何ROI区域内
-            for roi_id, roi in enumerate(rois):
-                if is_point_in_roi(center_x, center_y, roi, image_shape):
-                    detection['roi_id'] = roi_id
-                    detection['roi_config'] = roi_config_name
-                    break
-            
-            # 如果已经找到了ROI区域，就不需要继续检查其他配置
-            if detection['roi_id'] is not None:
-                break
+        assigned = apply_roi_assignment(detections, pending, boxes[pending], roi_configs[roi_config_name],
+                                        roi_config_name, image_shape)
+        pending = pending[~assigned]
+        if len(pending) == 0:
+            break
 
-def is_point_in_roi(x, y, roi, image_shape):
+def apply_roi_assignment(detections, positions, boxes, roi_config, config_name, image_shape):
     """
-    检查点是否在ROI区域内
+    按一个ROI配置为部分检测结果分配ROI区域
     
     Args:
-        x, y: 点的坐标
-        roi: ROI区域定义
-        image_shape: 图像尺寸
-    
+        detections: 检测结果列表
+        positions: 参与分配的检测结果下标
+        boxes: 与positions对应的画布坐标检测框
+        roi_config: ROI配置
+        config_name: 写入检测结果roi_config字段的配置名称
+        image_shape: ROI画布尺寸
+        
     Returns:
-        bool: 点是否在ROI区域内
+        与positions对应的布尔数组，表示是否分配到了区域
     """
-    roi_type = roi.get('type')
-    
-    # 对于矩形ROI
-    if roi_type == 'rectangle':
-        x1, y1 = roi.get('x1', 0), roi.get('y1', 0)
-        x2, y2 = roi.get('x2', 0), roi.get('y2', 0)
-        return x1 <= x <= x2 and y1 <= y <= y2
-    
-    # 对于多边形ROI
-    elif roi_type == 'polygon':
-        points = roi.get('points', [])
-        if not points:
-            return False
-            
-        # 创建点数组
-        poly_points = np.array([[p['x'], p['y']] for p in points], np.int32)
-        
-        # 使用OpenCV的pointPolygonTest函数
-        dist = cv2.pointPolygonTest(poly_points, (float(x), float(y)), False)
-        return dist >= 0
-    
-    # 未知类型默认不在区域内
-    return False
+    settings = get_assignment_settings(roi_config)
+    roi_ids, matches = get_roi_index(roi_config, image_shape).assign(boxes, settings['overlap'],
+                                                                     settings['min_coverage'])
+    assigned = roi_ids != NO_ROI
+    for offset in np.flatnonzero(assigned):
+        detection = detections[positions[offset]]
+        detection['roi_id'] = int(roi_ids[offset])
+        detection['roi_config'] = config_name
+        if matches is not None:
+            detection['roi_ids'] = np.flatnonzero(matches[offset]).tolist()
+    return assigned
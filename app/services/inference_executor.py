@@ -0,0 +1,272 @@
+"""
+推理执行器模块
+为WebSocket检测请求提供有界的执行队列：每个客户端只保留最新一个待处理请求（新请求替换旧请求），
+全局同时执行的推理数量受max_concurrency限制，等待中的客户端数量超过max_pending时拒绝新请求。
+
+该模块不依赖Flask应用上下文，任务函数和回调由调用方提供。
+"""
+import os
+import time
+import threading
+from collections import deque
+
+from app.utils.rate_meter import RateMeter
+from app.yolomodel.logger import get_logger
+
+logger = get_logger("APP")
+
+# 同一类回调错误日志的最短记录间隔(秒)
+_ERROR_LOG_INTERVAL = 5.0
+
+# 默认的推理执行器配置(config.json中的inference字段)
+DEFAULT_INFERENCE_CONFIG = {
+    'max_concurrency': None,
+    'max_pending': 32,
+    'stats_window': 10.0
+}
+
+# 请求被丢弃的原因：同一客户端的新请求替换了等待中的旧请求
+DROP_SUPERSEDED = 'superseded'
+
+
+def get_inference_settings(config):
+    """
+    合并默认值和配置文件中的推理执行器设置，max_concurrency为None时按模型配置自动确定
+
+    自动确定的并发数：开启动态微批处理时为max_batch_size（并发请求才能合并成批次），
+    否则为CPU核心数除以当前模型的intra_op_num_threads（未配置时ONNX Runtime使用全部核心，并发数为1），
+    避免多个推理同时运行时线程数超过核心数
+
+    Args:
+        config: 配置字典
+
+    Returns:
+        设置字典
+    """
+    settings = dict(DEFAULT_INFERENCE_CONFIG)
+    settings.update(config.get('inference', {}))
+
+    if settings['max_concurrency'] is None:
+        settings['max_concurrency'] = get_auto_concurrency(config)
+
+    for key in ('max_concurrency', 'max_pending'):
+        value = settings[key]
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f"{key} 必须是正整数")
+    window = settings['stats_window']
+    if isinstance(window, bool) or not isinstance(window, (int, float)) or window <= 0:
+        raise ValueError("stats_window 必须是正数")
+    return settings
+
+
+def get_auto_concurrency(config):
+    """根据当前模型的运行时和批处理配置计算并发推理数量"""
+    model_config = config.get('model', {})
+    batching = model_config.get('batching', {})
+    if batching.get('enabled', False):
+        return max(1, int(batching.get('max_batch_size', 8)))
+
+    cpu_count = os.cpu_count() or 1
+    current = model_config.get('current_model')
+    runtime = next((m.get('runtime') or {} for m in config.get('models', []) if m.get('name') == current), {})
+    intra_op_threads = runtime.get('intra_op_num_threads') or cpu_count
+    return max(1, cpu_count // intra_op_threads)
+
+
+class _Job:
+    """单个待执行的请求"""
+
+    __slots__ = ('client_id', 'request_id', 'func', 'on_result', 'on_dropped', 'submitted_at')
+
+    def __init__(self, client_id, request_id, func, on_result, on_dropped):
+        self.client_id = client_id
+        self.request_id = request_id
+        self.func = func
+        self.on_result = on_result
+        self.on_dropped = on_dropped
+        self.submitted_at = time.perf_counter()
+
+
+class InferenceExecutor:
+    """
+    有界推理执行器
+
+    同一客户端的请求按顺序执行且同时最多一个在执行、一个在等待；执行期间收到的新请求替换等待中的请求，
+    被替换的请求通过on_dropped通知。有等待请求的客户端按到达顺序轮流获得执行线程。
+    """
+
+    def __init__(self, max_concurrency=1, max_pending=32, stats_window=10.0):
+        """
+        Args:
+            max_concurrency: 同时执行的请求数量（执行线程数）
+            max_pending: 最多有多少个客户端同时有等待中的请求
+            stats_window: 统计等待时间和推理时间的时间窗口(秒)
+        """
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._ready = deque()
+        self._running = set()
+        self._closed = False
+
+        self._submitted = 0
+        self._completed = 0
+        self._dropped = 0
+        self._rejected = 0
+        self._failed = 0
+        self._queue_meter = RateMeter(stats_window)
+        self._inference_meter = RateMeter(stats_window)
+
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"InferenceWorker-{i}", daemon=True)
+            for i in range(max_concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, client_id, func, on_result, on_dropped=None, request_id=None):
+        """
+        提交请求
+
+        Args:
+            client_id: 客户端ID
+            func: 执行推理的无参函数，返回值传给on_result
+            on_result: 结果回调，参数为(func的返回值, 耗时字典{queue_ms, inference_ms})，
+                       func抛出异常时返回值为该异常
+            on_dropped: 等待中的请求被同一客户端的新请求替换时的回调，参数为(request_id, 原因)
+            request_id: 客户端提供的请求ID，用于在回调中标识请求
+
+        Returns:
+            是否接受；等待中的客户端数量已达上限时返回False
+        """
+        job = _Job(client_id, request_id, func, on_result, on_dropped)
+        with self._condition:
+            if self._closed:
+                return False
+            previous = self._pending.get(client_id)
+            if previous is None and len(self._pending) >= self.max_pending:
+                self._rejected += 1
+                return False
+
+            self._pending[client_id] = job
+            self._submitted += 1
+            if previous is None:
+                if client_id not in self._running:
+                    self._ready.append(client_id)
+                    self._condition.notify()
+            else:
+                self._dropped += 1
+
+        if previous is not None:
+            self._notify_dropped(previous, DROP_SUPERSEDED)
+        return True
+
+    def cancel(self, client_id):
+        """
+        取消客户端等待中的请求（客户端断开连接时调用），不调用on_dropped，执行中的请求不受影响
+
+        Returns:
+            是否有被取消的请求
+        """
+        with self._condition:
+            job = self._pending.pop(client_id, None)
+            if job is None:
+                return False
+            if client_id in self._ready:
+                self._ready.remove(client_id)
+            self._dropped += 1
+            return True
+
+    def close(self, timeout=5.0):
+        """停止执行线程，等待中的请求不再执行"""
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            self._ready.clear()
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def get_stats(self):
+        """
+        获取执行器统计信息
+
+        Returns:
+            统计字典，等待时间(queue_ms)和推理时间(inference_ms)分开统计
+        """
+        now = time.perf_counter()
+        _, queue_ms, queue_max_ms = self._queue_meter.snapshot(now)
+        throughput, inference_ms, inference_max_ms = self._inference_meter.snapshot(now)
+        with self._condition:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'max_pending': self.max_pending,
+                'running': len(self._running),
+                'pending': len(self._pending),
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'dropped': self._dropped,
+                'rejected': self._rejected,
+                'requests_per_second': round(throughput, 2),
+                'queue_ms': _round_ms(queue_ms),
+                'queue_max_ms': _round_ms(queue_max_ms),
+                'inference_ms': _round_ms(inference_ms),
+                'inference_max_ms': _round_ms(inference_max_ms)
+            }
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._ready and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                client_id = self._ready.popleft()
+                job = self._pending.pop(client_id)
+                self._running.add(client_id)
+
+            started = time.perf_counter()
+            failed = False
+            try:
+                result = job.func()
+            except Exception as e:
+                result = e
+                failed = True
+            finished = time.perf_counter()
+
+            timing = {
+                'queue_ms': round((started - job.submitted_at) * 1000, 3),
+                'inference_ms': round((finished - started) * 1000, 3)
+            }
+            self._queue_meter.add(finished, timing['queue_ms'])
+            self._inference_meter.add(finished, timing['inference_ms'])
+            try:
+                job.on_result(result, timing)
+            except Exception as e:
+                logger.throttled('result_callback', _ERROR_LOG_INTERVAL, f"推理结果回调失败: {str(e)}", level='error')
+
+            with self._condition:
+                self._running.discard(client_id)
+                if failed:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+                # 执行期间该客户端又提交了请求，重新排队
+                if client_id in self._pending:
+                    self._ready.append(client_id)
+                    self._condition.notify()
+
+    def _notify_dropped(self, job, reason):
+        if job.on_dropped is None:
+            return
+        try:
+            job.on_dropped(job.request_id, reason)
+        except Exception as e:
+            logger.throttled('dropped_callback', _ERROR_LOG_INTERVAL, f"请求丢弃回调失败: {str(e)}", level='error')
+
+
+def _round_ms(value):
+    return round(value, 3) if value is not None else None
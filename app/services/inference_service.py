@@ -0,0 +1,71 @@
+"""
+推理执行服务模块
+WebSocket检测请求通过全局的有界推理执行器执行，处理器线程只负责提交请求
+"""
+import threading
+from flask import current_app
+
+from app.services.inference_executor import InferenceExecutor, get_inference_settings
+from app.utils.config_store import get_app_config_store
+
+# 全局推理执行器，首次提交请求时按配置创建
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_inference_executor():
+    """
+    获取全局推理执行器，首次调用时按config.json中的inference配置创建
+    
+    Returns:
+        InferenceExecutor实例
+    """
+    global _executor
+    
+    with _executor_lock:
+        if _executor is None:
+            settings = get_inference_settings(get_app_config_store().snapshot())
+            _executor = InferenceExecutor(settings['max_concurrency'], settings['max_pending'],
+                                          settings['stats_window'])
+            current_app.logger.info(f"推理执行器已创建: 并发 {settings['max_concurrency']}, "
+                                    f"等待上限 {settings['max_pending']}")
+        return _executor
+
+def submit_inference(client_id, func, on_result, on_dropped=None, request_id=None):
+    """
+    提交检测请求，在执行器线程中以当前应用上下文执行
+    
+    Args:
+        client_id: 客户端ID(Socket.IO会话ID)
+        func: 执行检测的无参函数
+        on_result: 结果回调，参数为(func的返回值或异常, 耗时字典{queue_ms, inference_ms})
+        on_dropped: 等待中的请求被同一客户端的新请求替换时的回调，参数为(request_id, 原因)
+        request_id: 客户端提供的请求ID
+        
+    Returns:
+        是否接受；等待中的客户端过多时返回False
+    """
+    app = current_app._get_current_object()
+    
+    def run():
+        with app.app_context():
+            return func()
+    
+    return get_inference_executor().submit(client_id, run, on_result, on_dropped, request_id)
+
+def cancel_client_inference(client_id):
+    """客户端断开连接时取消其等待中的请求"""
+    if _executor is not None:
+        _executor.cancel(client_id)
+
+def get_inference_stats():
+    """
+    获取推理执行器统计信息
+    
+    Returns:
+        统计字典，执行器尚未创建时只包含配置
+    """
+    if _executor is None:
+        settings = get_inference_settings(get_app_config_store().snapshot())
+        return {'max_concurrency': settings['max_concurrency'], 'max_pending': settings['max_pending'],
+                'running': 0, 'pending': 0, 'submitted': 0}
+    return _executor.get_stats()
@@ -2,24 +2,23 @@
 逻辑规则服务模块
 处理逻辑规则配置的保存、获取和删除
 """
-import os
-import json
 from flask import current_app
+from app.utils.config_store import get_app_config_store
+from app.yolomodel.metrics import stage, STAGE_RULE_VALIDATE
+from app.services.rule_compiler import compile_logic_rule, get_rule_plan, invalidate_rule_plan
+from app.services.temporal_rules import TemporalRuleTracker, compile_temporal_rule
+
+# 各视频源和客户端的时序规则状态
+_rule_states = TemporalRuleTracker()
 
 def get_config():
     """
     获取全局配置
     
     Returns:
-        dict: 配置信息
+        dict: 配置信息副本
     """
-    config_path = os.path.join(current_app.config['ROOT_DIR'], 'config.json')
-    try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        current_app.logger.error(f"获取配置失败: {str(e)}")
-        return {}
+    return get_app_config_store().get_config()
 
 def save_config(config):
     """
@@ -31,29 +30,17 @@ def save_config(config):
     Returns:
         bool: 是否保存成功
     """
-    config_path = os.path.join(current_app.config['ROOT_DIR'], 'config.json')
-    try:
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=4)
-        return True
-    except Exception as e:
-        current_app.logger.error(f"保存配置失败: {str(e)}")
-        return False
+    return get_app_config_store().save(config)
 
 def get_logic_rules():
     """
     获取所有逻辑规则配置
     
     Returns:
-        dict: 所有逻辑规则配置
+        dict: 所有逻辑规则配置（只读）
     """
     try:
-        config = get_config()
-        # 确保logic_rules字段存在
-        if 'logic_rules' not in config:
-            config['logic_rules'] = {}
-            save_config(config)
-        return config['logic_rules']
+        return get_app_config_store().get_logic_rules()
     except Exception as e:
         current_app.logger.error(f"获取逻辑规则配置失败: {str(e)}")
         return {}
@@ -72,21 +59,27 @@ def save_logic_rule(rule_name, roi_config, model, rules):
         tuple: (是否成功, 消息)
     """
     try:
-        config = get_config()
-        
-        # 确保logic_rules字段存在
-        if 'logic_rules' not in config:
-            config['logic_rules'] = {}
-        
-        # 保存规则配置
-        config['logic_rules'][rule_name] = {
-            'roi_config': roi_config,
-            'model': model,
-            'rules': rules
-        }
+        # 保存前编译一次，拒绝运算符、数量或时序条件无效的规则
+        try:
+            compile_temporal_rule({'rules': rules})
+        except ValueError as e:
+            return False, f"规则无效: {str(e)}"
+        
+        def update(config):
+            # 确保logic_rules字段存在
+            if 'logic_rules' not in config:
+                config['logic_rules'] = {}
+            
+            # 保存规则配置
+            config['logic_rules'][rule_name] = {
+                'roi_config': roi_config,
+                'model': model,
+                'rules': rules
+            }
         
         # 保存配置
-        if save_config(config):
+        if get_app_config_store().update(update):
+            invalidate_rule_plan(rule_name)
             return True, f"规则配置 '{rule_name}' 保存成功"
         else:
             return False, "保存配置文件失败"
@@ -105,17 +98,19 @@ def delete_logic_rule(rule_name):
         tuple: (是否成功, 消息)
     """
     try:
-        config = get_config()
+        store = get_app_config_store()
         
         # 检查规则是否存在
-        if 'logic_rules' not in config or rule_name not in config['logic_rules']:
+        if rule_name not in store.get_logic_rules():
             return False, f"规则配置 '{rule_name}' 不存在"
         
         # 删除规则
-        del config['logic_rules'][rule_name]
+        def update(config):
+            config.get('logic_rules', {}).pop(rule_name, None)
         
         # 保存配置
-        if save_config(config):
+        if store.update(update):
+            invalidate_rule_plan(rule_name)
             return True, f"规则配置 '{rule_name}' 删除成功"
         else:
             return False, "保存配置文件失败"
@@ -153,66 +148,103 @@ def validate_detection_results(detection_results, rule_name):
         else:
             return False, "检测结果格式无效"
         
-        # 按ROI区域和类别统计检测结果
-        roi_class_counts = {}
-        for detection in detections:
-            roi_id = detection.get('roi_id')
-            if roi_id is None:
-                continue
-                
-            class_name = detection.get('class_name')
-            if not class_name:
-                continue
-                
-            if roi_id not in roi_class_counts:
-                roi_class_counts[roi_id] = {}
-                
-            if class_name not in roi_class_counts[roi_id]:
-                roi_class_counts[roi_id][class_name] = 0
-                
-            roi_class_counts[roi_id][class_name] += 1
-        
-        # 验证每条规则
-        all_passed = True
-        failed_rules = []
-        
-        # 获取规则列表
-        rules_list = rule_config.get('rules', [])
-        
-        for rule in rules_list:
-            roi_id = rule.get('roi_id')
-            class_name = rule.get('class')
-            operator = rule.get('operator')
-            count = rule.get('count')
-            
-            # 获取实际数量
-            actual_count = 0
-            if roi_id in roi_class_counts and class_name in roi_class_counts[roi_id]:
-                actual_count = roi_class_counts[roi_id][class_name]
-            
-            # 验证规则
-            passed = False
-            if operator == '==':
-                passed = (actual_count == count)
-            elif operator == '!=':
-                passed = (actual_count != count)
-            elif operator == '>':
-                passed = (actual_count > count)
-            elif operator == '<':
-                passed = (actual_count < count)
-            elif operator == '>=':
-                passed = (actual_count >= count)
-            elif operator == '<=':
-                passed = (actual_count <= count)
-            
-            if not passed:
-                all_passed = False
-                failed_rules.append(f"ROI {roi_id + 1} {class_name} {operator} {count}，实际值: {actual_count}")
-        
-        if all_passed:
-            return True, "所有规则验证通过"
-        else:
-            return False, f"验证失败: {', '.join(failed_rules)}"
+        with stage(STAGE_RULE_VALIDATE, model=rule_config.get('model')):
+            return get_rule_plan(rule_name, rule_config).evaluate(detections)
     except Exception as e:
         current_app.logger.error(f"验证检测结果失败: {str(e)}")
         return False, f"验证失败: {str(e)}"
+
+def validate_detection_batch(frames, rule_name):
+    """
+    一次验证多帧检测结果是否符合逻辑规则，用于离线审计已保存的检测结果
+    
+    Args:
+        frames (list): 多帧检测结果，每帧为检测结果数组或包含detections的字典（如批量任务的结果记录）
+        rule_name (str): 规则配置名称
+        
+    Returns:
+        tuple: (是否成功, 汇总结果字典或错误消息)
+    """
+    try:
+        all_rules = get_logic_rules()
+        if rule_name not in all_rules:
+            return False, f"未找到规则配置 '{rule_name}'"
+        
+        rule_config = all_rules[rule_name]
+        plan = get_rule_plan(rule_name, rule_config)
+        
+        detections = []
+        for frame in frames:
+            if isinstance(frame, dict):
+                frame = frame.get('detections')
+            if not isinstance(frame, list):
+                return False, "检测结果格式无效"
+            detections.append(frame)
+        
+        with stage(STAGE_RULE_VALIDATE, model=rule_config.get('model')):
+            rule_passed, actual = plan.evaluate_batch(detections)
+        
+        results = []
+        for i in range(len(detections)):
+            passed, message = plan.describe(rule_passed[i], actual[i])
+            results.append({'passed': passed, 'message': message})
+        
+        # 每个规则项失败的帧数
+        failed_counts = (~rule_passed).sum(axis=0)
+        rules = [dict(rule, failed=int(failed_counts[i])) for i, rule in enumerate(plan.rules)]
+        
+        passed_count = sum(1 for result in results if result['passed'])
+        return True, {
+            'total': len(results),
+            'passed': passed_count,
+            'failed': len(results) - passed_count,
+            'rules': rules,
+            'results': results
+        }
+    except Exception as e:
+        current_app.logger.error(f"批量验证检测结果失败: {str(e)}")
+        return False, f"验证失败: {str(e)}"
+
+def evaluate_logic_rule(rule_config, detections):
+    """
+    按规则配置验证已分配ROI区域的检测结果，不读取配置文件
+    
+    Args:
+        rule_config (dict): 逻辑规则配置（包含rules列表）
+        detections (list): 检测结果列表
+        
+    Returns:
+        tuple: (是否通过, 消息)
+    """
+    return compile_logic_rule(rule_config).evaluate(detections)
+
+def update_rule_state(key, rule_name, detections, timestamp=None):
+    """
+    用一帧检测结果更新视频源或客户端上的规则状态，包含时序条件（temporal字段）的规则项在连续帧上判断
+    
+    Args:
+        key: 视频源或客户端ID
+        rule_name (str): 规则配置名称
+        detections (list): 已分配ROI区域的检测结果列表
+        timestamp: 单调时钟时间(秒)，默认为当前时间
+        
+    Returns:
+        dict: 规则通过状态发生变化时返回状态变化信息，否则（或规则不存在时）返回None
+    """
+    rule_config = get_logic_rules().get(rule_name)
+    if rule_config is None:
+        return None
+    return _rule_states.update(key, rule_name, rule_config, detections, timestamp)
+
+def get_rule_states(key):
+    """
+    获取视频源或客户端上各规则的当前状态
+    
+    Returns:
+        dict: 按规则名称索引的状态
+    """
+    return _rule_states.get_states(key)
+
+def reset_rule_states(key):
+    """视频源重新启动或客户端断开连接时丢弃其规则状态"""
+    _rule_states.reset(key)
@@ -0,0 +1,286 @@
+"""
+模型注册表模块
+缓存多个已加载的检测器，按数量和估算内存进行LRU淘汰
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from app.yolomodel.logger import get_logger
+
+
+def estimate_detector_memory(detector):
+    """
+    估算检测器占用的内存
+
+    以模型文件大小近似权重占用，再加上一个输入批次的张量大小
+
+    Args:
+        detector: YOLODetector实例
+
+    Returns:
+        估算的内存字节数
+    """
+    model_bytes = 0
+    try:
+        model_bytes = os.path.getsize(detector.model_path)
+    except OSError:
+        pass
+
+    input_bytes = 0
+    if isinstance(detector.input_width, int) and isinstance(detector.input_height, int):
+        input_bytes = detector.batch_size * 3 * detector.input_width * detector.input_height * 4
+
+    return model_bytes + input_bytes
+
+
+class _RegistryEntry:
+    """注册表中的单个检测器记录"""
+
+    __slots__ = ('detector', 'fingerprint', 'memory_bytes', 'load_time', 'loaded_at', 'last_used', 'hits')
+
+    def __init__(self, detector, fingerprint, memory_bytes, load_time):
+        self.detector = detector
+        self.fingerprint = fingerprint
+        self.memory_bytes = memory_bytes
+        self.load_time = load_time
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.hits = 0
+
+
+class ModelRegistry:
+    """
+    已加载检测器的注册表
+
+    以模型名称为键缓存检测器，超过数量上限或内存上限时淘汰最久未使用的检测器。
+    同一模型的并发加载请求会被合并为一次加载。
+    """
+
+    def __init__(self, max_models=3, max_memory_mb=2048):
+        """
+        初始化注册表
+
+        Args:
+            max_models: 最多同时加载的模型数量
+            max_memory_mb: 已加载模型的估算内存上限(MB)，0表示不限制
+        """
+        self.max_models = max(1, int(max_models))
+        self.max_memory_bytes = max(0, int(max_memory_mb)) * 1024 * 1024
+        self.logger = get_logger("APP", "info")
+
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_locks = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._load_times = {}
+
+    def configure(self, max_models=None, max_memory_mb=None):
+        """
+        更新注册表容量限制，并立即按新限制淘汰
+
+        Args:
+            max_models: 最多同时加载的模型数量
+            max_memory_mb: 已加载模型的估算内存上限(MB)
+        """
+        with self._lock:
+            if max_models is not None:
+                self.max_models = max(1, int(max_models))
+            if max_memory_mb is not None:
+                self.max_memory_bytes = max(0, int(max_memory_mb)) * 1024 * 1024
+            evicted = self._evict()
+        self._close_all(evicted)
+
+    def _get_load_lock(self, name):
+        """获取指定模型的加载锁"""
+        with self._lock:
+            if name not in self._load_locks:
+                self._load_locks[name] = threading.Lock()
+            return self._load_locks[name]
+
+    def peek(self, name):
+        """
+        查看已加载的检测器，不更新使用顺序和命中统计
+
+        Returns:
+            检测器实例，未加载时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry.detector if entry else None
+
+    def get(self, name, fingerprint=None):
+        """
+        获取已加载的检测器并更新使用顺序
+
+        Args:
+            name: 模型名称
+            fingerprint: 模型文件指纹，提供时只返回指纹一致的检测器
+
+        Returns:
+            检测器实例，未加载或指纹不一致时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            if fingerprint is not None and entry.fingerprint != fingerprint:
+                return None
+            self._entries.move_to_end(name)
+            entry.last_used = time.time()
+            entry.hits += 1
+            self._hits += 1
+            return entry.detector
+
+    def get_or_load(self, name, loader, fingerprint=None):
+        """
+        获取检测器，未加载或模型文件指纹变化时调用loader加载
+
+        Args:
+            name: 模型名称
+            loader: 无参可调用对象，返回新的检测器实例
+            fingerprint: 模型文件指纹(路径、修改时间、大小)
+
+        Returns:
+            检测器实例
+        """
+        detector = self.get(name, fingerprint)
+        if detector is not None:
+            return detector
+
+        # 同一模型同一时间只允许一个线程加载，其余线程等待后直接复用结果
+        with self._get_load_lock(name):
+            detector = self.get(name, fingerprint)
+            if detector is not None:
+                return detector
+
+            with self._lock:
+                self._misses += 1
+
+            start_time = time.time()
+            detector = loader()
+            load_time = time.time() - start_time
+
+            self.put(name, detector, load_time, fingerprint)
+            self.logger.info(f"模型 '{name}' 已加载到注册表，耗时: {load_time*1000:.2f} ms")
+            return detector
+
+    def put(self, name, detector, load_time=0.0, fingerprint=None):
+        """
+        放入检测器，替换同名的旧检测器
+
+        Args:
+            name: 模型名称
+            detector: 检测器实例
+            load_time: 加载耗时(秒)
+            fingerprint: 模型文件指纹
+        """
+        with self._lock:
+            old_entry = self._entries.pop(name, None)
+            released = []
+            if old_entry is not None and old_entry.detector is not detector:
+                released.append(old_entry.detector)
+
+            self._entries[name] = _RegistryEntry(detector, fingerprint,
+                                                 estimate_detector_memory(detector), load_time)
+            load_stats = self._load_times.setdefault(name, {'count': 0, 'total': 0.0, 'last': 0.0})
+            load_stats['count'] += 1
+            load_stats['total'] += load_time
+            load_stats['last'] = load_time
+            released.extend(self._evict(keep=name))
+        self._close_all(released)
+
+    def remove(self, name):
+        """
+        移除并释放指定模型的检测器
+
+        Returns:
+            是否移除了检测器
+        """
+        with self._lock:
+            entry = self._entries.pop(name, None)
+        if entry is None:
+            return False
+        entry.detector.close()
+        return True
+
+    def _total_memory(self):
+        """已加载检测器的估算内存总和"""
+        return sum(entry.memory_bytes for entry in self._entries.values())
+
+    def _evict(self, keep=None):
+        """
+        按LRU顺序淘汰超出限制的检测器，需要持有self._lock调用
+
+        Returns:
+            被淘汰的检测器列表，由调用方在释放锁之后关闭
+        """
+        evicted = []
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_models or
+                (self.max_memory_bytes and self._total_memory() > self.max_memory_bytes)):
+            name = next(iter(self._entries))
+            if name == keep:
+                # 刚放入的检测器不参与淘汰，将其移到末尾
+                self._entries.move_to_end(name)
+                name = next(iter(self._entries))
+                if name == keep:
+                    break
+            entry = self._entries.pop(name)
+            evicted.append(entry.detector)
+            self._evictions += 1
+            self.logger.info(f"模型 '{name}' 已从注册表淘汰")
+        return evicted
+
+    @staticmethod
+    def _close_all(detectors):
+        """
+        关闭被淘汰或替换的检测器
+
+        关闭时要等待批处理调度器完成当前批次，必须在释放self._lock之后调用，避免阻塞其他模型的请求；
+        已取得这些检测器的请求仍可完成：批处理调度器停止后改为直接推理
+        """
+        for detector in detectors:
+            detector.close()
+
+    def get_stats(self):
+        """
+        获取注册表统计信息
+
+        Returns:
+            包含命中、未命中、淘汰次数和每个模型加载耗时的字典
+        """
+        with self._lock:
+            models = []
+            for name, entry in self._entries.items():
+                models.append({
+                    'name': name,
+                    'memory_mb': entry.memory_bytes / (1024 * 1024),
+                    'load_time_ms': entry.load_time * 1000,
+                    'loaded_at': entry.loaded_at,
+                    'last_used': entry.last_used,
+                    'hits': entry.hits
+                })
+
+            load_times = {}
+            for name, load_stats in self._load_times.items():
+                load_times[name] = {
+                    'count': load_stats['count'],
+                    'last_ms': load_stats['last'] * 1000,
+                    'avg_ms': load_stats['total'] * 1000 / load_stats['count']
+                }
+
+            return {
+                'max_models': self.max_models,
+                'max_memory_mb': self.max_memory_bytes / (1024 * 1024),
+                'memory_mb': self._total_memory() / (1024 * 1024),
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'loaded_models': models,
+                'load_times': load_times
+            }
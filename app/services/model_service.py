@@ -4,27 +4,34 @@
 """
 import os
 import json
+import threading
 from flask import current_app
 from app.yolo_detector import YOLODetector
-import onnxruntime as ort
+from app.services.model_registry import ModelRegistry
+from app.yolomodel.runtime import validate_runtime_config, create_session
+from app.yolomodel.nms import validate_nms_config
+from app.yolomodel.model_cache import warm_models
+from app.utils.path_utils import get_model_cache_dir
+from app.utils.config_store import get_app_config_store
+from app.yolomodel.logger import get_logger
 
-# 创建全局检测器对象，将在应用中使用
-detector = None
+logger = get_logger("APP")
+
+# 已加载检测器的注册表，首次使用时按配置创建
+registry = None
+_registry_lock = threading.Lock()
+
+# 当前模型名称
+current_model_name = None
 
 def get_config():
     """
     获取应用配置文件
     
     Returns:
-        配置字典，如果读取失败则返回空字典
+        配置字典副本，如果读取失败则返回空字典
     """
-    config_path = os.path.join(current_app.config['ROOT_DIR'], 'config.json')
-    try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"配置读取失败: {e}")
-        return {}
+    return get_app_config_store().get_config()
 
 def save_config(config):
     """
@@ -36,26 +43,18 @@ def save_config(config):
     Returns:
         是否保存成功
     """
-    config_path = os.path.join(current_app.config['ROOT_DIR'], 'config.json')
-    try:
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
-        return True
-    except Exception as e:
-        print(f"配置保存失败: {e}")
-        return False
+    return get_app_config_store().save(config)
 
 def get_models():
     """
     获取所有模型列表
     
     Returns:
-        模型列表
+        模型列表（只读）
     """
-    config = get_config()
-    return config.get('models', [])
+    return get_app_config_store().get_models()
 
-def add_model(name, path, model_type=None, description=''):
+def add_model(name, path, model_type=None, description='', runtime=None, postprocess=None):
     """
     添加新模型到配置
     
@@ -64,6 +63,8 @@ def add_model(name, path, model_type=None, description=''):
         path: 模型路径
         model_type: 模型类型，如果为None则尝试自动检测
         description: 模型描述
+        runtime: ONNX Runtime会话配置，可选
+        postprocess: 后处理/NMS配置，可选
         
     Returns:
         (成功标志, 模型信息或错误信息)
@@ -76,24 +77,35 @@ def add_model(name, path, model_type=None, description=''):
     if not os.path.exists(model_file_path):
         return False, f'模型文件不存在: {model_file_path}'
     
+    # 校验运行时配置
+    try:
+        runtime_config = validate_runtime_config(runtime)
+    except ValueError as e:
+        return False, f'无效的运行时配置: {str(e)}'
+    
+    # 校验后处理配置
+    try:
+        postprocess_config = validate_nms_config(postprocess)
+    except ValueError as e:
+        return False, f'无效的后处理配置: {str(e)}'
+    
     # 如果未指定模型类型，尝试自动检测
     detected_type = model_type
     if not detected_type:
-        detected_type = detect_model_type(model_file_path)
+        detected_type = detect_model_type(model_file_path, runtime_config)
     
     # 尝试加载模型提取类别信息
     classes = None
     try:
         from app.yolomodel.class_utils import ClassManager
-        import onnxruntime as ort
         
         # 创建临时会话提取类别
-        session = ort.InferenceSession(model_file_path)
+        session = create_session(model_file_path, runtime_config)
         class_manager = ClassManager(model_file_path, session)
         classes = class_manager.extract_classes_from_model()
-        print(f"从模型 {name} 提取到类别信息: {classes}")
+        logger.info(f"从模型 {name} 提取到 {len(classes or [])} 个类别名称")
     except Exception as e:
-        print(f"提取类别信息失败: {str(e)}")
+        logger.warning(f"提取类别信息失败: {str(e)}")
     
     # 创建模型记录
     new_model = {
@@ -107,6 +119,12 @@ def add_model(name, path, model_type=None, description=''):
     if classes:
         new_model['classes'] = classes
     
+    if runtime_config:
+        new_model['runtime'] = runtime_config
+    
+    if postprocess_config:
+        new_model['postprocess'] = postprocess_config
+    
     # 将模型添加到配置
     config = get_config()
     if 'models' not in config:
@@ -118,6 +136,11 @@ def add_model(name, path, model_type=None, description=''):
             # 保留原有类别信息（如果存在且当前未提取到）
             if 'classes' in model and not classes:
                 new_model['classes'] = model['classes']
+            # 未提供新的运行时配置时保留原有配置
+            if 'runtime' in model and runtime is None:
+                new_model['runtime'] = model['runtime']
+            if 'postprocess' in model and postprocess is None:
+                new_model['postprocess'] = model['postprocess']
                 
             config['models'][i] = new_model
             if save_config(config):
@@ -132,12 +155,13 @@ def add_model(name, path, model_type=None, description=''):
     else:
         return False, '无法保存模型配置'
 
-def detect_model_type(model_path):
+def detect_model_type(model_path, runtime_config=None):
     """
     尝试检测模型类型
     
     Args:
         model_path: 模型文件路径
+        runtime_config: ONNX Runtime会话配置，可选
         
     Returns:
         检测到的模型类型，如果无法检测则返回None
@@ -153,7 +177,7 @@ def detect_model_type(model_path):
     
     # 尝试加载模型，从元数据判断
     try:
-        session = ort.InferenceSession(model_path)
+        session = create_session(model_path, runtime_config)
         metadata = session.get_modelmeta()
         
         if hasattr(metadata, 'custom_metadata_map') and metadata.custom_metadata_map:
@@ -202,12 +226,125 @@ def delete_model(model_name):
     if not found:
         return False, f'没有找到名为 {model_name} 的模型'
     
+    # 释放已加载的检测器
+    if registry is not None:
+        registry.remove(model_name)
+    
     # 保存配置
     if save_config(config):
         return True, f'成功删除模型: {model_name}'
     else:
         return False, '无法保存模型配置'
 
+def find_model(model_name, config=None):
+    """
+    在配置中查找指定名称的模型
+    
+    Args:
+        model_name: 模型名称
+        config: 配置字典，为None时读取配置文件
+        
+    Returns:
+        模型配置字典，未找到时返回None
+    """
+    models = get_models() if config is None else config.get('models', [])
+    for model in models:
+        if model['name'] == model_name:
+            return model
+    return None
+
+def resolve_model_path(model_path):
+    """
+    将模型路径解析为绝对路径，相对路径基于应用根目录
+    
+    Args:
+        model_path: 配置中的模型路径
+        
+    Returns:
+        模型文件的绝对路径
+    """
+    if not os.path.isabs(model_path):
+        model_path = os.path.join(current_app.config['ROOT_DIR'], model_path)
+    return model_path
+
+def get_model_fingerprint(model_path):
+    """
+    获取模型文件指纹，用于判断已加载的检测器是否仍然有效
+    
+    Args:
+        model_path: 模型文件的绝对路径
+        
+    Returns:
+        (路径, 修改时间, 文件大小)元组，文件不存在时返回None
+    """
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return None
+    return (model_path, stat.st_mtime_ns, stat.st_size)
+
+def get_registry(config=None):
+    """
+    获取模型注册表，首次调用时按配置创建
+    
+    Args:
+        config: 配置字典，为None时读取配置文件
+        
+    Returns:
+        ModelRegistry实例
+    """
+    global registry
+    if registry is None:
+        with _registry_lock:
+            if registry is None:
+                if config is None:
+                    config = get_app_config_store().snapshot()
+                registry_config = config.get('model', {}).get('registry', {})
+                registry = ModelRegistry(registry_config.get('max_models', 3),
+                                         registry_config.get('max_memory_mb', 2048))
+    return registry
+
+def load_model(model_name, config=None):
+    """
+    获取指定模型的检测器，未加载时加载到注册表
+    
+    Args:
+        model_name: 模型名称
+        config: 配置字典，为None时读取配置文件
+        
+    Returns:
+        (成功标志, 模型信息或错误信息, 模型对象)
+    """
+    if config is None:
+        config = get_app_config_store().snapshot()
+    
+    found_model = find_model(model_name, config)
+    if not found_model:
+        return False, f'没有找到名为 {model_name} 的模型', None
+    
+    model_path = resolve_model_path(found_model['path'])
+    fingerprint = get_model_fingerprint(model_path)
+    if fingerprint is None:
+        return False, f'模型文件不存在: {model_path}', None
+    
+    # 运行时或后处理配置变化时同样需要重新加载
+    fingerprint += (json.dumps({'runtime': found_model.get('runtime'),
+                                'postprocess': found_model.get('postprocess')}, sort_keys=True),)
+    
+    def loader():
+        logger.info(f"正在加载模型，路径: {model_path}")
+        return YOLODetector(model_path, found_model['type'], found_model.get('runtime'),
+                            cache_dir=get_cache_dir(config),
+                            postprocess_config=found_model.get('postprocess'),
+                            model_name=model_name)
+    
+    try:
+        # 模型名称、路径和文件指纹都未变化时直接复用已加载的检测器
+        detector = get_registry(config).get_or_load(model_name, loader, fingerprint)
+        return True, found_model, detector
+    except Exception as e:
+        return False, f'模型加载失败: {str(e)}', None
+
 def set_current_model(model_name):
     """
     设置当前使用的模型
@@ -218,17 +355,12 @@ def set_current_model(model_name):
     Returns:
         (成功标志, 模型信息或错误信息, 模型对象)
     """
-    global detector
+    global current_model_name
     
     config = get_config()
     
     # 寻找模型配置
-    found_model = None
-    for model in config.get('models', []):
-        if model['name'] == model_name:
-            found_model = model
-            break
-    
+    found_model = find_model(model_name, config)
     if not found_model:
         return False, f'没有找到名为 {model_name} 的模型', None
     
@@ -239,50 +371,153 @@ def set_current_model(model_name):
     config['model']['current_model'] = model_name
     save_config(config)
     
-    # 加载模型
-    try:
-        model_path = found_model['path']
-        # 检查路径是否存在，如果是相对路径则转为绝对路径
-        if not os.path.isabs(model_path):
-            model_path = os.path.join(current_app.config['ROOT_DIR'], model_path)
-            
-        print(f"正在加载模型，路径: {model_path}")
-        if not os.path.exists(model_path):
-            return False, f'模型文件不存在: {model_path}', None
-            
-        detector = YOLODetector(model_path, found_model['type'])
-        print(f"已加载模型: {model_name}, 路径: {model_path}")
+    # 加载模型（已在注册表中的模型直接复用）
+    success, result, detector = load_model(model_name, config)
+    if not success:
+        return False, result, None
+    
+    current_model_name = model_name
+    logger.info(f"已加载模型: {model_name}, 路径: {detector.model_path}")
+    
+    # 提取类别信息并更新配置（如果未保存或有变化）
+    if detector.classes:
+        classes = detector.classes
         
-        # 提取类别信息并更新配置（如果未保存或有变化）
-        if detector and detector.classes:
-            classes = detector.classes
-            classes_changed = False
-            
-            # 检查配置中的类别与实际类别是否一致
-            if 'classes' not in found_model or found_model['classes'] != classes:
-                classes_changed = True
-                found_model['classes'] = classes
-                
-                # 更新模型配置
-                for i, model in enumerate(config['models']):
-                    if model['name'] == model_name:
-                        config['models'][i]['classes'] = classes
-                        break
-                
-                # 保存更新后的配置
-                save_config(config)
-                print(f"更新了模型 '{model_name}' 的类别信息: {classes}")
+        # 检查配置中的类别与实际类别是否一致
+        if 'classes' not in found_model or found_model['classes'] != classes:
+            found_model['classes'] = classes
             
-        return True, found_model, detector
-    except Exception as e:
-        return False, f'模型加载失败: {str(e)}', None
+            # 保存更新后的配置
+            save_config(config)
+            logger.info(f"更新了模型 '{model_name}' 的类别信息: {len(classes)} 个类别")
+        
+    return True, found_model, detector
+
+def ensure_current_model_loaded():
+    """
+    确保配置中的当前模型已加载
+    
+    与set_current_model不同，该函数不会写回配置文件；当前模型已加载且模型文件未变化时
+    直接返回已加载的检测器，同一模型的并发加载只会执行一次。
+    
+    Returns:
+        (成功标志, 模型信息或错误信息, 模型对象)，未配置当前模型时返回(False, None, None)
+    """
+    global current_model_name
+    
+    config = get_app_config_store().snapshot()
+    model_name = config.get('model', {}).get('current_model')
+    if not model_name:
+        return False, None, None
+    
+    success, result, detector = load_model(model_name, config)
+    if success:
+        current_model_name = model_name
+    return success, result, detector
+
+def get_detector(model_name=None):
+    """
+    获取检测器实例
+    
+    Args:
+        model_name: 模型名称，为None时返回当前模型的检测器
+        
+    Returns:
+        检测器实例，未加载时返回None
+    """
+    if registry is None:
+        return None
+    if model_name is None:
+        if current_model_name is None:
+            return None
+        return registry.peek(current_model_name)
+    return registry.get(model_name)
+
+def get_current_model_name():
+    """
+    获取当前模型名称
+    
+    Returns:
+        当前模型名称，尚未加载时为None
+    """
+    return current_model_name
+
+def get_registry_stats():
+    """
+    获取模型注册表统计信息
+    
+    Returns:
+        统计信息字典
+    """
+    stats = get_registry().get_stats()
+    stats['current_model'] = current_model_name
+    return stats
+
+def get_cache_dir(config):
+    """
+    获取优化模型缓存目录
+    
+    Args:
+        config: 配置字典
+        
+    Returns:
+        缓存目录路径，如果配置中关闭了缓存则返回None
+    """
+    if not config.get('model', {}).get('optimized_model_cache', True):
+        return None
+    return get_model_cache_dir()
+
+def warm_model_cache():
+    """
+    为配置中的所有模型预热优化模型缓存
+    
+    Returns:
+        每个模型的预热结果列表
+    """
+    return warm_models(get_models(), current_app.config['ROOT_DIR'], get_model_cache_dir())
+
+def get_model_runtime(model_name):
+    """
+    获取指定模型的运行时设置
+    
+    Args:
+        model_name: 模型名称
+        
+    Returns:
+        (成功标志, 运行时设置或错误信息)
+    """
+    found_model = find_model(model_name)
+    if not found_model:
+        return False, f'没有找到名为 {model_name} 的模型'
+    
+    try:
+        configured = validate_runtime_config(found_model.get('runtime'))
+    except ValueError as e:
+        return False, f'无效的运行时配置: {str(e)}'
+    
+    result = {
+        'model': model_name,
+        'configured': configured,
+        'loaded': False,
+        'active': None
+    }
+    
+    # 如果该模型已加载，返回会话实际生效的设置
+    detector = registry.peek(model_name) if registry is not None else None
+    if detector is not None:
+        result['loaded'] = True
+        result.update({k: v for k, v in detector.get_runtime_settings().items() if k != 'configured'})
+    
+    return True, result
 
-def get_detector():
+def get_batching_stats():
     """
-    获取当前检测器实例
+    获取当前检测器的微批处理统计信息
     
     Returns:
-        检测器实例
+        统计信息字典，如果检测器未加载则返回None
     """
-    global detector
-    return detector
+    detector = get_detector()
+    if detector is None:
+        return None
+    return detector.get_batching_stats()
@@ -0,0 +1,312 @@
+"""
+ROI索引模块
+把一个ROI配置编译为画布分辨率的标签图和矩形边界数组，所有检测框一次向量化查表完成ROI分配，
+代替逐个检测框、逐个ROI的判断。
+
+- 矩形ROI按边界精确比较，边界包含在内（落在边界上的点属于该区域）
+- 多边形ROI光栅化到画布像素，点按所在像素查表；标签图中每个像素记录覆盖它的第一个多边形
+- 需要全部匹配的区域或按覆盖比例分配时，使用同一组多边形掩码的按位打包图和积分图
+
+编译结果按(ROI配置名称, 画布尺寸)缓存，配置对象变化（保存或外部修改后重新加载）时自动重建。
+该模块不依赖Flask应用上下文。
+"""
+import threading
+
+import cv2
+import numpy as np
+
+# 不在任何ROI区域内的ID
+NO_ROI = -1
+
+# 重叠区域的分配策略：只取第一个匹配的区域，或取全部匹配的区域
+OVERLAP_FIRST = 'first'
+OVERLAP_ALL = 'all'
+OVERLAP_POLICIES = (OVERLAP_FIRST, OVERLAP_ALL)
+
+# 默认的分配设置(ROI配置中的assignment字段)
+# min_coverage为None时按检测框中心点分配，否则按检测框面积落在区域内的比例分配
+DEFAULT_ASSIGNMENT = {
+    'overlap': OVERLAP_FIRST,
+    'min_coverage': None
+}
+
+
+def get_assignment_settings(roi_config):
+    """
+    合并默认值和ROI配置中的分配设置
+
+    Args:
+        roi_config: ROI配置
+
+    Returns:
+        设置字典
+
+    Raises:
+        ValueError: 设置值无效
+    """
+    settings = dict(DEFAULT_ASSIGNMENT)
+    settings.update(roi_config.get('assignment') or {})
+    if settings['overlap'] not in OVERLAP_POLICIES:
+        raise ValueError(f"overlap 必须是以下之一: {', '.join(OVERLAP_POLICIES)}")
+    coverage = settings['min_coverage']
+    if coverage is not None:
+        if isinstance(coverage, bool) or not isinstance(coverage, (int, float)) or not 0 < coverage <= 1:
+            raise ValueError("min_coverage 必须是(0, 1]之间的数")
+    return settings
+
+
+class RoiIndex:
+    """
+    一个ROI配置在指定画布尺寸上的编译结果
+
+    ROI的顺序即ROI区域ID，与配置中rois列表的下标一致
+    """
+
+    def __init__(self, rois, canvas_shape):
+        """
+        Args:
+            rois: ROI区域定义列表
+            canvas_shape: ROI画布尺寸 (height, width[, channels])
+        """
+        self.height, self.width = int(canvas_shape[0]), int(canvas_shape[1])
+        self.roi_count = len(rois)
+
+        rect_ids, rect_bounds, polygon_ids, polygons = [], [], [], []
+        for roi_id, roi in enumerate(rois):
+            roi_type = roi.get('type')
+            if roi_type == 'rectangle':
+                rect_ids.append(roi_id)
+                rect_bounds.append([roi.get('x1', 0), roi.get('y1', 0), roi.get('x2', 0), roi.get('y2', 0)])
+            elif roi_type == 'polygon' and roi.get('points'):
+                polygon_ids.append(roi_id)
+                polygons.append(np.array([[p['x'], p['y']] for p in roi['points']], np.int32))
+
+        self.rect_ids = np.array(rect_ids, dtype=np.int64)
+        self.rect_bounds = np.array(rect_bounds, dtype=np.float64).reshape(-1, 4)
+        self.polygon_ids = np.array(polygon_ids, dtype=np.int64)
+        self._polygons = polygons
+
+        # 标签图：0表示不在任何多边形内，k表示第k个多边形(从1开始)；倒序绘制使靠前的多边形覆盖靠后的
+        label_dtype = np.uint8 if len(polygons) < 255 else np.uint16
+        self.labels = np.zeros((self.height, self.width), dtype=label_dtype)
+        for ordinal in range(len(polygons) - 1, -1, -1):
+            cv2.fillPoly(self.labels, [polygons[ordinal]], int(ordinal + 1))
+
+        self._lock = threading.Lock()
+        self._packed_masks = None
+        self._integrals = None
+
+    def _get_packed_masks(self):
+        """每个多边形一位的按位打包掩码，形状为(H, W, ceil(P/8))，全部匹配时使用"""
+        if self._packed_masks is None:
+            with self._lock:
+                if self._packed_masks is None:
+                    masks = np.zeros((self.height, self.width, len(self._polygons)), dtype=np.uint8)
+                    for ordinal, polygon in enumerate(self._polygons):
+                        plane = np.zeros((self.height, self.width), dtype=np.uint8)
+                        cv2.fillPoly(plane, [polygon], 1)
+                        masks[:, :, ordinal] = plane
+                    self._packed_masks = np.packbits(masks, axis=2, bitorder='little')
+        return self._packed_masks
+
+    def _get_integrals(self):
+        """每个多边形掩码的积分图，形状为(P, H+1, W+1)，按覆盖比例分配时使用"""
+        if self._integrals is None:
+            packed = self._get_packed_masks()
+            with self._lock:
+                if self._integrals is None:
+                    masks = np.unpackbits(packed, axis=2, count=len(self._polygons), bitorder='little')
+                    self._integrals = np.stack([cv2.integral(np.ascontiguousarray(masks[:, :, ordinal]))
+                                                for ordinal in range(len(self._polygons))])
+        return self._integrals
+
+    def _pixel_indexes(self, x, y):
+        """点所在的像素下标，以及点是否在画布范围内"""
+        inside = (x >= 0) & (x <= self.width) & (y >= 0) & (y <= self.height)
+        columns = np.clip(np.floor(x), 0, self.width - 1).astype(np.intp)
+        rows = np.clip(np.floor(y), 0, self.height - 1).astype(np.intp)
+        return rows, columns, inside
+
+    def first_match(self, x, y):
+        """
+        每个点所在的第一个ROI区域
+
+        Args:
+            x, y: (N,) 画布坐标
+
+        Returns:
+            (N,) ROI区域ID，不在任何区域内为NO_ROI
+        """
+        count = len(x)
+        best = np.full(count, self.roi_count, dtype=np.int64)
+        if len(self.rect_ids):
+            matched = self._rect_contains(x, y)
+            first = self.rect_ids[matched.argmax(axis=1)]
+            best = np.where(matched.any(axis=1), first, best)
+        if len(self.polygon_ids):
+            rows, columns, inside = self._pixel_indexes(x, y)
+            labels = self.labels[rows, columns].astype(np.int64)
+            labels[~inside] = 0
+            first = np.where(labels > 0, self.polygon_ids[np.maximum(labels - 1, 0)], self.roi_count)
+            best = np.minimum(best, first)
+        return np.where(best < self.roi_count, best, NO_ROI)
+
+    def contains(self, x, y):
+        """
+        每个点与每个ROI区域的包含关系
+
+        Args:
+            x, y: (N,) 画布坐标
+
+        Returns:
+            (N, R) 布尔矩阵，R为ROI数量
+        """
+        matrix = np.zeros((len(x), self.roi_count), dtype=bool)
+        if len(self.rect_ids):
+            matrix[:, self.rect_ids] = self._rect_contains(x, y)
+        if len(self.polygon_ids):
+            rows, columns, inside = self._pixel_indexes(x, y)
+            bits = np.unpackbits(self._get_packed_masks()[rows, columns], axis=1,
+                                 count=len(self.polygon_ids), bitorder='little').astype(bool)
+            bits[~inside] = False
+            matrix[:, self.polygon_ids] = bits
+        return matrix
+
+    def coverage(self, boxes):
+        """
+        每个检测框落在每个ROI区域内的面积比例
+
+        矩形ROI按几何面积精确计算，多边形ROI按画布像素计数
+
+        Args:
+            boxes: (N, 4) 画布坐标的检测框 x1, y1, x2, y2
+
+        Returns:
+            (N, R) 0到1之间的比例
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        result = np.zeros((len(boxes), self.roi_count), dtype=np.float64)
+        if len(boxes) == 0:
+            return result
+
+        if len(self.rect_ids):
+            bounds = self.rect_bounds[None, :, :]
+            b = boxes[:, None, :]
+            width = np.minimum(b[..., 2], bounds[..., 2]) - np.maximum(b[..., 0], bounds[..., 0])
+            height = np.minimum(b[..., 3], bounds[..., 3]) - np.maximum(b[..., 1], bounds[..., 1])
+            area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+            overlap = np.clip(width, 0, None) * np.clip(height, 0, None)
+            result[:, self.rect_ids] = overlap / np.maximum(area, 1e-9)[:, None]
+
+        if len(self.polygon_ids):
+            integrals = self._get_integrals()
+            x1 = np.floor(boxes[:, 0])
+            y1 = np.floor(boxes[:, 1])
+            x2 = np.maximum(np.ceil(boxes[:, 2]), x1 + 1)
+            y2 = np.maximum(np.ceil(boxes[:, 3]), y1 + 1)
+            # 画布以外的部分计入检测框面积，但不在任何区域内
+            cx1, cx2 = (np.clip(v, 0, self.width).astype(np.intp) for v in (x1, x2))
+            cy1, cy2 = (np.clip(v, 0, self.height).astype(np.intp) for v in (y1, y2))
+            inside = (integrals[:, cy2, cx2] - integrals[:, cy1, cx2]
+                      - integrals[:, cy2, cx1] + integrals[:, cy1, cx1])
+            result[:, self.polygon_ids] = (inside / ((x2 - x1) * (y2 - y1))).T
+
+        return np.clip(result, 0.0, 1.0)
+
+    def assign(self, boxes, overlap=OVERLAP_FIRST, min_coverage=None):
+        """
+        为检测框分配ROI区域
+
+        Args:
+            boxes: (N, 4) 画布坐标的检测框
+            overlap: 'first'只取第一个匹配的区域，'all'取全部匹配的区域
+            min_coverage: 为None时按中心点分配；否则检测框面积落在区域内的比例不低于该值时匹配，
+                          'first'策略下取比例最大的区域（相同时取ID较小的）
+
+        Returns:
+            (roi_ids, matches)：roi_ids为(N,)的第一个匹配区域ID（NO_ROI表示没有），
+            overlap为'all'时matches为(N, R)布尔矩阵，否则为None
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if len(boxes) == 0 or self.roi_count == 0:
+            empty = np.zeros((len(boxes), self.roi_count), dtype=bool) if overlap == OVERLAP_ALL else None
+            return np.full(len(boxes), NO_ROI, dtype=np.int64), empty
+
+        if min_coverage is None:
+            centers_x = (boxes[:, 0] + boxes[:, 2]) / 2
+            centers_y = (boxes[:, 1] + boxes[:, 3]) / 2
+            if overlap == OVERLAP_FIRST:
+                return self.first_match(centers_x, centers_y), None
+            matches = self.contains(centers_x, centers_y)
+            return _first_true(matches), matches
+
+        coverage = self.coverage(boxes)
+        matches = coverage >= min_coverage
+        if overlap == OVERLAP_ALL:
+            return _first_true(matches), matches
+        best = coverage.argmax(axis=1)
+        return np.where(matches[np.arange(len(boxes)), best], best, NO_ROI), None
+
+    def _rect_contains(self, x, y):
+        bounds = self.rect_bounds
+        x = np.asarray(x, dtype=np.float64)[:, None]
+        y = np.asarray(y, dtype=np.float64)[:, None]
+        return (x >= bounds[:, 0]) & (x <= bounds[:, 2]) & (y >= bounds[:, 1]) & (y <= bounds[:, 3])
+
+
+def _first_true(matches):
+    return np.where(matches.any(axis=1), matches.argmax(axis=1), NO_ROI)
+
+
+class RoiIndexCache:
+    """按(ROI配置名称, 画布尺寸)缓存编译后的ROI索引，ROI列表对象变化时重建"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, roi_config, canvas_shape):
+        """
+        获取ROI配置的索引
+
+        以配置中的rois列表对象本身作为版本标识：配置保存或被外部修改后重新加载，列表对象随之变化
+
+        Args:
+            roi_config: ROI配置
+            canvas_shape: ROI画布尺寸 (height, width[, channels])
+
+        Returns:
+            RoiIndex
+        """
+        rois = roi_config.get('rois') or []
+        key = (roi_config.get('name'), int(canvas_shape[0]), int(canvas_shape[1]))
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is rois:
+            return entry[1]
+
+        index = RoiIndex(rois, canvas_shape)
+        with self._lock:
+            self._entries[key] = (rois, index)
+        return index
+
+    def invalidate(self, config_name=None):
+        """丢弃指定ROI配置（为None时全部）的索引"""
+        with self._lock:
+            if config_name is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == config_name]:
+                    del self._entries[key]
+
+
+_cache = RoiIndexCache()
+
+
+def get_roi_index(roi_config, canvas_shape):
+    """获取进程内缓存的ROI索引"""
+    return _cache.get(roi_config, canvas_shape)
+
+
+def invalidate_roi_index(config_name=None):
+    """ROI配置保存或删除后丢弃缓存的索引"""
+    _cache.invalidate(config_name)
@@ -0,0 +1,190 @@
+"""
+ROI叠加层模块
+把一个ROI配置的边框和编号标签在指定帧尺寸上绘制一次，保存为颜色层和掩码，
+每帧只需一次带掩码的复制即可合成到结果图像上，不再逐帧绘制矩形、多边形和文字。
+
+叠加层按(ROI配置名称, 帧尺寸, 画布到图像的换算参数)缓存，配置对象变化（保存或外部修改后重新加载）时自动重建。
+该模块不依赖Flask应用上下文。
+"""
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# 缓存的叠加层数量上限（原始图像坐标系下每种图像尺寸各有一个叠加层）
+MAX_OVERLAYS = 32
+
+# 未指定颜色的ROI区域使用蓝色
+DEFAULT_ROI_COLOR = '#007bff'
+
+
+def hex_to_bgr(hex_color):
+    """
+    将16进制颜色转换为BGR
+
+    Args:
+        hex_color: 16进制颜色代码（例如#FF0000）
+
+    Returns:
+        BGR颜色元组
+    """
+    hex_color = hex_color.lstrip('#')
+    r = int(hex_color[0:2], 16)
+    g = int(hex_color[2:4], 16)
+    b = int(hex_color[4:6], 16)
+    return (b, g, r)
+
+
+class RoiOverlay:
+    """
+    一个ROI配置在指定帧尺寸上的叠加层
+
+    边框和文字按原来的顺序绘制在黑色颜色层和覆盖度掩码上（颜色层即预乘了覆盖度的颜色），
+    只保留覆盖区域的外接矩形。完全覆盖的像素通过一次带掩码的复制合成；文字抗锯齿边缘等部分覆盖的像素
+    数量很少，单独按覆盖度混合
+    """
+
+    def __init__(self, rois, frame_shape, preprocess_params=None):
+        """
+        Args:
+            rois: ROI区域定义列表
+            frame_shape: 叠加目标图像的尺寸 (height, width[, channels])
+            preprocess_params: 预处理参数，提供时将ROI从画布坐标换算到原始图像坐标
+        """
+        self.height, self.width = int(frame_shape[0]), int(frame_shape[1])
+
+        # 颜色层和覆盖度掩码用相同的图元绘制，后绘制的区域覆盖先绘制的区域
+        layer = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        coverage = np.zeros((self.height, self.width), dtype=np.uint8)
+        for roi_id, roi in enumerate(rois):
+            color = hex_to_bgr(roi.get('color', DEFAULT_ROI_COLOR))
+            for target, target_color in ((layer, color), (coverage, 255)):
+                _draw_roi(target, roi, roi_id, target_color, preprocess_params)
+
+        ys, xs = np.nonzero(coverage)
+        if len(ys) == 0:
+            self.bounds = None
+            return
+        y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+        self.bounds = (y0, y1, x0, x1)
+        self.layer = layer[y0:y1, x0:x1].copy()
+        self.mask = np.where(coverage[y0:y1, x0:x1] == 255, 255, 0).astype(np.uint8)
+
+        partial = (coverage > 0) & (coverage < 255)
+        self.partial_ys, self.partial_xs = np.nonzero(partial)
+        alpha = coverage[partial].astype(np.float32)[:, None] / 255
+        self.partial_keep = 1 - alpha
+        self.partial_colors = layer[partial].astype(np.float32) + 0.5
+
+    def apply(self, image):
+        """
+        把叠加层原地合成到图像上
+
+        Args:
+            image: 与叠加层尺寸相同的BGR图像
+
+        Returns:
+            传入的图像
+        """
+        if image.shape[0] != self.height or image.shape[1] != self.width:
+            raise ValueError(f"图像尺寸 {image.shape[1]}x{image.shape[0]} 与ROI叠加层 "
+                             f"{self.width}x{self.height} 不一致")
+        if self.bounds is None:
+            return image
+
+        y0, y1, x0, x1 = self.bounds
+        cv2.copyTo(self.layer, self.mask, image[y0:y1, x0:x1])
+        if len(self.partial_ys):
+            ys, xs = self.partial_ys, self.partial_xs
+            image[ys, xs] = (image[ys, xs] * self.partial_keep + self.partial_colors).astype(np.uint8)
+        return image
+
+
+def _draw_roi(target, roi, roi_id, color, preprocess_params):
+    """在目标图像上绘制一个ROI区域的边框和编号标签（编号从1开始）"""
+    def to_image(x, y):
+        """画布坐标 -> 图像坐标"""
+        if preprocess_params:
+            x = (x - preprocess_params['offset_x']) / preprocess_params['scale']
+            y = (y - preprocess_params['offset_y']) / preprocess_params['scale']
+        return int(x), int(y)
+
+    label = f"ROI {roi_id + 1}"
+    roi_type = roi.get('type')
+    if roi_type == 'rectangle':
+        x1, y1 = to_image(roi.get('x1', 0), roi.get('y1', 0))
+        x2, y2 = to_image(roi.get('x2', 0), roi.get('y2', 0))
+        cv2.rectangle(target, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(target, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    elif roi_type == 'polygon':
+        points = roi.get('points', [])
+        if points:
+            poly_points = np.array([to_image(p['x'], p['y']) for p in points], np.int32).reshape((-1, 1, 2))
+            cv2.polylines(target, [poly_points], True, color, 2)
+            # 标签位于第一个点上方
+            label_x, label_y = to_image(points[0]['x'], points[0]['y'])
+            cv2.putText(target, label, (label_x, label_y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+
+class RoiOverlayCache:
+    """按(ROI配置名称, 帧尺寸, 换算参数)缓存叠加层，ROI列表对象变化时重建，超过上限时淘汰最久未使用的"""
+
+    def __init__(self, max_entries=MAX_OVERLAYS):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, roi_config, frame_shape, preprocess_params=None):
+        """
+        获取ROI配置的叠加层
+
+        Args:
+            roi_config: ROI配置
+            frame_shape: 叠加目标图像的尺寸 (height, width[, channels])
+            preprocess_params: 预处理参数，提供时将ROI从画布坐标换算到原始图像坐标
+
+        Returns:
+            RoiOverlay
+        """
+        rois = roi_config.get('rois') or []
+        params_key = None
+        if preprocess_params:
+            params_key = (preprocess_params['scale'], preprocess_params['offset_x'], preprocess_params['offset_y'])
+        key = (roi_config.get('name'), int(frame_shape[0]), int(frame_shape[1]), params_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is rois:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        overlay = RoiOverlay(rois, frame_shape, preprocess_params)
+        with self._lock:
+            self._entries[key] = (rois, overlay)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return overlay
+
+    def invalidate(self, config_name=None):
+        """丢弃指定ROI配置（为None时全部）的叠加层"""
+        with self._lock:
+            if config_name is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == config_name]:
+                    del self._entries[key]
+
+
+_cache = RoiOverlayCache()
+
+
+def get_roi_overlay(roi_config, frame_shape, preprocess_params=None):
+    """获取进程内缓存的ROI叠加层"""
+    return _cache.get(roi_config, frame_shape, preprocess_params)
+
+
+def invalidate_roi_overlay(config_name=None):
+    """ROI配置保存或删除后丢弃缓存的叠加层"""
+    _cache.invalidate(config_name)
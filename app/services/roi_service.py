@@ -3,27 +3,29 @@ ROI服务模块
 处理ROI区域的管理和操作
 """
 import os
-import json
 from flask import current_app
 import cv2
 from app.yolomodel.preprocessor import ImagePreprocessor
 from app.utils.file_utils import save_uploaded_file
+from app.utils.config_store import get_app_config_store
+from app.services.roi_index import invalidate_roi_index
+from app.services.roi_overlay import invalidate_roi_overlay
+from app.yolomodel.logger import get_logger
 import numpy as np
 
+logger = get_logger("APP")
+
 def get_roi_configs():
     """
     获取所有ROI配置
     
     Returns:
-        ROI配置字典
+        ROI配置字典（只读）
     """
-    config_path = os.path.join(current_app.config['ROOT_DIR'], 'config.json')
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            return config.get('roi_configs', {})
+        return get_app_config_store().get_roi_configs()
     except Exception as e:
-        print(f"ROI配置读取失败: {e}")
+        logger.error(f"ROI配置读取失败: {e}")
         return {}
 
 def get_roi_config_detail(config_name):
@@ -65,21 +67,19 @@ def save_roi_configs(roi_configs):
     Returns:
         是否保存成功
     """
-    config_path = os.path.join(current_app.config['ROOT_DIR'], 'config.json')
     try:
-        # 读取原有配置
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        
-        # 更新ROI配置
-        config['roi_configs'] = roi_configs
+        # 更新ROI配置并保存
+        def update(config):
+            config['roi_configs'] = roi_configs
         
-        # 保存配置
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
-        return True
+        saved = get_app_config_store().update(update)
+        if saved:
+            # 编译后的ROI索引和叠加层随配置重建
+            invalidate_roi_index()
+            invalidate_roi_overlay()
+        return saved
     except Exception as e:
-        print(f"ROI配置保存失败: {e}")
+        logger.error(f"ROI配置保存失败: {e}")
         return False
 
 def delete_roi_config(config_name):
@@ -93,8 +93,8 @@ def delete_roi_config(config_name):
         (成功标志, 成功消息或错误信息)
     """
     try:
-        # 获取现有配置
-        roi_configs = get_roi_configs()
+        # 获取现有配置（复制一份，避免修改缓存）
+        roi_configs = dict(get_roi_configs())
         
         # 检查配置是否存在
         if config_name not in roi_configs:
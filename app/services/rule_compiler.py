@@ -0,0 +1,241 @@
+"""
+逻辑规则编译模块
+把一条逻辑规则配置编译为评估计划：类别名称解析为计数矩阵的列号，比较运算符解析为可调用对象，
+检测结果按(ROI区域, 类别)一次bincount统计为稠密的[ROI区域数, 类别数]计数矩阵，所有规则项向量化比较。
+
+- 只统计规则中引用的ROI区域和类别，其他检测结果不参与计数
+- 分配到多个重叠区域的检测结果（roi_ids列表）在每个区域各计一次
+- 多帧检测结果可以一次评估（离线审计大量已保存的结果），所有帧共用一次bincount
+
+编译结果按规则名称缓存，规则配置对象变化（保存、删除或外部修改后重新加载）时自动重建。
+该模块不依赖Flask应用上下文。
+"""
+import operator
+import threading
+
+import numpy as np
+
+# 支持的比较运算符
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le
+}
+
+
+class RulePlan:
+    """
+    一条逻辑规则配置的评估计划
+
+    计数矩阵的行是规则引用的ROI区域，列是规则引用的类别，都按首次出现的顺序编号；
+    规则项i检查矩阵中(rows[i], columns[i])位置的数量
+    """
+
+    def __init__(self, rule_config):
+        """
+        Args:
+            rule_config: 逻辑规则配置（包含rules列表）
+
+        Raises:
+            ValueError: 规则项的运算符或数量无效
+        """
+        self.rules = list(rule_config.get('rules', []))
+        self.roi_rows = {}
+        self.class_columns = {}
+        # 规则项失败时消息中的描述，如"ROI 1 person >= 2"
+        self.labels = []
+
+        rows, columns, counts, checks = [], [], [], {}
+        for i, rule in enumerate(self.rules):
+            op = rule.get('operator')
+            if op not in OPERATORS:
+                raise ValueError(f"规则 {i + 1} 的运算符无效: {op}，支持: {', '.join(OPERATORS)}")
+            count = rule.get('count')
+            if isinstance(count, bool) or not isinstance(count, (int, float)):
+                raise ValueError(f"规则 {i + 1} 的数量必须是数字")
+
+            rows.append(self.roi_rows.setdefault(rule.get('roi_id'), len(self.roi_rows)))
+            columns.append(self.class_columns.setdefault(rule.get('class'), len(self.class_columns)))
+            counts.append(count)
+            checks.setdefault(op, []).append(i)
+            roi_id = rule.get('roi_id')
+            if isinstance(roi_id, (int, float)):
+                roi_id += 1
+            self.labels.append(f"ROI {roi_id} {rule.get('class')} {op} {count}")
+
+        self.roi_count = len(self.roi_rows)
+        self.class_count = len(self.class_columns)
+        self.frame_size = self.roi_count * self.class_count
+        # 检测结果的ROI区域ID到其所在行起始位置的映射，一个字典查找即可得到计数矩阵中的展开下标；
+        # 未分配ROI区域或没有类别名称的检测结果不参与统计，规则中对应的项也就不会匹配任何检测结果
+        self._roi_offsets = {roi_id: row * self.class_count for roi_id, row in self.roi_rows.items()
+                             if roi_id is not None}
+        self._class_lookup = {name: column for name, column in self.class_columns.items() if name}
+        self.rows = np.array(rows, dtype=np.intp)
+        self.columns = np.array(columns, dtype=np.intp)
+        self.counts = np.array(counts, dtype=np.float64)
+        self._rule_offsets = self.rows * self.class_count + self.columns
+        self._checks = [(OPERATORS[op], np.array(indexes, dtype=np.intp)) for op, indexes in checks.items()]
+
+    def count_matrix(self, frames):
+        """
+        统计每帧检测结果在各(ROI区域, 类别)上的数量
+
+        Args:
+            frames: 多帧检测结果，每帧为检测结果列表
+
+        Returns:
+            (F, roi_count, class_count) 计数矩阵
+        """
+        frames = list(frames)
+        counts = self._bincount(frames)
+        return counts.reshape(len(frames), self.roi_count, self.class_count)
+
+    def evaluate_batch(self, frames):
+        """
+        一次评估多帧检测结果
+
+        Args:
+            frames: 多帧检测结果，每帧为检测结果列表
+
+        Returns:
+            (rule_passed, actual): (F, K)规则项是否通过的布尔数组，(F, K)规则项的实际数量
+        """
+        frames = list(frames)
+        actual = self._bincount(frames).reshape(len(frames), self.frame_size)[:, self._rule_offsets]
+        if len(self._checks) == 1:
+            check, _ = self._checks[0]
+            return check(actual, self.counts), actual
+
+        rule_passed = np.empty(actual.shape, dtype=bool)
+        for check, indexes in self._checks:
+            rule_passed[:, indexes] = check(actual[:, indexes], self.counts[indexes])
+        return rule_passed, actual
+
+    def evaluate(self, detections):
+        """
+        评估一帧检测结果
+
+        Args:
+            detections: 检测结果列表
+
+        Returns:
+            tuple: (是否通过, 消息)
+        """
+        rule_passed, actual = self.evaluate_batch((detections,))
+        return self.describe(rule_passed[0], actual[0])
+
+    def describe(self, rule_passed, actual):
+        """
+        生成一帧的验证结果消息
+
+        Args:
+            rule_passed: (K,) 规则项是否通过
+            actual: (K,) 规则项的实际数量（整数数组）
+
+        Returns:
+            tuple: (是否通过, 消息)
+        """
+        if rule_passed.all():
+            return True, "所有规则验证通过"
+
+        labels = self.labels
+        failed_rules = [f"{labels[i]}，实际值: {actual[i]}" for i in np.flatnonzero(~rule_passed).tolist()]
+        return False, f"验证失败: {', '.join(failed_rules)}"
+
+    def _bincount(self, frames):
+        """把所有帧的检测结果展开为计数矩阵下标后一次bincount，返回(F * frame_size,)计数"""
+        roi_offsets = self._roi_offsets
+        class_columns = self._class_lookup
+        flat = []
+        for frame_index, detections in enumerate(frames):
+            base = frame_index * self.frame_size
+            for detection in detections:
+                column = class_columns.get(detection.get('class_name'))
+                if column is None:
+                    continue
+                roi_ids = detection.get('roi_ids')
+                if roi_ids is None:
+                    offset = roi_offsets.get(detection.get('roi_id'))
+                    if offset is not None:
+                        flat.append(base + offset + column)
+                    continue
+                for roi_id in roi_ids:
+                    offset = roi_offsets.get(roi_id)
+                    if offset is not None:
+                        flat.append(base + offset + column)
+
+        size = len(frames) * self.frame_size
+        if not flat:
+            return np.zeros(size, dtype=np.int64)
+        return np.bincount(flat, minlength=size)
+
+
+def compile_logic_rule(rule_config):
+    """
+    编译逻辑规则配置
+
+    Args:
+        rule_config: 逻辑规则配置
+
+    Returns:
+        RulePlan
+
+    Raises:
+        ValueError: 规则项的运算符或数量无效
+    """
+    return RulePlan(rule_config)
+
+
+class RulePlanCache:
+    """按规则名称缓存评估计划，规则配置对象变化时重建"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, rule_name, rule_config):
+        """
+        获取规则的评估计划
+
+        以规则配置对象本身作为版本标识：配置保存或被外部修改后重新加载，配置对象随之变化
+
+        Args:
+            rule_name: 规则配置名称
+            rule_config: 逻辑规则配置
+
+        Returns:
+            RulePlan
+        """
+        entry = self._entries.get(rule_name)
+        if entry is not None and entry[0] is rule_config:
+            return entry[1]
+
+        plan = RulePlan(rule_config)
+        with self._lock:
+            self._entries[rule_name] = (rule_config, plan)
+        return plan
+
+    def invalidate(self, rule_name=None):
+        """丢弃指定规则（为None时全部）的评估计划"""
+        with self._lock:
+            if rule_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(rule_name, None)
+
+
+_cache = RulePlanCache()
+
+
+def get_rule_plan(rule_name, rule_config):
+    """获取进程内缓存的规则评估计划"""
+    return _cache.get(rule_name, rule_config)
+
+
+def invalidate_rule_plan(rule_name=None):
+    """逻辑规则保存或删除后丢弃缓存的评估计划"""
+    _cache.invalidate(rule_name)
@@ -0,0 +1,206 @@
+"""
+视频流服务模块
+管理服务端视频源（视频文件、流地址或摄像头设备），对最新帧执行检测并转发给订阅的客户端
+"""
+import os
+import hashlib
+import threading
+from flask import current_app
+
+from app.services.detection_service import detect_image, COORDINATE_SPACES
+from app.services.logic_service import update_rule_state, get_rule_states, reset_rule_states
+from app.services.video_source import VideoSource, get_stream_settings, parse_source
+from app.utils.config_store import get_app_config_store
+from app.yolomodel.logger import get_logger
+
+logger = get_logger("APP")
+
+# 同一视频源回调错误日志的最短记录间隔(秒)
+_ERROR_LOG_INTERVAL = 5.0
+
+# 已启动的视频源，按视频源ID索引
+_sources = {}
+_sources_lock = threading.Lock()
+
+def get_stream_room(source_id):
+    """获取视频源对应的Socket.IO房间名"""
+    return f'stream:{source_id}'
+
+def start_stream(source, source_id=None, rule_name=None, coordinate_space='canvas', loop=False,
+                 realtime=None, result_callback=None, status_callback=None, rule_callback=None):
+    """
+    启动视频源的采集和检测
+    
+    Args:
+        source: 视频文件路径、流地址或摄像头设备编号，相对路径基于应用根目录
+        source_id: 视频源ID，为None时由视频源参数生成
+        rule_name: 逻辑规则名称，可选（决定使用的模型和ROI配置）
+        coordinate_space: 检测框坐标系，'canvas'或'original'
+        loop: 视频文件结束后是否从头循环
+        realtime: 是否按文件帧率回放，为None时文件按帧率回放
+        result_callback: 检测结果回调，参数为(房间名, 结果字典)
+        status_callback: 状态变化回调，参数为状态字典
+        rule_callback: 规则通过状态变化回调，参数为(房间名, 状态变化字典)，只在状态变化时调用
+    
+    Returns:
+        (成功标志, 视频源状态或错误信息)
+    """
+    if coordinate_space not in COORDINATE_SPACES:
+        return False, f'不支持的坐标系: {coordinate_space}'
+    
+    try:
+        source = parse_source(source)
+        settings = get_stream_settings(get_app_config_store().snapshot())
+    except ValueError as e:
+        return False, str(e)
+    
+    if isinstance(source, str) and '://' not in source and not os.path.isabs(source):
+        source = os.path.join(current_app.config['ROOT_DIR'], source)
+    if source_id is None:
+        source_id = hashlib.sha1(str(source).encode('utf-8')).hexdigest()[:12]
+    
+    app = current_app._get_current_object()
+    room = get_stream_room(source_id)
+    
+    def process_frame(frame, render):
+        # 检测在视频源的推理线程中执行，需要应用上下文读取配置
+        with app.app_context():
+            success, results, image = detect_image(frame, rule_name, render=render,
+                                                   coordinate_space=coordinate_space)
+            if not success:
+                raise RuntimeError(results)
+            
+            # 每帧都更新规则状态（与是否有订阅者无关），只在通过状态变化时通知
+            if rule_name:
+                transition = update_rule_state(source_id, rule_name, results)
+                if transition is not None and rule_callback is not None:
+                    try:
+                        rule_callback(room, {'source_id': source_id, **transition})
+                    except Exception as e:
+                        logger.throttled(('rule_callback', source_id), _ERROR_LOG_INTERVAL,
+                                         f"视频源 {source_id} 规则状态回调失败: {str(e)}", level='error')
+        return {'results': results}, image
+    
+    on_result = (lambda payload: result_callback(room, payload)) if result_callback is not None else None
+    
+    with _sources_lock:
+        existing = _sources.get(source_id)
+        if existing is not None and existing.is_active():
+            return False, f'视频源 {source_id} 正在运行'
+    
+        active = sum(1 for item in _sources.values() if item.is_active())
+        if active >= settings['max_sources']:
+            return False, f'同时运行的视频源不能超过 {settings["max_sources"]} 个'
+    
+        # 同一ID的视频源重新启动时规则状态重新开始
+        reset_rule_states(source_id)
+        stream = VideoSource(source_id, source, process_frame, settings, on_result, status_callback,
+                             loop=loop, realtime=realtime,
+                             options={'rule_name': rule_name, 'coordinate_space': coordinate_space})
+        try:
+            stream.start()
+        except RuntimeError as e:
+            return False, str(e)
+        _sources[source_id] = stream
+    
+    return True, stream.get_status()
+
+def stop_stream(source_id):
+    """
+    停止视频源
+    
+    Args:
+        source_id: 视频源ID
+    
+    Returns:
+        (成功标志, 视频源状态或错误信息)
+    """
+    stream = _sources.get(source_id)
+    if stream is None:
+        return False, f'视频源 {source_id} 不存在'
+    if not stream.is_active():
+        return False, f'视频源 {source_id} 已结束'
+    stream.stop()
+    return True, stream.get_status()
+
+def get_stream(source_id):
+    """
+    获取视频源状态和统计信息
+    
+    Args:
+        source_id: 视频源ID
+    
+    Returns:
+        (成功标志, 视频源状态或错误信息)
+    """
+    stream = _sources.get(source_id)
+    if stream is None:
+        return False, f'视频源 {source_id} 不存在'
+    status = stream.get_status()
+    status['rule_states'] = get_rule_states(source_id)
+    return True, status
+
+def open_stream_viewer(source_id, max_fps=None):
+    """
+    打开视频源的MJPEG观看流
+    
+    Args:
+        source_id: 视频源ID
+        max_fps: 观看者的最大帧率（正数，由调用方校验），不超过配置的mjpeg_max_fps
+        
+    Returns:
+        (成功标志, multipart响应内容生成器或错误信息)
+    """
+    stream = _sources.get(source_id)
+    if stream is None:
+        return False, f'视频源 {source_id} 不存在'
+    if not stream.is_active():
+        return False, f'视频源 {source_id} 已结束'
+    return True, stream.mjpeg_frames(max_fps)
+
+def list_streams():
+    """
+    获取所有视频源的状态
+    
+    Returns:
+        状态列表
+    """
+    with _sources_lock:
+        streams = list(_sources.values())
+    return [stream.get_status() for stream in streams]
+
+def subscribe_stream(source_id, client_id):
+    """
+    订阅视频源的检测结果
+    
+    Args:
+        source_id: 视频源ID
+        client_id: 客户端ID(Socket.IO会话ID)
+    
+    Returns:
+        (成功标志, 包含房间名的订阅信息或错误信息)
+    """
+    stream = _sources.get(source_id)
+    if stream is None:
+        return False, f'视频源 {source_id} 不存在'
+    subscribers = stream.subscribe(client_id)
+    return True, {'source_id': source_id, 'room': get_stream_room(source_id), 'subscribers': subscribers}
+
+def unsubscribe_stream(source_id, client_id):
+    """
+    取消订阅视频源
+    
+    Returns:
+        (成功标志, 包含房间名的订阅信息或错误信息)
+    """
+    stream = _sources.get(source_id)
+    if stream is None or not stream.unsubscribe(client_id):
+        return False, f'未订阅视频源 {source_id}'
+    return True, {'source_id': source_id, 'room': get_stream_room(source_id)}
+
+def unsubscribe_client(client_id):
+    """客户端断开连接时取消其所有订阅"""
+    with _sources_lock:
+        streams = list(_sources.values())
+    for stream in streams:
+        stream.unsubscribe(client_id)
@@ -0,0 +1,273 @@
+"""
+时序逻辑规则模块
+逻辑规则项可以附加temporal字段，在连续的帧上判断：
+
+- duration: 比较条件持续成立至少seconds秒，如"ROI 2 中 qrcode == 0 持续3秒"
+- stable: 比较条件成立，且实际数量在最近frames帧中保持不变
+- window: 最近frames帧中比较条件失败的帧数不超过max_failures；不足frames帧时视为未通过
+
+每个视频源或客户端的每条规则各有一份状态，每帧只更新各规则项的运行计数器和环形缓冲区，
+与历史长度无关；整条规则的通过状态发生变化时才产生状态变化事件。
+没有temporal字段的规则项按当前帧判断。
+
+该模块不依赖Flask应用上下文。
+"""
+import time
+import threading
+
+import numpy as np
+
+from app.services.rule_compiler import RulePlan
+
+# 时序规则项类型
+TEMPORAL_DURATION = 'duration'
+TEMPORAL_STABLE = 'stable'
+TEMPORAL_WINDOW = 'window'
+TEMPORAL_TYPES = (TEMPORAL_DURATION, TEMPORAL_STABLE, TEMPORAL_WINDOW)
+
+
+def parse_temporal(temporal, index):
+    """
+    校验规则项的temporal字段
+
+    Args:
+        temporal: temporal字段，可以为None
+        index: 规则项下标（用于错误消息）
+
+    Returns:
+        规范化的temporal字典，没有时返回None
+
+    Raises:
+        ValueError: 字段无效
+    """
+    if temporal is None:
+        return None
+    if not isinstance(temporal, dict):
+        raise ValueError(f"规则 {index + 1} 的temporal必须是对象")
+
+    kind = temporal.get('type')
+    if kind == TEMPORAL_DURATION:
+        seconds = temporal.get('seconds')
+        if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or seconds < 0:
+            raise ValueError(f"规则 {index + 1} 的seconds必须是非负数")
+        return {'type': kind, 'seconds': float(seconds)}
+
+    if kind in (TEMPORAL_STABLE, TEMPORAL_WINDOW):
+        frames = temporal.get('frames')
+        if isinstance(frames, bool) or not isinstance(frames, int) or frames < 1:
+            raise ValueError(f"规则 {index + 1} 的frames必须是正整数")
+        if kind == TEMPORAL_STABLE:
+            return {'type': kind, 'frames': frames}
+        max_failures = temporal.get('max_failures', 0)
+        if isinstance(max_failures, bool) or not isinstance(max_failures, int) or max_failures < 0:
+            raise ValueError(f"规则 {index + 1} 的max_failures必须是非负整数")
+        return {'type': kind, 'frames': frames, 'max_failures': max_failures}
+
+    raise ValueError(f"规则 {index + 1} 的temporal类型无效: {kind}，支持: {', '.join(TEMPORAL_TYPES)}")
+
+
+def describe_temporal(temporal):
+    """时序条件的文字描述，用于状态消息"""
+    if temporal['type'] == TEMPORAL_DURATION:
+        return f"持续{temporal['seconds']:g}秒"
+    if temporal['type'] == TEMPORAL_STABLE:
+        return f"稳定{temporal['frames']}帧"
+    return f"最近{temporal['frames']}帧失败不超过{temporal['max_failures']}次"
+
+
+class TemporalRulePlan:
+    """
+    一条逻辑规则配置的时序评估计划
+
+    每帧的比较由RulePlan完成，时序规则项再在其结果上更新各自的状态
+    """
+
+    def __init__(self, rule_config):
+        """
+        Args:
+            rule_config: 逻辑规则配置
+
+        Raises:
+            ValueError: 规则项的运算符、数量或temporal字段无效
+        """
+        self.frame_plan = RulePlan(rule_config)
+        self.temporals = [parse_temporal(rule.get('temporal'), i) for i, rule in enumerate(self.frame_plan.rules)]
+
+
+class TemporalRuleState:
+    """
+    一个视频源或客户端上一条规则的时序状态
+
+    各规则项的状态：duration记录条件开始成立的时间，stable记录上一帧的数量和连续相同的帧数，
+    window用长度为frames的环形缓冲区记录每帧是否失败以及窗口内的失败次数，
+    并记录已填充的帧数，窗口填满之前该项不通过（与stable在连续帧数不足时不通过一致）
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.frames = 0
+        self.passed = None
+        self.changed_at = None
+        self.item_passed = np.zeros(len(plan.temporals), dtype=bool)
+        self.actual = np.zeros(len(plan.temporals), dtype=np.int64)
+
+        self._since = [None] * len(plan.temporals)
+        self._last_count = [None] * len(plan.temporals)
+        self._runs = [0] * len(plan.temporals)
+        self._rings = [bytearray(t['frames']) if t and t['type'] == TEMPORAL_WINDOW else None
+                       for t in plan.temporals]
+        self._ring_pos = [0] * len(plan.temporals)
+        self._ring_filled = [0] * len(plan.temporals)
+        self._failures = [0] * len(plan.temporals)
+
+    def update(self, detections, timestamp):
+        """
+        用一帧检测结果更新状态
+
+        Args:
+            detections: 检测结果列表
+            timestamp: 单调时钟时间(秒)
+
+        Returns:
+            整条规则的通过状态是否发生变化（第一帧总是视为变化）
+        """
+        rule_passed, actual = self.plan.frame_plan.evaluate_batch((detections,))
+        rule_passed, actual = rule_passed[0], actual[0]
+        item_passed = self.item_passed
+
+        for i, temporal in enumerate(self.plan.temporals):
+            passed = bool(rule_passed[i])
+            if temporal is None:
+                item_passed[i] = passed
+                continue
+
+            kind = temporal['type']
+            if kind == TEMPORAL_DURATION:
+                if not passed:
+                    self._since[i] = None
+                elif self._since[i] is None:
+                    self._since[i] = timestamp
+                item_passed[i] = passed and timestamp - self._since[i] >= temporal['seconds']
+            elif kind == TEMPORAL_STABLE:
+                count = int(actual[i])
+                self._runs[i] = self._runs[i] + 1 if count == self._last_count[i] else 1
+                self._last_count[i] = count
+                item_passed[i] = passed and self._runs[i] >= temporal['frames']
+            else:
+                ring = self._rings[i]
+                pos = self._ring_pos[i]
+                failed = 0 if passed else 1
+                self._failures[i] += failed - ring[pos]
+                ring[pos] = failed
+                self._ring_pos[i] = (pos + 1) % len(ring)
+                if self._ring_filled[i] < len(ring):
+                    self._ring_filled[i] += 1
+                item_passed[i] = (self._ring_filled[i] == len(ring) and
+                                  self._failures[i] <= temporal['max_failures'])
+
+        self.actual = actual
+        self.frames += 1
+        passed = bool(item_passed.all())
+        changed = passed != self.passed
+        if changed:
+            self.passed = passed
+            self.changed_at = time.time()
+        return changed
+
+    def describe(self):
+        """
+        当前状态的消息
+
+        Returns:
+            tuple: (是否通过, 消息)
+        """
+        if self.passed:
+            return True, "所有规则验证通过"
+
+        labels = self.plan.frame_plan.labels
+        failed_rules = []
+        for i in np.flatnonzero(~self.item_passed).tolist():
+            temporal = self.plan.temporals[i]
+            label = labels[i] if temporal is None else f"{labels[i]} {describe_temporal(temporal)}"
+            failed_rules.append(f"{label}，实际值: {self.actual[i]}")
+        return False, f"验证失败: {', '.join(failed_rules)}"
+
+    def snapshot(self):
+        """状态字典"""
+        passed, message = self.describe()
+        return {
+            'passed': passed,
+            'message': message,
+            'frames': self.frames,
+            'changed_at': self.changed_at,
+            'failed_items': np.flatnonzero(~self.item_passed).tolist()
+        }
+
+
+class TemporalRuleTracker:
+    """
+    按(视频源或客户端ID, 规则名称)保存时序状态
+
+    规则配置对象变化（保存或外部修改后重新加载）时状态重新开始
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def update(self, key, rule_name, rule_config, detections, timestamp=None):
+        """
+        用一帧检测结果更新状态
+
+        同一key的帧需要按顺序提交（视频源的推理线程、推理执行器中同一客户端的请求都是顺序执行的）
+
+        Args:
+            key: 视频源或客户端ID
+            rule_name: 规则配置名称
+            rule_config: 逻辑规则配置
+            detections: 已分配ROI区域的检测结果列表
+            timestamp: 单调时钟时间(秒)，默认为当前时间
+
+        Returns:
+            通过状态发生变化时返回状态变化字典，否则返回None
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        entry_key = (key, rule_name)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None or entry[0] is not rule_config:
+                entry = (rule_config, TemporalRuleState(TemporalRulePlan(rule_config)))
+                self._entries[entry_key] = entry
+        state = entry[1]
+
+        previous = state.passed
+        if not state.update(detections, timestamp):
+            return None
+        return {'rule_name': rule_name, 'previous': previous, **state.snapshot()}
+
+    def get_states(self, key):
+        """获取key下所有规则的当前状态，按规则名称索引"""
+        with self._lock:
+            entries = [(rule_name, entry[1]) for (entry_key, rule_name), entry in self._entries.items()
+                       if entry_key == key]
+        return {rule_name: state.snapshot() for rule_name, state in entries if state.frames}
+
+    def reset(self, key):
+        """丢弃key下所有规则的状态（视频源重新启动或客户端断开连接时调用）"""
+        with self._lock:
+            for entry_key in [entry_key for entry_key in self._entries if entry_key[0] == key]:
+                del self._entries[entry_key]
+
+
+def compile_temporal_rule(rule_config):
+    """
+    编译逻辑规则配置，同时校验temporal字段
+
+    Returns:
+        TemporalRulePlan
+
+    Raises:
+        ValueError: 规则项无效
+    """
+    return TemporalRulePlan(rule_config)
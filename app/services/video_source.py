@@ -0,0 +1,473 @@
+"""
+视频源模块
+基于cv2.VideoCapture读取视频文件或摄像头设备，采集线程只保留最新一帧，
+推理线程每次取最新帧检测，来不及处理的旧帧直接丢弃而不是排队，避免延迟累积。
+
+该模块不依赖Flask应用上下文，检测函数和结果回调由调用方提供。
+"""
+import time
+import threading
+
+import cv2
+
+from app.utils.rate_meter import RateMeter
+from app.yolomodel.logger import get_logger
+
+logger = get_logger("APP")
+
+# 每个视频源同一类错误日志的最短记录间隔(秒)，逐帧失败时避免每帧写一条日志
+_ERROR_LOG_INTERVAL = 5.0
+
+# 默认的视频源配置(config.json中的stream字段)
+DEFAULT_STREAM_CONFIG = {
+    'max_sources': 4,
+    'reconnect_delay': 2.0,
+    'stats_window': 5.0,
+    'jpeg_quality': 80,
+    'mjpeg_max_fps': 15
+}
+
+# 视频源状态
+SOURCE_STARTING = 'starting'
+SOURCE_RUNNING = 'running'
+SOURCE_ENDED = 'ended'
+SOURCE_STOPPED = 'stopped'
+SOURCE_FAILED = 'failed'
+
+# 文件未提供帧率时按该帧率回放
+_DEFAULT_FILE_FPS = 25.0
+
+# MJPEG响应的分隔符
+MJPEG_BOUNDARY = 'frame'
+
+
+def get_stream_settings(config, overrides=None):
+    """
+    合并默认值、配置文件和调用参数中的视频源设置
+
+    Args:
+        config: 配置字典
+        overrides: 调用方指定的设置，值为None的项被忽略
+
+    Returns:
+        设置字典
+    """
+    settings = dict(DEFAULT_STREAM_CONFIG)
+    settings.update(config.get('stream', {}))
+    if overrides:
+        settings.update({k: v for k, v in overrides.items() if v is not None})
+
+    max_sources = settings['max_sources']
+    if isinstance(max_sources, bool) or not isinstance(max_sources, int) or max_sources < 1:
+        raise ValueError("max_sources 必须是正整数")
+    for key in ('reconnect_delay', 'stats_window', 'mjpeg_max_fps'):
+        value = settings[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(f"{key} 必须是正数")
+    quality = settings['jpeg_quality']
+    if isinstance(quality, bool) or not isinstance(quality, int) or not 1 <= quality <= 100:
+        raise ValueError("jpeg_quality 必须是1到100之间的整数")
+    return settings
+
+
+def parse_source(source):
+    """
+    解析视频源参数，纯数字视为摄像头设备编号
+
+    Args:
+        source: 视频文件路径、流地址或设备编号
+
+    Returns:
+        传给cv2.VideoCapture的参数（设备编号为int）
+    """
+    if isinstance(source, bool):
+        raise ValueError("无效的视频源")
+    if isinstance(source, int):
+        return source
+    source = str(source).strip()
+    if not source:
+        raise ValueError("视频源不能为空")
+    return int(source) if source.isdigit() else source
+
+
+class VideoSource:
+    """
+    单个视频源：一个采集线程和一个推理线程
+
+    采集线程把读到的帧写入只容纳一帧的槽位，上一帧尚未被推理线程取走时计为丢帧。
+    推理线程对取到的帧调用process_frame，结果连同帧序号和端到端延迟传给result_callback。
+    有MJPEG观看者时推理线程同时绘制标注图像并编码为JPEG（不超过mjpeg_max_fps），
+    没有观看者时完全跳过绘制和编码。
+    """
+
+    def __init__(self, source_id, source, process_frame, settings, result_callback=None,
+                 status_callback=None, loop=False, realtime=None, options=None):
+        """
+        Args:
+            source_id: 视频源ID
+            source: 视频文件路径、流地址或设备编号
+            process_frame: 检测函数，参数为(BGR帧, 是否绘制)，返回(合并到结果中的字典, 标注图像或None)，
+                           失败时抛出异常
+            settings: get_stream_settings返回的设置
+            result_callback: 结果回调，参数为结果字典，有订阅者时才调用
+            status_callback: 状态变化回调，参数为状态字典
+            loop: 视频文件播放结束后是否从头循环
+            realtime: 是否按文件帧率回放，为None时文件按帧率回放、设备和流按到达速度读取
+            options: 附加到状态中的信息（如规则名称）
+        """
+        self.source_id = source_id
+        self.source = parse_source(source)
+        self.process_frame = process_frame
+        self.settings = settings
+        self.result_callback = result_callback
+        self.status_callback = status_callback
+        self.loop = loop
+        self.options = dict(options or {})
+
+        self.is_device = isinstance(self.source, int)
+        self.is_file = not self.is_device and '://' not in self.source
+        self.realtime = self.is_file if realtime is None else realtime
+
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._subscribers = set()
+        self._threads = []
+
+        # 最新的JPEG编码标注帧，供MJPEG观看者读取
+        self._jpeg_condition = threading.Condition()
+        self._jpeg = None
+        self._jpeg_id = 0
+        self._viewers = 0
+        self._last_render = 0.0
+
+        # 最新帧槽位
+        self._frame = None
+        self._frame_id = 0
+        self._frame_time = 0.0
+        self._pending = False
+        self._capture_done = False
+
+        self._status = SOURCE_STARTING
+        self._error = None
+        self._started_at = None
+        self._frame_size = None
+        self._source_fps = None
+        self._frames_captured = 0
+        self._frames_processed = 0
+        self._frames_dropped = 0
+        self._frames_encoded = 0
+        self._errors = 0
+        self._last_frame_id = 0
+        self._capture_error = None
+
+        window = settings['stats_window']
+        self._capture_meter = RateMeter(window)
+        self._inference_meter = RateMeter(window)
+        self._latency_meter = RateMeter(window)
+        self._encode_meter = RateMeter(window)
+
+    def start(self):
+        """打开视频源并启动采集和推理线程，无法打开时抛出RuntimeError"""
+        capture = self._open()
+        if capture is None:
+            raise RuntimeError(f"无法打开视频源: {self.source}")
+
+        with self._condition:
+            self._status = SOURCE_RUNNING
+            self._started_at = time.time()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, args=(capture,),
+                             name=f"StreamCapture-{self.source_id}", daemon=True),
+            threading.Thread(target=self._inference_loop,
+                             name=f"StreamInference-{self.source_id}", daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+        self._notify_status()
+
+    def stop(self, timeout=5.0):
+        """停止采集和推理线程，等待当前帧处理完成"""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        with self._jpeg_condition:
+            self._jpeg_condition.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def is_active(self):
+        """视频源是否仍在运行"""
+        with self._condition:
+            return self._status in (SOURCE_STARTING, SOURCE_RUNNING)
+
+    def subscribe(self, client_id):
+        """添加订阅者，返回当前订阅者数量"""
+        with self._condition:
+            self._subscribers.add(client_id)
+            return len(self._subscribers)
+
+    def unsubscribe(self, client_id):
+        """移除订阅者，返回是否存在该订阅者"""
+        with self._condition:
+            if client_id in self._subscribers:
+                self._subscribers.discard(client_id)
+                return True
+            return False
+
+    def has_subscribers(self):
+        with self._condition:
+            return bool(self._subscribers)
+
+    def mjpeg_frames(self, max_fps=None):
+        """
+        生成multipart/x-mixed-replace响应的各个部分，迭代期间计为一个观看者
+
+        每次等待下一帧新编码的JPEG，观看者读取较慢时直接跳到最新帧；视频源结束后生成器结束
+
+        Args:
+            max_fps: 该观看者的最大帧率，为None时使用mjpeg_max_fps
+
+        Yields:
+            包含分隔符、头部和JPEG数据的字节串
+        """
+        interval = 1.0 / min(max_fps or self.settings['mjpeg_max_fps'], self.settings['mjpeg_max_fps'])
+        last_id = 0
+        next_at = 0.0
+
+        with self._jpeg_condition:
+            self._viewers += 1
+        try:
+            while True:
+                delay = next_at - time.perf_counter()
+                if delay > 0 and self._stop_event.wait(delay):
+                    return
+                with self._jpeg_condition:
+                    while self._jpeg_id == last_id and self.is_active():
+                        self._jpeg_condition.wait(1.0)
+                    if self._jpeg_id == last_id:
+                        return
+                    jpeg, last_id = self._jpeg, self._jpeg_id
+                next_at = time.perf_counter() + interval
+                yield (f'--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                       f'Content-Length: {len(jpeg)}\r\n\r\n').encode('ascii') + jpeg + b'\r\n'
+        finally:
+            with self._jpeg_condition:
+                self._viewers -= 1
+
+    def _should_render(self, now):
+        """有观看者且距上次绘制超过mjpeg_max_fps对应的间隔时才绘制"""
+        with self._jpeg_condition:
+            if self._viewers == 0:
+                return False
+        return now - self._last_render >= 1.0 / self.settings['mjpeg_max_fps']
+
+    def _publish_jpeg(self, image):
+        """编码标注图像并唤醒等待的观看者"""
+        started = time.perf_counter()
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.settings['jpeg_quality']])
+        if not ok:
+            return
+        finished = time.perf_counter()
+        self._encode_meter.add(finished, (finished - started) * 1000)
+        with self._jpeg_condition:
+            self._jpeg = encoded.tobytes()
+            self._jpeg_id += 1
+            self._frames_encoded += 1
+            self._jpeg_condition.notify_all()
+
+    def get_status(self):
+        """
+        获取视频源状态和统计信息
+
+        Returns:
+            状态字典，包含采集/推理帧率、丢帧数量和端到端延迟(毫秒)
+        """
+        now = time.perf_counter()
+        capture_fps, _, _ = self._capture_meter.snapshot(now)
+        inference_fps, inference_ms, _ = self._inference_meter.snapshot(now)
+        _, latency_ms, latency_max_ms = self._latency_meter.snapshot(now)
+        mjpeg_fps, encode_ms, _ = self._encode_meter.snapshot(now)
+        with self._jpeg_condition:
+            viewers = self._viewers
+            frames_encoded = self._frames_encoded
+
+        with self._condition:
+            captured = self._frames_captured
+            return {
+                'source_id': self.source_id,
+                'source': self.source,
+                'status': self._status,
+                'error': self._error,
+                'subscribers': len(self._subscribers),
+                'viewers': viewers,
+                'frame_size': self._frame_size,
+                'source_fps': self._source_fps,
+                'uptime_seconds': round(time.time() - self._started_at, 3) if self._started_at else 0.0,
+                'frames_captured': captured,
+                'frames_processed': self._frames_processed,
+                'frames_dropped': self._frames_dropped,
+                'drop_rate': round(self._frames_dropped / captured, 4) if captured else 0.0,
+                'errors': self._errors,
+                'capture_fps': round(capture_fps, 2),
+                'inference_fps': round(inference_fps, 2),
+                'inference_ms': _round_ms(inference_ms),
+                'latency_ms': _round_ms(latency_ms),
+                'latency_max_ms': _round_ms(latency_max_ms),
+                'frames_encoded': frames_encoded,
+                'mjpeg_fps': round(mjpeg_fps, 2),
+                'encode_ms': _round_ms(encode_ms),
+                **self.options
+            }
+
+    def _open(self):
+        """打开VideoCapture，失败时返回None"""
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            capture.release()
+            return None
+
+        if not self.is_file:
+            # 减少驱动侧的缓冲帧，否则读到的"最新帧"可能已经过时
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        with self._condition:
+            self._source_fps = round(fps, 2) if fps and fps > 0 else None
+        return capture
+
+    def _capture_loop(self, capture):
+        frame_interval = 1.0 / (self._source_fps or _DEFAULT_FILE_FPS)
+        next_frame_at = time.perf_counter()
+        frames_since_open = 0
+
+        try:
+            while not self._stop_event.is_set():
+                if capture is None:
+                    # 设备或流断开后按间隔重连
+                    if self._stop_event.wait(self.settings['reconnect_delay']):
+                        break
+                    capture = self._open()
+                    frames_since_open = 0
+                    continue
+
+                ok, frame = capture.read()
+                if not ok:
+                    if self.is_file:
+                        if self.loop and frames_since_open > 0:
+                            capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                            frames_since_open = 0
+                            continue
+                        break
+                    logger.throttled(('reconnect', self.source_id), _ERROR_LOG_INTERVAL,
+                                     f"视频源 {self.source_id} 读取失败，{self.settings['reconnect_delay']}秒后重连")
+                    capture.release()
+                    capture = None
+                    continue
+                frames_since_open += 1
+
+                if self.realtime:
+                    # 按源帧率回放，落后超过一帧时不追赶
+                    next_frame_at += frame_interval
+                    delay = next_frame_at - time.perf_counter()
+                    if delay > 0:
+                        if self._stop_event.wait(delay):
+                            break
+                    elif delay < -frame_interval:
+                        next_frame_at = time.perf_counter()
+
+                now = time.perf_counter()
+                with self._condition:
+                    if self._pending:
+                        self._frames_dropped += 1
+                    self._frame = frame
+                    self._frame_id += 1
+                    self._frame_time = now
+                    self._pending = True
+                    self._frames_captured += 1
+                    self._frame_size = [frame.shape[1], frame.shape[0]]
+                    self._condition.notify()
+                self._capture_meter.add(now)
+        except Exception as e:
+            with self._condition:
+                self._capture_error = self._error = str(e) or type(e).__name__
+        finally:
+            if capture is not None:
+                capture.release()
+            with self._condition:
+                self._capture_done = True
+                self._condition.notify_all()
+
+    def _inference_loop(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._capture_done and not self._stop_event.is_set():
+                    self._condition.wait()
+                if self._stop_event.is_set() or not self._pending:
+                    break
+                frame, frame_id, captured_at = self._frame, self._frame_id, self._frame_time
+                skipped = frame_id - self._last_frame_id - 1
+                self._last_frame_id = frame_id
+                self._frame = None
+                self._pending = False
+
+            started = time.perf_counter()
+            render = self._should_render(started)
+            if render:
+                self._last_render = started
+            try:
+                result, image = self.process_frame(frame, render)
+            except Exception as e:
+                with self._condition:
+                    self._errors += 1
+                    self._error = str(e) or type(e).__name__
+                continue
+            finished = time.perf_counter()
+            self._inference_meter.add(finished, (finished - started) * 1000)
+            if image is not None:
+                self._publish_jpeg(image)
+
+            if self.result_callback is not None and self.has_subscribers():
+                payload = {
+                    'source_id': self.source_id,
+                    'frame_id': frame_id,
+                    'frame_size': [frame.shape[1], frame.shape[0]],
+                    'skipped_frames': skipped,
+                    'inference_ms': round((finished - started) * 1000, 3),
+                    'latency_ms': round((finished - captured_at) * 1000, 3),
+                    **self.options,
+                    **result
+                }
+                try:
+                    self.result_callback(payload)
+                except Exception as e:
+                    logger.throttled(('result_callback', self.source_id), _ERROR_LOG_INTERVAL,
+                                     f"视频源 {self.source_id} 结果回调失败: {str(e)}", level='error')
+
+            # 端到端延迟：从采集到结果发出
+            emitted = time.perf_counter()
+            self._latency_meter.add(emitted, (emitted - captured_at) * 1000)
+            with self._condition:
+                self._frames_processed += 1
+
+        with self._condition:
+            if self._stop_event.is_set():
+                self._status = SOURCE_STOPPED
+            elif self._capture_error is not None:
+                self._status = SOURCE_FAILED
+            else:
+                self._status = SOURCE_ENDED
+        with self._jpeg_condition:
+            self._jpeg_condition.notify_all()
+        self._notify_status()
+
+    def _notify_status(self):
+        if self.status_callback is None:
+            return
+        try:
+            self.status_callback(self.get_status())
+        except Exception as e:
+            logger.error(f"视频源 {self.source_id} 状态回调失败: {str(e)}")
+
+
+def _round_ms(value):
+    return round(value, 3) if value is not None else None
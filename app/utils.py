@@ -4,7 +4,6 @@
 import time
 import datetime
 import os
-import json
 from app.yolomodel.logger import get_logger, ensure_log_dir
 
 # 导出日志获取函数，保持向后兼容性
@@ -58,12 +57,15 @@ def load_config():
     
     try:
         config_path = get_config_path()
-        app_logger.info(f"加载配置文件: {config_path}")
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(config_path)
         
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            app_logger.info("配置文件加载成功")
-            return config
+        # 通过配置存储读取，未变化时直接使用缓存
+        from app.utils.config_store import get_config_store
+        config = get_config_store(config_path).get_config()
+        if not config:
+            raise ValueError("配置文件为空或格式错误")
+        return config
     except Exception as e:
         app_logger.error(f"加载配置文件失败: {str(e)}，使用默认配置")
         return default_config
@@ -0,0 +1,185 @@
+"""
+配置存储模块
+在内存中缓存解析后的config.json，按修改时间和大小重新校验，写入时加锁并原子替换文件
+"""
+import os
+import copy
+import json
+import time
+import threading
+
+from app.yolomodel.logger import get_logger
+
+logger = get_logger("APP")
+
+
+class ConfigStore:
+    """
+    配置文件存储
+
+    读取时返回缓存的配置文档，最多每 check_interval 秒检查一次文件的修改时间和大小，
+    文件被外部修改后自动重新加载。写入通过临时文件 + os.replace 完成，避免读到半写的文件。
+
+    snapshot() 及各类访问器返回的是共享的缓存对象，调用方不得修改；
+    需要修改配置时使用 get_config() 获取副本，或使用 update()。
+    """
+
+    def __init__(self, config_path, check_interval=1.0):
+        """
+        初始化配置存储
+
+        Args:
+            config_path: 配置文件路径
+            check_interval: 两次检查文件变化之间的最小间隔(秒)
+        """
+        self.config_path = config_path
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._config = None
+        self._signature = None
+        self._checked_at = 0.0
+
+    def _stat_signature(self):
+        """获取配置文件的修改时间和大小"""
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _reload(self, signature):
+        """从磁盘重新读取配置文件"""
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                self._config = json.load(f)
+        except Exception as e:
+            logger.error(f"配置读取失败: {e}")
+            self._config = {}
+        self._signature = signature
+
+    def snapshot(self):
+        """
+        获取缓存的配置文档（只读）
+
+        Returns:
+            配置字典，读取失败时为空字典
+        """
+        now = time.monotonic()
+        config = self._config
+        if config is not None and now - self._checked_at < self.check_interval:
+            return config
+
+        with self._lock:
+            signature = self._stat_signature()
+            if self._config is None or signature != self._signature:
+                self._reload(signature)
+            self._checked_at = now
+            return self._config
+
+    def get_config(self):
+        """
+        获取配置文档的副本，可以自由修改后通过save()保存
+
+        Returns:
+            配置字典副本
+        """
+        return copy.deepcopy(self.snapshot())
+
+    def save(self, config):
+        """
+        原子写入配置文件并更新缓存
+
+        Args:
+            config: 配置字典
+
+        Returns:
+            是否保存成功
+        """
+        with self._lock:
+            tmp_path = f"{self.config_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(config, f, indent=4, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.config_path)
+            except Exception as e:
+                logger.error(f"配置保存失败: {e}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                return False
+
+            self._config = copy.deepcopy(config)
+            self._signature = self._stat_signature()
+            self._checked_at = time.monotonic()
+            return True
+
+    def update(self, updater):
+        """
+        在写锁内执行"读取-修改-保存"
+
+        Args:
+            updater: 接收配置副本并就地修改的可调用对象
+
+        Returns:
+            是否保存成功
+        """
+        with self._lock:
+            config = self.get_config()
+            updater(config)
+            return self.save(config)
+
+    def get_models(self):
+        """获取模型列表（只读）"""
+        return self.snapshot().get('models', [])
+
+    def get_model_settings(self):
+        """获取全局模型参数（只读）"""
+        return self.snapshot().get('model', {})
+
+    def get_roi_configs(self):
+        """获取所有ROI配置（只读）"""
+        return self.snapshot().get('roi_configs', {})
+
+    def get_logic_rules(self):
+        """获取所有逻辑规则配置（只读）"""
+        return self.snapshot().get('logic_rules', {})
+
+
+# 每个配置文件路径共享一个存储实例
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_config_store(config_path):
+    """
+    获取指定配置文件的存储实例
+
+    Args:
+        config_path: 配置文件路径
+
+    Returns:
+        ConfigStore实例
+    """
+    config_path = os.path.abspath(config_path)
+    store = _stores.get(config_path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(config_path)
+            if store is None:
+                store = ConfigStore(config_path)
+                _stores[config_path] = store
+    return store
+
+
+def get_app_config_store():
+    """
+    获取当前Flask应用根目录下config.json的存储实例
+
+    Returns:
+        ConfigStore实例
+    """
+    from flask import current_app
+    return get_config_store(os.path.join(current_app.config['ROOT_DIR'], 'config.json'))
@@ -0,0 +1,131 @@
+"""
+二进制帧协议模块
+在Socket.IO通道上以二进制附件传输检测结果，代替逐个检测框的JSON对象列表
+
+协议版本1的结果中，每个数组字段为小端字节序的连续数组：
+    boxes      float32  (N, 4)  x1, y1, x2, y2
+    class_ids  uint16   (N,)
+    scores     float16  (N,)
+    roi_ids    int16    (N,)    不在任何ROI区域内为-1
+类别名称列表每个模型只随第一条结果发送一次（classes字段），客户端按model字段缓存。
+"""
+import threading
+
+import numpy as np
+
+# 当前协议版本和服务端支持的版本
+PROTOCOL_VERSION = 1
+SUPPORTED_PROTOCOLS = (1,)
+
+BOX_DTYPE = np.dtype('<f4')
+CLASS_ID_DTYPE = np.dtype('<u2')
+SCORE_DTYPE = np.dtype('<f2')
+ROI_ID_DTYPE = np.dtype('<i2')
+
+# 表示不在任何ROI区域内的roi_id
+NO_ROI = -1
+
+
+def parse_protocol_version(value):
+    """
+    解析客户端请求的协议版本
+
+    Args:
+        value: 请求中的protocol字段，None、0或'json'表示使用JSON结果
+
+    Returns:
+        协议版本号，使用JSON结果时为None
+
+    Raises:
+        ValueError: 不支持的协议版本
+    """
+    if value in (None, 0, '', 'json'):
+        return None
+    try:
+        version = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的协议版本: {value}")
+    if version not in SUPPORTED_PROTOCOLS:
+        supported = ', '.join(str(v) for v in SUPPORTED_PROTOCOLS)
+        raise ValueError(f"不支持的协议版本: {version}，支持的版本: {supported}")
+    return version
+
+
+def pack_detections(boxes, scores, class_ids, roi_ids=None):
+    """
+    将检测结果打包为二进制数组字段
+
+    Args:
+        boxes: (N, 4) 检测框
+        scores: (N,) 置信度分数
+        class_ids: (N,) 类别ID
+        roi_ids: (N,) ROI区域ID，-1表示不在任何ROI区域内；为None时不包含该字段
+
+    Returns:
+        包含count和各数组字节串的字典
+    """
+    count = len(scores)
+    class_ids = np.asarray(class_ids)
+    if count and (class_ids.min() < 0 or class_ids.max() > np.iinfo(CLASS_ID_DTYPE).max):
+        raise ValueError("类别ID超出uint16范围")
+
+    packed = {
+        'count': count,
+        'boxes': np.asarray(boxes, dtype=BOX_DTYPE).reshape(count, 4).tobytes(),
+        'class_ids': class_ids.astype(CLASS_ID_DTYPE).tobytes(),
+        'scores': np.asarray(scores, dtype=SCORE_DTYPE).tobytes()
+    }
+    if roi_ids is not None:
+        packed['roi_ids'] = np.asarray(roi_ids, dtype=ROI_ID_DTYPE).tobytes()
+    return packed
+
+
+def unpack_detections(payload):
+    """
+    解包pack_detections生成的字段（供Python客户端和调试使用）
+
+    Returns:
+        (boxes, scores, class_ids, roi_ids)，roi_ids字段不存在时为None
+    """
+    count = payload['count']
+    boxes = np.frombuffer(payload['boxes'], dtype=BOX_DTYPE).reshape(count, 4)
+    scores = np.frombuffer(payload['scores'], dtype=SCORE_DTYPE)
+    class_ids = np.frombuffer(payload['class_ids'], dtype=CLASS_ID_DTYPE)
+    roi_ids = None
+    if 'roi_ids' in payload:
+        roi_ids = np.frombuffer(payload['roi_ids'], dtype=ROI_ID_DTYPE)
+    return boxes, scores, class_ids, roi_ids
+
+
+class ClassTableTracker:
+    """记录每个客户端已经收到哪些模型的类别名称列表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sent = {}
+
+    def needs_classes(self, client_id, model_name, classes):
+        """
+        判断是否需要向客户端发送模型的类别名称，并记录为已发送
+
+        以类别列表对象本身作为标识，模型重新加载后会再次发送
+
+        Args:
+            client_id: 客户端ID
+            model_name: 模型名称
+            classes: 检测器的类别列表
+
+        Returns:
+            是否需要发送
+        """
+        with self._lock:
+            sent = self._sent.setdefault(client_id, {})
+            if sent.get(model_name) is classes:
+                return False
+            sent[model_name] = classes
+            return True
+
+    def forget(self, client_id):
+        """客户端断开连接时清除记录"""
+        with self._lock:
+            self._sent.pop(client_id, None)
@@ -145,9 +145,22 @@ def get_results_dir():
     os.makedirs(results_dir, exist_ok=True)
     return results_dir
 
+def get_batch_jobs_dir():
+    """获取批量检测任务结果目录路径"""
+    batch_jobs_dir = os.path.join(get_results_dir(), 'batch_jobs')
+    os.makedirs(batch_jobs_dir, exist_ok=True)
+    return batch_jobs_dir
+
 def get_models_dir():
     """获取模型目录路径"""
     return get_resource_path('models')
+
+def get_model_cache_dir():
+    """
+    获取优化模型缓存目录路径
+    缓存放在资源目录下的cache目录，不放在用户浏览和复制的模型目录中
+    """
+    return get_resource_path(os.path.join('cache', 'ort'))
     
 def get_logs_dir():
     """获取日志目录路径"""
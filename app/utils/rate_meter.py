@@ -0,0 +1,41 @@
+"""
+速率统计工具
+按时间窗口统计事件速率和数值均值，用于视频源和推理执行器的运行统计。
+"""
+import threading
+from collections import deque
+
+
+class RateMeter:
+    """按时间窗口统计事件速率和数值均值，可以在多个线程中使用"""
+
+    def __init__(self, window):
+        self.window = window
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def add(self, now, value=0.0):
+        with self._lock:
+            self._events.append((now, value))
+            self._trim(now)
+
+    def _trim(self, now):
+        while self._events and now - self._events[0][0] > self.window:
+            self._events.popleft()
+
+    def snapshot(self, now):
+        """
+        Returns:
+            (每秒事件数, 数值均值, 数值最大值)，窗口内没有事件时均值和最大值为None
+        """
+        with self._lock:
+            self._trim(now)
+            if not self._events:
+                return 0.0, None, None
+            first = self._events[0][0]
+            values = [value for _, value in self._events]
+        count = len(values)
+        # 窗口未填满时按实际覆盖的时间计算速率
+        span = min(self.window, max(now - first, 1e-6))
+        rate = count / span if count > 1 else 0.0
+        return rate, sum(values) / count, max(values)
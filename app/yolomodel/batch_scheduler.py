@@ -0,0 +1,184 @@
+"""
+批处理调度模块，将并发到达的单张推理请求合并为一个批次执行
+"""
+import threading
+import queue
+import time
+from collections import Counter
+
+from .logger import get_logger
+
+
+class _BatchRequest:
+    """单个推理请求，持有输入张量并等待批处理结果"""
+
+    __slots__ = ('input_tensor', 'enqueue_time', 'event', 'output', 'error')
+
+    def __init__(self, input_tensor):
+        self.input_tensor = input_tensor
+        self.enqueue_time = time.perf_counter()
+        self.event = threading.Event()
+        self.output = None
+        self.error = None
+
+
+class BatchScheduler:
+    """
+    动态微批处理调度器
+
+    在 max_wait_ms 时间窗口内收集请求，最多合并 max_batch_size 个输入，
+    堆叠成一个NCHW批次后只调用一次 session.run，再把输出按请求拆分返回。
+    固定批次大小的模型会被补齐到声明的批次大小。
+    """
+
+    def __init__(self, detector, max_batch_size=8, max_wait_ms=5.0):
+        """
+        初始化调度器
+
+        Args:
+            detector: YOLODetector实例
+            max_batch_size: 每个批次的最大请求数
+            max_wait_ms: 收集批次的最长等待时间(毫秒)
+        """
+        self.detector = detector
+        self.logger = get_logger("YOLO", "info")
+
+        if detector.dynamic_batch:
+            self.max_batch_size = max(1, int(max_batch_size))
+        else:
+            # 固定批次模型一次最多只能容纳声明的批次大小
+            self.max_batch_size = detector.batch_size
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_histogram = Counter()
+        self._total_requests = 0
+        self._total_batches = 0
+        self._total_wait_time = 0.0
+        self._running = True
+
+        self._worker = threading.Thread(target=self._run, name="BatchScheduler", daemon=True)
+        self._worker.start()
+        self.logger.info(f"批处理调度器已启动: max_batch_size={self.max_batch_size}, "
+                         f"max_wait_ms={self.max_wait * 1000:.1f}")
+
+    def submit(self, input_tensor):
+        """
+        提交一个已预处理的输入张量并阻塞等待推理结果
+
+        Args:
+            input_tensor: 形状为(1, C, H, W)的输入张量
+
+        Returns:
+            该输入对应的模型第一个输出，形状为(1, ...)
+        """
+        # 检测器被注册表淘汰或替换时调度器会停止，已取得该检测器的请求直接推理，不会中途失败
+        if not self._running:
+            return self.detector.run_batch([input_tensor])[0]
+
+        request = _BatchRequest(input_tensor)
+        self._queue.put(request)
+        while not request.event.wait(0.5):
+            if not self._worker.is_alive():
+                # 工作线程退出后才进入队列的请求不会再被处理
+                if not request.event.is_set():
+                    return self.detector.run_batch([input_tensor])[0]
+                break
+
+        if request.error is not None:
+            raise request.error
+        return request.output
+
+    def _collect_batch(self, first_request):
+        """以第一个请求为起点，在等待窗口内收集更多请求"""
+        batch = [first_request]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    request = self._queue.get_nowait()
+                else:
+                    request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # 停止信号放回队列，由主循环处理
+                self._queue.put(None)
+                break
+            batch.append(request)
+
+        return batch
+
+    def _run(self):
+        """工作线程主循环"""
+        while True:
+            request = self._queue.get()
+            if request is None:
+                break
+
+            batch = self._collect_batch(request)
+            start_time = time.perf_counter()
+
+            try:
+                outputs = self.detector.run_batch([r.input_tensor for r in batch])
+                for r, output in zip(batch, outputs):
+                    r.output = output
+            except Exception as e:
+                self.logger.error(f"批量推理失败: {str(e)}")
+                for r in batch:
+                    r.error = e
+
+            with self._stats_lock:
+                self._batch_histogram[len(batch)] += 1
+                self._total_batches += 1
+                self._total_requests += len(batch)
+                self._total_wait_time += sum(start_time - r.enqueue_time for r in batch)
+
+            for r in batch:
+                r.event.set()
+
+        # 停止时仍滞留在队列中的请求逐个直接推理
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                continue
+            try:
+                request.output = self.detector.run_batch([request.input_tensor])[0]
+            except Exception as e:
+                request.error = e
+            request.event.set()
+
+    def get_stats(self):
+        """
+        获取调度器统计信息
+
+        Returns:
+            包含队列深度、批次大小直方图等信息的字典
+        """
+        with self._stats_lock:
+            total_batches = self._total_batches
+            total_requests = self._total_requests
+            return {
+                'enabled': True,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self._queue.qsize(),
+                'total_requests': total_requests,
+                'total_batches': total_batches,
+                'avg_batch_size': total_requests / total_batches if total_batches else 0.0,
+                'avg_queue_wait_ms': self._total_wait_time * 1000 / total_requests if total_requests else 0.0,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self._batch_histogram.items())}
+            }
+
+    def stop(self):
+        """停止调度器，之后提交和尚未组批的请求不再合并，直接推理"""
+        if self._running:
+            self._running = False
+            self._queue.put(None)
+            self._worker.join(timeout=1.0)
@@ -3,8 +3,8 @@
 负责从配置文件加载各种参数
 """
 import os
-import json
 from pathlib import Path
+from .logger import get_logger
 
 class ConfigLoader:
     """配置加载器类"""
@@ -35,12 +35,17 @@ class ConfigLoader:
             配置字典
         """
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                self.config = json.load(f)
-                print(f"从 {self.config_path} 加载配置成功")
-                return self.config
+            if not os.path.exists(self.config_path):
+                raise FileNotFoundError(self.config_path)
+            
+            # 通过配置存储读取，未变化时直接使用缓存
+            from app.utils.config_store import get_config_store
+            self.config = get_config_store(self.config_path).get_config()
+            if not self.config:
+                raise ValueError("配置文件为空或格式错误")
+            return self.config
         except Exception as e:
-            print(f"加载配置文件失败: {str(e)}，使用默认配置")
+            get_logger("YOLO").warning(f"加载配置文件失败: {str(e)}，使用默认配置")
             self.config = self.default_config
             return self.config
     
@@ -0,0 +1,296 @@
+"""
+输出解码模块，在模型加载时根据输出形状和模型元数据选定解码器，
+推理时直接调用，不再逐帧判断输出格式
+
+新的检测头可以通过 register_decoder 注册，无需修改后处理流程
+"""
+import numpy as np
+
+from .class_utils import parse_metadata_value
+
+# 已注册的解码器，按注册顺序匹配
+_DECODERS = []
+
+
+class YOLODecoder:
+    """
+    解码器基类
+
+    解码器把单张图像的模型输出(批次维度为1)转换为通过置信度阈值的
+    xywh边界框(模型输入坐标)、分数和类别ID，NMS和坐标还原由后处理器完成。
+    """
+
+    # 解码器名称，用于配置中指定解码器
+    name = None
+
+    def __init__(self, conf_threshold, num_classes=None):
+        """
+        初始化解码器
+
+        Args:
+            conf_threshold: 置信度阈值
+            num_classes: 模型元数据中的类别数量，未知时为None
+        """
+        self.conf_threshold = conf_threshold
+        self.num_classes = num_classes
+
+    @classmethod
+    def matches(cls, output_shape, metadata):
+        """
+        判断解码器是否适用于该输出
+
+        Args:
+            output_shape: 模型输出形状，动态维度为None
+            metadata: read_model_metadata返回的模型元数据
+
+        Returns:
+            是否适用
+        """
+        return False
+
+    def decode(self, output):
+        """
+        解码模型输出
+
+        Args:
+            output: 单张图像的模型输出
+
+        Returns:
+            (N×4的xywh边界框, N个分数, N个类别ID)
+        """
+        raise NotImplementedError
+
+    def decode_batch(self, output):
+        """
+        解码一个批次的模型输出
+
+        默认逐张调用decode，子类可以改为对整个批次做向量化解码
+
+        Args:
+            output: 批次维度为B的模型输出
+
+        Returns:
+            (N×4的xywh边界框, N个分数, N个类别ID, N个所属图像下标)，按图像下标升序排列
+        """
+        results = [self.decode(output[i:i + 1]) for i in range(len(output))]
+        batch_index = np.concatenate([np.full(len(r[1]), i, dtype=np.intp) for i, r in enumerate(results)])
+        boxes = np.concatenate([np.asarray(r[0], dtype=np.float32).reshape(-1, 4) for r in results])
+        scores = np.concatenate([np.asarray(r[1], dtype=float) for r in results])
+        class_ids = np.concatenate([np.asarray(r[2], dtype=np.intp) for r in results])
+        return boxes, scores, class_ids, batch_index
+
+
+def register_decoder(decoder_class, first=False):
+    """
+    注册解码器
+
+    Args:
+        decoder_class: YOLODecoder的子类，需要设置name
+        first: 是否优先于已注册的解码器匹配
+
+    Returns:
+        decoder_class，便于作为类装饰器使用
+    """
+    if not decoder_class.name:
+        raise ValueError("解码器必须设置name")
+    unregister_decoder(decoder_class.name)
+    if first:
+        _DECODERS.insert(0, decoder_class)
+    else:
+        _DECODERS.append(decoder_class)
+    return decoder_class
+
+
+def unregister_decoder(name):
+    """按名称移除已注册的解码器"""
+    _DECODERS[:] = [d for d in _DECODERS if d.name != name]
+
+
+def get_decoder_names():
+    """获取已注册的解码器名称列表"""
+    return [d.name for d in _DECODERS]
+
+
+def normalize_shape(shape):
+    """将输出形状中的动态维度(字符串、None或非正数)统一为None"""
+    return tuple(dim if isinstance(dim, int) and dim > 0 else None for dim in shape)
+
+
+def read_model_metadata(session):
+    """
+    读取ONNX模型中的自定义元数据
+
+    Args:
+        session: ort.InferenceSession实例
+
+    Returns:
+        包含task、names和num_classes的字典，缺失项为None
+    """
+    metadata = {'task': None, 'names': None, 'num_classes': None}
+    try:
+        custom = session.get_modelmeta().custom_metadata_map or {}
+    except Exception:
+        return metadata
+
+    metadata['task'] = custom.get('task')
+
+    if 'names' in custom:
+        try:
+            names = parse_metadata_value(custom['names'])
+            if isinstance(names, dict):
+                names = [names[k] for k in sorted(names, key=lambda k: int(k))]
+            if isinstance(names, list):
+                metadata['names'] = [str(n) for n in names]
+                metadata['num_classes'] = len(names)
+        except (ValueError, TypeError):
+            pass
+
+    return metadata
+
+
+def create_decoder(output_shape, metadata, conf_threshold, name=None):
+    """
+    为模型输出选定解码器
+
+    Args:
+        output_shape: 模型输出形状，可以包含动态维度
+        metadata: read_model_metadata返回的模型元数据
+        conf_threshold: 置信度阈值
+        name: 指定的解码器名称，为None时自动匹配
+
+    Returns:
+        解码器实例，无法确定时返回None
+
+    Raises:
+        ValueError: 指定的解码器不存在
+    """
+    output_shape = normalize_shape(output_shape)
+    num_classes = metadata.get('num_classes')
+
+    if name:
+        for decoder_class in _DECODERS:
+            if decoder_class.name == name:
+                return decoder_class(conf_threshold, num_classes)
+        raise ValueError(f"未知的解码器: {name}，可用: {', '.join(get_decoder_names())}")
+
+    for decoder_class in _DECODERS:
+        if decoder_class.matches(output_shape, metadata):
+            return decoder_class(conf_threshold, num_classes)
+
+    # 元数据中的类别数量与输出形状不一致时，只按输出形状匹配
+    if num_classes:
+        return create_decoder(output_shape, dict(metadata, num_classes=None), conf_threshold)
+    return None
+
+
+@register_decoder
+class YOLOv8SingleClassDecoder(YOLODecoder):
+    """YOLOv8单类别检测输出 [1, 5, N]"""
+
+    name = 'yolov8-single'
+
+    @classmethod
+    def matches(cls, output_shape, metadata):
+        return len(output_shape) == 3 and output_shape[1] == 5
+
+    def decode(self, output):
+        predictions = output[0]  # [5, N]
+        confidences = predictions[4]
+
+        # 先按置信度筛选，只转置通过阈值的列
+        mask = confidences > self.conf_threshold
+        boxes = predictions[:4, mask].T
+        scores = confidences[mask].astype(float)
+        class_ids = np.zeros(len(scores), dtype=np.int32)
+        return boxes, scores, class_ids
+
+    def decode_batch(self, output):
+        # np.nonzero按行优先返回，结果天然按图像下标排列
+        batch_index, anchors = np.nonzero(output[:, 4] > self.conf_threshold)
+        boxes = output[batch_index, :4, anchors]
+        scores = output[batch_index, 4, anchors].astype(float)
+        class_ids = np.zeros(len(scores), dtype=np.int32)
+        return boxes, scores, class_ids, batch_index
+
+
+@register_decoder
+class YOLOv8MultiClassDecoder(YOLODecoder):
+    """YOLOv8多类别输出 [1, 4+C, N]"""
+
+    name = 'yolov8-multi'
+
+    @classmethod
+    def matches(cls, output_shape, metadata):
+        if len(output_shape) != 3 or output_shape[1] is None or output_shape[1] <= 5:
+            return False
+        num_classes = metadata.get('num_classes')
+        if num_classes:
+            return output_shape[1] == 4 + num_classes
+        # 通道维度小于候选框数量
+        return output_shape[2] is None or output_shape[1] < output_shape[2]
+
+    def decode(self, output):
+        # YOLOv8没有目标置信度，第5行起全部是类别分数；直接在 [4+C, N] 布局上按列归约，不转置整个输出
+        predictions = output[0]
+        class_scores = predictions[4:]
+
+        # 先按最高类别分数筛选，再只对通过阈值的列计算类别和边界框
+        best_class_scores = np.max(class_scores, axis=0)
+        mask = best_class_scores > self.conf_threshold
+        best_class_ids = np.argmax(class_scores[:, mask], axis=0)
+        boxes = predictions[:4, mask].T
+        return boxes, best_class_scores[mask].astype(float), best_class_ids
+
+    def decode_batch(self, output):
+        # 对整个批次一次归约得到 (B, N) 的最高类别分数
+        best_class_scores = np.max(output[:, 4:], axis=1)
+        batch_index, anchors = np.nonzero(best_class_scores > self.conf_threshold)
+
+        # 高级索引被切片隔开时结果维度在前：(K, C) 和 (K, 4)
+        best_class_ids = np.argmax(output[batch_index, 4:, anchors], axis=1)
+        boxes = output[batch_index, :4, anchors]
+        return boxes, best_class_scores[batch_index, anchors].astype(float), best_class_ids, batch_index
+
+
+@register_decoder
+class YOLOLegacyDecoder(YOLODecoder):
+    """传统YOLO输出 [1, N, 5+C] 或 [N, 5+C]，包含目标置信度列"""
+
+    name = 'yolo-legacy'
+
+    @classmethod
+    def matches(cls, output_shape, metadata):
+        if len(output_shape) == 2:
+            return output_shape[1] is None or output_shape[1] >= 6
+        if len(output_shape) != 3 or output_shape[2] is None or output_shape[2] < 6:
+            return False
+        num_classes = metadata.get('num_classes')
+        if num_classes:
+            return output_shape[2] == 5 + num_classes
+        return output_shape[1] is None or output_shape[1] > output_shape[2]
+
+    def decode(self, output):
+        if output.ndim == 3:
+            output = output[0]
+
+        # 提取置信度分数(第5列)
+        scores = output[:, 4]
+        mask = scores >= self.conf_threshold
+        filtered_output = output[mask]
+        filtered_scores = scores[mask]
+
+        # 提取类别概率(第6列及之后)
+        class_probs = filtered_output[:, 5:]
+        class_ids = np.argmax(class_probs, axis=1)
+        class_scores = np.max(class_probs, axis=1)
+
+        # 计算最终分数(置信度 * 类别概率)，再次根据综合分数筛选
+        scores = filtered_scores * class_scores
+        mask2 = scores >= self.conf_threshold
+        return filtered_output[mask2, :4], scores[mask2].astype(float), class_ids[mask2]
+
+    def decode_batch(self, output):
+        # 二维输出没有批次维度，视为单张图像
+        if output.ndim == 2:
+            output = output[np.newaxis]
+        return super().decode_batch(output)
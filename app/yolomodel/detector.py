@@ -3,33 +3,44 @@ YOLO检测器主模块，集成了预处理、推理、后处理和可视化功
 """
 import os
 import time
-import onnxruntime as ort
+import numpy as np
 
 from .config import ConfigLoader
 from .class_utils import ClassManager
 from .preprocessor import ImagePreprocessor
 from .postprocessor import YOLOPostprocessor
 from .visualizer import DetectionVisualizer
-from .logger import get_logger
+from .batch_scheduler import BatchScheduler
+from .runtime import validate_runtime_config, create_session, describe_session
+from .model_cache import get_model_cache
+from .decoders import read_model_metadata
+from .logger import get_logger, SampledMetrics
+from .metrics import stage, set_trace_labels, STAGE_SESSION_RUN, STAGE_RENDER
 
 class YOLODetector:
     """
     YOLO目标检测器类，使用ONNX模型进行推理
     """
     
-    def __init__(self, model_path, model_type='yolov8'):
+    def __init__(self, model_path, model_type='yolov8', runtime_config=None, cache_dir=None,
+                 postprocess_config=None, model_name=None):
         """
         初始化YOLO检测器
         
         Args:
             model_path: ONNX模型文件的路径
             model_type: 模型类型，目前支持'yolov8'
+            runtime_config: ONNX Runtime会话配置(config.json中models[].runtime)
+            cache_dir: 优化模型缓存目录，为None时不使用缓存
+            postprocess_config: 后处理/NMS配置(config.json中models[].postprocess)
+            model_name: 模型名称，用作耗时统计的标签，默认为模型文件名
         """
         # 初始化日志
         self.logger = get_logger("YOLO", "info")
         
         self.model_path = model_path
         self.model_type = model_type
+        self.model_name = model_name or os.path.splitext(os.path.basename(model_path))[0]
         
         # 加载配置
         self.config_loader = ConfigLoader()
@@ -37,7 +48,14 @@ class YOLODetector:
         
         # 初始化ONNX运行时会话
         try:
-            self.session = ort.InferenceSession(model_path)
+            self.runtime_config = validate_runtime_config(runtime_config)
+            self.optimized_model_path = None
+            self.session_from_cache = False
+            if cache_dir:
+                self.session, self.optimized_model_path, self.session_from_cache = \
+                    get_model_cache(cache_dir).create_session(model_path, self.runtime_config)
+            else:
+                self.session = create_session(model_path, self.runtime_config)
         except Exception as e:
             error_msg = f"加载ONNX模型失败: {str(e)}"
             self.logger.error(error_msg)
@@ -49,29 +67,104 @@ class YOLODetector:
         
         # 设置输入形状(假设只有一个输入)
         self.input_shape = self.session.get_inputs()[0].shape
-        if self.input_shape[0] == -1:  # 动态批次大小
+        # 动态维度在ONNX Runtime中以字符串或None表示
+        self.dynamic_batch = not isinstance(self.input_shape[0], int) or self.input_shape[0] <= 0
+        if self.dynamic_batch:  # 动态批次大小
             self.batch_size = 1
-            self.input_width = self.input_shape[2]
-            self.input_height = self.input_shape[3]
         else:  # 固定批次大小
             self.batch_size = self.input_shape[0]
-            self.input_width = self.input_shape[2]
-            self.input_height = self.input_shape[3]
+        # 输入为NCHW布局，动态的空间维度按默认的640处理
+        self.input_height = self.input_shape[2] if isinstance(self.input_shape[2], int) else 640
+        self.input_width = self.input_shape[3] if isinstance(self.input_shape[3], int) else 640
         
         # 初始化类别管理器和类别列表
         self.class_manager = ClassManager(model_path, self.session)
         self.classes = self.class_manager.extract_classes_from_model() or self.class_manager.get_default_classes()
         
-        # 设置置信度阈值和NMS阈值
-        self.conf_threshold = self.config['model']['conf_threshold']
-        self.iou_threshold = self.config['model']['iou_threshold']
+        # 读取模型元数据，用于确定输出格式
+        self.model_metadata = read_model_metadata(self.session)
+        if self.model_metadata['task'] not in (None, 'detect'):
+            self.logger.warning(f"模型任务类型为 {self.model_metadata['task']}，仅支持检测模型的输出")
         
-        # 初始化预处理器、后处理器和可视化器
+        # 初始化预处理器、后处理器和可视化器（模型的后处理配置可以覆盖全局阈值）
+        # 输出解码器在加载时根据输出形状选定一次，推理时不再逐帧判断
         self.preprocessor = ImagePreprocessor(self.input_width, self.input_height)
-        self.postprocessor = YOLOPostprocessor(self.conf_threshold, self.iou_threshold)
-        self.visualizer = DetectionVisualizer(self.classes)
+        self.postprocessor = YOLOPostprocessor(self.config['model']['conf_threshold'],
+                                               self.config['model']['iou_threshold'],
+                                               postprocess_config,
+                                               self.session.get_outputs()[0].shape,
+                                               self.model_metadata)
+        
+        # 设置置信度阈值和NMS阈值
+        self.conf_threshold = self.postprocessor.conf_threshold
+        self.iou_threshold = self.postprocessor.iou_threshold
+        
+        # 渲染配置：enabled为False时不绘制结果图像，只返回结构化的检测结果
+        render_config = self.config.get('model', {}).get('render', {})
+        self.visualizer = DetectionVisualizer(self.classes,
+                                              render_config.get('enabled', True),
+                                              render_config.get('min_label_size', 0))
+        
+        # 推理耗时按帧累加，定期输出汇总日志
+        self.inference_metrics = SampledMetrics(self.logger, "推理")
+        
+        # 根据配置启用动态微批处理
+        self.batch_scheduler = None
+        batching_config = self.config.get('model', {}).get('batching', {})
+        if batching_config.get('enabled', False):
+            self.enable_batching(batching_config.get('max_batch_size', 8),
+                                 batching_config.get('max_wait_ms', 5))
+        
+        decoder = self.postprocessor.decoder
+        decoder_name = decoder.name if decoder is not None else "待首帧确定"
+        self.logger.info(f"YOLO检测器初始化成功: {model_type}, 输入尺寸: {self.input_width}x{self.input_height}, "
+                         f"输出解码器: {decoder_name}")
+    
+    def enable_batching(self, max_batch_size=8, max_wait_ms=5):
+        """
+        启用动态微批处理，并发的detect调用将被合并为一次推理
         
-        self.logger.info(f"YOLO检测器初始化成功: {model_type}, 输入尺寸: {self.input_width}x{self.input_height}")
+        Args:
+            max_batch_size: 每个批次的最大请求数
+            max_wait_ms: 收集批次的最长等待时间(毫秒)
+        """
+        self.disable_batching()
+        self.batch_scheduler = BatchScheduler(self, max_batch_size, max_wait_ms)
+    
+    def disable_batching(self):
+        """停用动态微批处理"""
+        if self.batch_scheduler is not None:
+            self.batch_scheduler.stop()
+            self.batch_scheduler = None
+    
+    def get_batching_stats(self):
+        """
+        获取微批处理统计信息
+        
+        Returns:
+            统计信息字典，未启用时只包含enabled字段
+        """
+        if self.batch_scheduler is None:
+            return {'enabled': False}
+        return self.batch_scheduler.get_stats()
+    
+    def get_runtime_settings(self):
+        """
+        获取推理会话的运行时设置
+        
+        Returns:
+            包含配置值(configured)和实际生效值(active)的字典
+        """
+        return {
+            'configured': self.runtime_config,
+            'active': describe_session(self.session, self.runtime_config, self.session_from_cache),
+            'optimized_model_path': self.optimized_model_path,
+            'from_cache': self.session_from_cache
+        }
+    
+    def close(self):
+        """释放检测器持有的后台资源"""
+        self.disable_batching()
     
     def load_config(self):
         """加载配置文件"""
@@ -107,41 +200,170 @@ class YOLODetector:
         """
         return self.preprocessor.preprocess(image)
     
-    def detect(self, image):
+    def run_batch(self, input_tensors):
+        """
+        将多个已预处理的输入堆叠成一个批次并执行一次推理
+        
+        Args:
+            input_tensors: 形状为(1, C, H, W)的输入张量列表
+            
+        Returns:
+            与输入一一对应的模型第一个输出列表，每项形状为(1, ...)
+        """
+        count = len(input_tensors)
+        if not self.dynamic_batch and count > self.batch_size:
+            raise ValueError(f"批次大小 {count} 超过模型声明的批次大小 {self.batch_size}")
+        
+        batch = input_tensors[0] if count == 1 else np.concatenate(input_tensors, axis=0)
+        
+        # 固定批次模型需要补齐到声明的批次大小
+        if not self.dynamic_batch and count < self.batch_size:
+            padding = np.zeros((self.batch_size - count,) + batch.shape[1:], dtype=batch.dtype)
+            batch = np.concatenate([batch, padding], axis=0)
+        
+        output = self._run_session(batch, count)
+        return [output[i:i + 1] for i in range(count)]
+    
+    def _run_session(self, batch, count):
+        """
+        对已组好的批次张量执行一次推理
+        
+        Args:
+            batch: 形状为(B, C, H, W)的输入张量
+            count: 其中有效图像的数量，用于统计
+            
+        Returns:
+            模型的第一个输出
+        """
+        start_time = time.perf_counter()
+        outputs = self.session.run(self.output_names, {self.input_name: batch})
+        inference_time = (time.perf_counter() - start_time) * 1000
+        self.inference_metrics.record(time_ms=inference_time, batch_size=count)
+        if self.logger.is_enabled_for('debug'):
+            self.logger.debug(f"推理时间: {inference_time:.2f} ms, 批次大小: {count}")
+        return outputs[0]
+    
+    def detect(self, image, render=True, coordinate_space='original', overlay=None):
         """
         执行目标检测
         
+        图像只缩放一次到模型输入尺寸，检测框按coordinate_space映射到对应坐标系：
+        'original'为原始图像坐标，'canvas'为模型输入尺寸的填充画布坐标(即ROI画布)
+        
         Args:
             image: 要检测的图像(BGR格式)
+            render: 是否绘制检测结果
+            coordinate_space: 返回坐标和绘制图像所在的坐标系，'original'或'canvas'
+            overlay: 绘制检测结果后原地合成的叠加层（提供apply(image)方法，如ROI叠加层），
+                     尺寸需与绘制图像一致
             
         Returns:
-            检测到的边界框、置信度分数、类别ID和处理后的图像
+            检测到的边界框、置信度分数、类别ID和处理后的图像（render为False或不渲染模式下为None）
         """
-        # 预处理图像
-        input_tensor, preprocess_params = self.preprocessor.preprocess(image)
+        if coordinate_space not in ('original', 'canvas'):
+            raise ValueError(f"不支持的坐标系: {coordinate_space}")
+        
+        # 耗时统计按模型名称和输入图像分辨率分组
+        set_trace_labels(self.model_name, (image.shape[1], image.shape[0]))
+        
+        # 预处理图像（写入当前线程的预分配输入张量）
+        input_tensor, preprocess_params, resized = self.preprocessor.prepare(image)
         
-        # 执行推理
-        start_time = time.time()
-        outputs = self.session.run(self.output_names, {self.input_name: input_tensor})
-        inference_time = time.time() - start_time
-        detection_timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
-        self.logger.info(f"[{detection_timestamp}] 推理时间: {inference_time*1000:.2f} ms")
+        # 执行推理（启用微批处理时由调度器合并执行，耗时包含等待组批的时间）
+        with stage(STAGE_SESSION_RUN):
+            # 调度器可能被另一个线程停用，只读取一次
+            batch_scheduler = self.batch_scheduler
+            if batch_scheduler is not None:
+                output = batch_scheduler.submit(input_tensor)
+            else:
+                output = self.run_batch([input_tensor])[0]
         
         # 后处理结果 (根据模型类型)
         if self.model_type == 'yolov8':
-            boxes, scores, class_ids = self.postprocessor.postprocess_yolov8(outputs[0], preprocess_params)
+            boxes, scores, class_ids = self.postprocessor.postprocess_yolov8(output, preprocess_params)
         else:
             error_msg = f"不支持的模型类型: {self.model_type}"
             self.logger.error(error_msg)
             raise ValueError(error_msg)
         
-        # 在图像上绘制检测结果
-        result_image = self.visualizer.draw_detections(image.copy(), boxes, scores, class_ids)
+        if coordinate_space == 'canvas' and len(boxes) > 0:
+            boxes = self.postprocessor.map_boxes_to_canvas(boxes, preprocess_params)
         
-        print(f"检测完成,输出图片大小为{result_image.shape}")
+        # 在图像上绘制检测结果（不渲染模式下忽略render参数）
+        if not render or not self.visualizer.enabled:
+            return boxes, scores, class_ids, None
+        # 每帧只分配一次结果图像：原始图像坐标系下在输入图像的副本上绘制，不会修改输入图像；
+        # 画布坐标系下新建的画布本身就是副本，直接在其上绘制
+        with stage(STAGE_RENDER):
+            if coordinate_space == 'canvas':
+                result_image = self.preprocessor.build_canvas(resized, preprocess_params)
+                self.visualizer.draw_detections(result_image, boxes, scores, class_ids, copy=False)
+            else:
+                result_image = self.visualizer.draw_detections(image, boxes, scores, class_ids)
+            if overlay is not None:
+                overlay.apply(result_image)
+        
+        if self.logger.is_enabled_for('debug'):
+            self.logger.debug(f"检测完成,输出图片大小为{result_image.shape}")
         
         return boxes, scores, class_ids, result_image
     
+    def detect_batch(self, images, render=False, coordinate_space='original', batch_size=None):
+        """
+        批量执行目标检测
+        
+        多张图像写入同一个NCHW张量后只调用一次推理，解码和坐标还原对整个批次向量化执行。
+        固定批次大小的模型按声明的批次大小分块，不足的部分补齐。
+        
+        Args:
+            images: 要检测的图像(BGR格式)列表
+            render: 是否绘制检测结果
+            coordinate_space: 返回坐标和绘制图像所在的坐标系，'original'或'canvas'
+            batch_size: 动态批次模型每次推理的最大图像数量，为None时一次推理全部图像；
+                        固定批次模型总是使用声明的批次大小
+            
+        Returns:
+            与输入一一对应的(边界框, 置信度分数, 类别ID, 处理后的图像)列表，render为False或不渲染模式下图像为None
+        """
+        if coordinate_space not in ('original', 'canvas'):
+            raise ValueError(f"不支持的坐标系: {coordinate_space}")
+        if self.model_type != 'yolov8':
+            error_msg = f"不支持的模型类型: {self.model_type}"
+            self.logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        if self.dynamic_batch:
+            chunk_size = batch_size or len(images) or 1
+        else:
+            chunk_size = self.batch_size
+        
+        results = []
+        for chunk_start in range(0, len(images), chunk_size):
+            chunk = images[chunk_start:chunk_start + chunk_size]
+            
+            # 固定批次模型的张量行数为声明的批次大小，多出的补齐行不参与后处理
+            input_tensor, params_list, resized_list = self.preprocessor.prepare_batch(
+                chunk, None if self.dynamic_batch else self.batch_size)
+            output = self._run_session(input_tensor, len(chunk))
+            detections = self.postprocessor.postprocess_batch(output, params_list)
+            
+            for image, params, resized, (boxes, scores, class_ids) in zip(chunk, params_list, resized_list,
+                                                                         detections):
+                if coordinate_space == 'canvas' and len(boxes) > 0:
+                    boxes = self.postprocessor.map_boxes_to_canvas(boxes, params)
+                
+                result_image = None
+                if render and self.visualizer.enabled:
+                    if coordinate_space == 'canvas':
+                        result_image = self.preprocessor.build_canvas(resized, params)
+                        self.visualizer.draw_detections(result_image, boxes, scores, class_ids, copy=False)
+                    else:
+                        result_image = self.visualizer.draw_detections(image, boxes, scores, class_ids)
+                
+                results.append((boxes, scores, class_ids, result_image))
+        
+        return results
+    
     def get_class_name(self, class_id):
         """
         获取类别名称
@@ -1,9 +1,17 @@
 """
 日志模块，提供统一的日志记录功能
 支持打包成单文件后，在exe同级目录创建日志文件夹
+
+记录日志的线程只把日志记录放入内存队列，格式化和控制台/文件写入由每个记录器的后台线程完成，
+队列满时丢弃新记录而不阻塞调用方。文件支持按大小或按时间轮转，可以输出为每行一个JSON对象。
 """
 import logging
+import logging.handlers
 import time
+import threading
+import queue
+import json
+import atexit
 from datetime import datetime
 import os
 import sys
@@ -18,6 +26,24 @@ LOG_LEVELS = {
     'critical': logging.CRITICAL
 }
 
+# 默认的日志设置(config.json中的logging字段)
+DEFAULT_LOG_CONFIG = {
+    'level': None,              # 为None时使用各记录器创建时指定的级别
+    'console': True,            # 是否输出到控制台
+    'json': False,              # 是否以每行一个JSON对象的格式输出
+    'rotation': 'size',         # 文件轮转方式: 'size'、'time'或'none'
+    'max_bytes': 10 * 1024 * 1024,
+    'backup_count': 5,
+    'when': 'midnight',         # 按时间轮转的周期，同TimedRotatingFileHandler的when参数
+    'queue_size': 10000         # 等待写入的日志记录上限，超出时丢弃
+}
+
+ROTATION_MODES = ('size', 'time', 'none')
+
+# 文本格式
+_TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
 def get_application_path():
     """
     获取应用程序路径
@@ -61,6 +87,84 @@ def ensure_log_dir(log_dir=None):
             os.makedirs(temp_dir)
         return temp_dir
 
+def get_log_settings(config=None):
+    """
+    合并默认值和配置文件中的日志设置
+    
+    Args:
+        config: 配置字典，为None时只使用默认值
+        
+    Returns:
+        设置字典
+        
+    Raises:
+        ValueError: 设置值无效
+    """
+    settings = dict(DEFAULT_LOG_CONFIG)
+    if config:
+        settings.update(config.get('logging', {}))
+    
+    level = settings['level']
+    if level is not None and str(level).lower() not in LOG_LEVELS:
+        raise ValueError(f"level 必须是以下之一: {', '.join(LOG_LEVELS)}")
+    if settings['rotation'] not in ROTATION_MODES:
+        raise ValueError(f"rotation 必须是以下之一: {', '.join(ROTATION_MODES)}")
+    for key in ('max_bytes', 'queue_size'):
+        value = settings[key]
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f"{key} 必须是正整数")
+    backup_count = settings['backup_count']
+    if isinstance(backup_count, bool) or not isinstance(backup_count, int) or backup_count < 0:
+        raise ValueError("backup_count 必须是非负整数")
+    return settings
+
+class TextFormatter(logging.Formatter):
+    """文本格式，结构化字段以key=value的形式附加在消息后"""
+    
+    def __init__(self):
+        super().__init__(_TEXT_FORMAT, datefmt=_DATE_FORMAT)
+    
+    def format(self, record):
+        message = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            message += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return message
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON对象，结构化字段作为顶层键"""
+    
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            for key, value in fields.items():
+                entry.setdefault(key, value)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志记录并计数，不阻塞记录日志的线程"""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+# 当前生效的日志设置，由configure_logging更新
+_settings = get_log_settings()
+
 class Logger:
     """日志记录器类，提供统一的日志记录功能"""
     
@@ -75,69 +179,248 @@ class Logger:
             log_dir: 日志目录路径，如果为None则使用默认路径
         """
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(LOG_LEVELS.get(level.lower(), logging.INFO))
+        self.logger.propagate = False
         self.name = name
+        self.level = level
+        self.log_file = None
+        
+        self._custom_log_file = log_file
+        self._log_dir = log_dir
+        self._listener = None
+        self._queue_handler = None
         
-        # 清除现有的处理器
-        if self.logger.handlers:
-            self.logger.handlers.clear()
+        # 采样和限流日志的状态
+        self._rate_lock = threading.Lock()
+        self._sample_counts = {}
+        self._throttle_state = {}
         
-        # 创建格式化器
-        formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s', 
-                                     datefmt='%Y-%m-%d %H:%M:%S')
+        self.configure(_settings)
+        if self.log_file:
+            self.info(f"日志初始化成功，日志文件: {self.log_file}")
+    
+    def configure(self, settings):
+        """
+        按日志设置重建输出处理器和后台写入线程，等待中的日志会先写完
         
-        # 添加控制台处理器
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
+        Args:
+            settings: get_log_settings返回的设置字典
+        """
+        self.close()
         
-        # 添加文件处理器
+        level = settings['level'] or self.level
+        self.logger.setLevel(LOG_LEVELS.get(str(level).lower(), logging.INFO))
+        formatter = JsonFormatter() if settings['json'] else TextFormatter()
+        
+        handlers = []
+        if settings['console']:
+            console_handler = logging.StreamHandler(sys.stdout)
+            console_handler.setFormatter(formatter)
+            handlers.append(console_handler)
+        
+        file_error = None
         try:
-            # 如果没有指定日志文件，则创建默认日志文件
-            if not log_file:
-                log_dir = ensure_log_dir(log_dir)
-                date_str = datetime.now().strftime('%Y-%m-%d')
-                log_file = os.path.join(log_dir, f"{name}_{date_str}.log")
-            
-            # 确保日志文件的目录存在
-            log_parent_dir = os.path.dirname(log_file)
-            if log_parent_dir and not os.path.exists(log_parent_dir):
-                os.makedirs(log_parent_dir)
-            
-            # 创建文件处理器
-            file_handler = logging.FileHandler(log_file, encoding='utf-8')
+            file_handler = self._create_file_handler(settings)
             file_handler.setFormatter(formatter)
-            self.logger.addHandler(file_handler)
-            
-            self.log_file = log_file
-            self.info(f"日志初始化成功，日志文件: {log_file}")
+            handlers.append(file_handler)
         except Exception as e:
-            self.error(f"创建日志文件失败: {str(e)}")
-            self.error(traceback.format_exc())
+            file_error = e
             self.log_file = None
+        
+        # 记录日志的线程只入队，格式化和写入在监听线程中进行
+        log_queue = queue.Queue(settings['queue_size'])
+        self._queue_handler = DroppingQueueHandler(log_queue)
+        self._listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.logger.handlers.clear()
+        self.logger.addHandler(self._queue_handler)
+        self._listener.start()
+        
+        if file_error is not None:
+            self.error(f"创建日志文件失败: {str(file_error)}")
+            self.error(traceback.format_exc())
+    
+    def _create_file_handler(self, settings):
+        """按轮转方式创建文件处理器"""
+        log_file = self._custom_log_file
+        if not log_file:
+            log_dir = ensure_log_dir(self._log_dir)
+            if settings['rotation'] == 'time':
+                # 按时间轮转时由处理器在文件名后追加日期
+                log_file = os.path.join(log_dir, f"{self.name}.log")
+            else:
+                date_str = datetime.now().strftime('%Y-%m-%d')
+                log_file = os.path.join(log_dir, f"{self.name}_{date_str}.log")
+        
+        # 确保日志文件的目录存在
+        log_parent_dir = os.path.dirname(log_file)
+        if log_parent_dir and not os.path.exists(log_parent_dir):
+            os.makedirs(log_parent_dir)
+        
+        if settings['rotation'] == 'size':
+            handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=settings['max_bytes'],
+                                                           backupCount=settings['backup_count'],
+                                                           encoding='utf-8')
+        elif settings['rotation'] == 'time':
+            handler = logging.handlers.TimedRotatingFileHandler(log_file, when=settings['when'],
+                                                                backupCount=settings['backup_count'],
+                                                                encoding='utf-8')
+        else:
+            handler = logging.FileHandler(log_file, encoding='utf-8')
+        self.log_file = log_file
+        return handler
+    
+    def close(self):
+        """停止后台写入线程并关闭处理器，等待中的日志会先写完"""
+        if self._listener is None:
+            return
+        self.logger.removeHandler(self._queue_handler)
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+    
+    @property
+    def dropped(self):
+        """队列满时被丢弃的日志数量"""
+        return self._queue_handler.dropped if self._queue_handler is not None else 0
     
-    def debug(self, message):
-        """记录调试级别日志"""
-        self.logger.debug(message)
+    def _log(self, level, message, fields):
+        if fields:
+            self.logger.log(level, message, extra={'fields': fields})
+        else:
+            self.logger.log(level, message)
     
-    def info(self, message):
+    def debug(self, message, **fields):
+        """记录调试级别日志，关键字参数作为结构化字段"""
+        self._log(logging.DEBUG, message, fields)
+    
+    def info(self, message, **fields):
         """记录信息级别日志"""
-        self.logger.info(message)
+        self._log(logging.INFO, message, fields)
     
-    def warning(self, message):
+    def warning(self, message, **fields):
         """记录警告级别日志"""
-        self.logger.warning(message)
+        self._log(logging.WARNING, message, fields)
     
-    def error(self, message):
+    def error(self, message, **fields):
         """记录错误级别日志"""
-        self.logger.error(message)
+        self._log(logging.ERROR, message, fields)
     
-    def critical(self, message):
+    def critical(self, message, **fields):
         """记录严重错误级别日志"""
-        self.logger.critical(message)
+        self._log(logging.CRITICAL, message, fields)
+
+    def is_enabled_for(self, level):
+        """
+        判断指定级别的日志是否会被输出，用于在热路径上跳过调试信息的格式化
+        
+        Args:
+            level: 日志级别名称，如'debug'
+        """
+        return self.logger.isEnabledFor(LOG_LEVELS.get(level.lower(), logging.INFO))
+    
+    def sampled(self, key, every, message, level='info', **fields):
+        """
+        按key采样记录逐帧日志，每every次调用只记录第一次
+        
+        Args:
+            key: 采样计数的键，通常是调用位置
+            every: 采样间隔(次)
+            message: 日志消息，可以是无参函数，只在需要记录时调用以避免格式化开销
+            level: 日志级别名称
+            **fields: 结构化字段
+            
+        Returns:
+            是否记录了该条日志
+        """
+        if not self.is_enabled_for(level):
+            return False
+        with self._rate_lock:
+            count = self._sample_counts.get(key, 0)
+            self._sample_counts[key] = count + 1
+        if count % max(1, every):
+            return False
+        self._log(LOG_LEVELS.get(level.lower(), logging.INFO), message() if callable(message) else message,
+                  dict(fields, sampled_every=every) if every > 1 else fields)
+        return True
+    
+    def throttled(self, key, interval, message, level='warning', **fields):
+        """
+        按key限流记录日志，interval秒内只记录一次，期间被抑制的条数随下一条日志记录
+        
+        Args:
+            key: 限流的键，通常是调用位置或错误来源
+            interval: 最短记录间隔(秒)
+            message: 日志消息，可以是无参函数
+            level: 日志级别名称
+            **fields: 结构化字段
+            
+        Returns:
+            是否记录了该条日志
+        """
+        if not self.is_enabled_for(level):
+            return False
+        now = time.monotonic()
+        with self._rate_lock:
+            last, suppressed = self._throttle_state.get(key, (None, 0))
+            if last is not None and now - last < interval:
+                self._throttle_state[key] = (last, suppressed + 1)
+                return False
+            self._throttle_state[key] = (now, 0)
+        if suppressed:
+            fields = dict(fields, suppressed=suppressed)
+        self._log(LOG_LEVELS.get(level.lower(), logging.INFO), message() if callable(message) else message, fields)
+        return True
+
+class SampledMetrics:
+    """
+    逐帧指标的采样汇总
+    
+    每帧只在内存中累加，每 interval 帧输出一条INFO汇总日志（平均值和最大值），
+    避免每帧都同步写日志文件。
+    """
+    
+    def __init__(self, logger, name, interval=100):
+        """
+        初始化采样汇总器
+        
+        Args:
+            logger: Logger实例
+            name: 指标名称，用于日志前缀
+            interval: 汇总输出间隔(帧)，0表示不输出
+        """
+        self.logger = logger
+        self.name = name
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._count = 0
+        self._sums = {}
+        self._maxes = {}
+    
+    def record(self, **values):
+        """
+        记录一帧的指标
+        
+        Args:
+            **values: 指标名称和数值
+        """
+        with self._lock:
+            self._count += 1
+            for key, value in values.items():
+                self._sums[key] = self._sums.get(key, 0) + value
+                if value > self._maxes.get(key, float('-inf')):
+                    self._maxes[key] = value
+            
+            if not self.interval or self._count < self.interval:
+                return
+            count, sums, maxes = self._count, self._sums, self._maxes
+            self._count, self._sums, self._maxes = 0, {}, {}
+        
+        summary = ', '.join(f"{key} 平均 {sums[key] / count:.2f} 最大 {maxes[key]:.2f}" for key in sums)
+        self.logger.info(f"{self.name} 最近 {count} 帧: {summary}")
 
 # 日志记录器缓存
 _loggers = {}
+_loggers_lock = threading.Lock()
 
 def get_logger(name="YOLO", level="info", log_file=None, log_dir=None):
     """
@@ -152,15 +435,43 @@ def get_logger(name="YOLO", level="info", log_file=None, log_dir=None):
     Returns:
         Logger实例
     """
-    global _loggers
-    # 如果日志记录器已存在，则直接返回
-    if name in _loggers:
-        return _loggers[name]
-    
-    # 否则创建新的日志记录器
-    logger = Logger(name, level, log_file, log_dir)
-    _loggers[name] = logger
-    return logger
+    with _loggers_lock:
+        # 如果日志记录器已存在，则直接返回
+        if name in _loggers:
+            return _loggers[name]
+        
+        # 否则创建新的日志记录器
+        logger = Logger(name, level, log_file, log_dir)
+        _loggers[name] = logger
+        return logger
+
+def configure_logging(config):
+    """
+    按配置文件中的logging字段重新配置全部日志记录器，之后创建的记录器也使用该设置
+    
+    Args:
+        config: 配置字典
+        
+    Returns:
+        生效的设置字典
+        
+    Raises:
+        ValueError: 设置值无效
+    """
+    global _settings
+    settings = get_log_settings(config)
+    with _loggers_lock:
+        _settings = settings
+        for logger in _loggers.values():
+            logger.configure(settings)
+    return settings
+
+@atexit.register
+def shutdown_logging():
+    """进程退出前写完所有等待中的日志"""
+    with _loggers_lock:
+        for logger in _loggers.values():
+            logger.close()
 
 # 创建默认记录器
 default_logger = get_logger("YOLO")
@@ -0,0 +1,389 @@
+"""
+分阶段耗时统计模块
+用perf_counter_ns记录检测流程中每个阶段的耗时，按(阶段, 模型, 输入分辨率)汇总为进程内直方图，
+可以计算p50/p95/p99并导出为Prometheus文本格式。
+
+一次检测的各阶段在trace_frame()范围内先记录到当前线程的跟踪中，检测结束时统一写入直方图，
+因此图像解码等在选定模型之前发生的阶段也能带上模型名称和分辨率标签。
+"""
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+# 检测流程的阶段名称
+STAGE_DISK_READ = 'disk_read'
+STAGE_IMAGE_DECODE = 'image_decode'
+STAGE_LETTERBOX = 'letterbox'
+STAGE_NORMALIZE = 'normalize'
+STAGE_SESSION_RUN = 'session_run'
+STAGE_OUTPUT_DECODE = 'output_decode'
+STAGE_NMS = 'nms'
+STAGE_ROI_ASSIGN = 'roi_assign'
+STAGE_RULE_VALIDATE = 'rule_validate'
+STAGE_RENDER = 'render'
+STAGE_IMAGE_ENCODE = 'image_encode'
+STAGE_DISK_WRITE = 'disk_write'
+STAGE_TOTAL = 'total'
+
+# 导出的分位数
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 未知的标签值；每个模型最多保留的分辨率标签数量，超出的分辨率归入RESOLUTION_OTHER
+UNKNOWN_LABEL = 'unknown'
+RESOLUTION_OTHER = 'other'
+MAX_RESOLUTIONS_PER_MODEL = 16
+
+# 内部桶边界(秒)：1微秒到100秒，每个数量级10个近似对数间隔的边界，用于估算分位数
+_MANTISSAS = (1.0, 1.2, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0, 6.0, 8.0)
+_BOUND_PARTS = [(m, e) for e in range(-6, 2) for m in _MANTISSAS] + [(1.0, 2)]
+_BUCKET_BOUNDS = tuple(m * 10.0 ** e for m, e in _BOUND_PARTS)
+# 导出到Prometheus的桶边界是内部边界的子集，累计计数保持精确
+_EXPORT_MANTISSAS = (1.0, 2.5, 5.0)
+_EXPORT_INDEXES = tuple(i for i, (m, _) in enumerate(_BOUND_PARTS) if m in _EXPORT_MANTISSAS)
+
+_NS_PER_SECOND = 1e9
+
+
+class LatencyHistogram:
+    """单个标签组合的耗时直方图，记录累计的桶计数、总和、最小值和最大值"""
+
+    __slots__ = ('_lock', '_counts', '_count', '_sum', '_min', '_max')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 最后一个桶计数超过最大边界的样本
+        self._counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._min = None
+        self._max = None
+
+    def observe(self, seconds):
+        index = _bucket_index(seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += seconds
+            if self._min is None or seconds < self._min:
+                self._min = seconds
+            if self._max is None or seconds > self._max:
+                self._max = seconds
+
+    def snapshot(self):
+        """
+        Returns:
+            (桶计数列表, 样本数, 总和, 最小值, 最大值)
+        """
+        with self._lock:
+            return list(self._counts), self._count, self._sum, self._min, self._max
+
+
+def _bucket_index(seconds):
+    # 二分查找第一个不小于seconds的边界
+    low, high = 0, len(_BUCKET_BOUNDS)
+    while low < high:
+        middle = (low + high) // 2
+        if _BUCKET_BOUNDS[middle] < seconds:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def estimate_quantile(counts, count, quantile, minimum=None, maximum=None):
+    """
+    根据桶计数估算分位数，在所在桶内线性插值，并限制在观测到的最小值和最大值之间
+
+    Args:
+        counts: LatencyHistogram的桶计数列表
+        count: 样本数
+        quantile: 0到1之间的分位数
+        minimum: 观测到的最小值
+        maximum: 观测到的最大值
+
+    Returns:
+        估算值(秒)，没有样本时为None
+    """
+    if count == 0:
+        return None
+    rank = quantile * count
+    cumulative = 0
+    for index, bucket_count in enumerate(counts):
+        if bucket_count == 0:
+            continue
+        if cumulative + bucket_count >= rank:
+            lower = _BUCKET_BOUNDS[index - 1] if index > 0 else 0.0
+            upper = _BUCKET_BOUNDS[index] if index < len(_BUCKET_BOUNDS) else (maximum or lower)
+            if minimum is not None:
+                lower = max(lower, minimum)
+            if maximum is not None:
+                upper = min(upper, maximum)
+            fraction = (rank - cumulative) / bucket_count
+            return lower + (upper - lower) * max(0.0, min(1.0, fraction))
+        cumulative += bucket_count
+    return maximum
+
+
+class MetricsRegistry:
+    """按(阶段, 模型, 分辨率)组织的耗时直方图集合"""
+
+    def __init__(self, max_resolutions=MAX_RESOLUTIONS_PER_MODEL):
+        self.max_resolutions = max_resolutions
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._lookup = {}
+        self._resolutions = {}
+
+    def observe(self, stage, model, resolution, duration_ns):
+        """
+        记录一个阶段的耗时
+
+        Args:
+            stage: 阶段名称
+            model: 模型名称
+            resolution: 输入分辨率，如'1920x1080'
+            duration_ns: 耗时(纳秒)
+        """
+        key = (stage, model or UNKNOWN_LABEL, resolution or UNKNOWN_LABEL)
+        histogram = self._lookup.get(key)
+        if histogram is None:
+            histogram = self._create(key)
+        histogram.observe(duration_ns / _NS_PER_SECOND)
+
+    def _create(self, key):
+        stage, model, resolution = key
+        with self._lock:
+            # 限制分辨率标签的数量，避免任意尺寸的上传图像产生无限多的时间序列
+            series_key = key
+            resolutions = self._resolutions.setdefault(model, set())
+            if resolution not in resolutions:
+                if len(resolutions) >= self.max_resolutions:
+                    series_key = (stage, model, RESOLUTION_OTHER)
+                else:
+                    resolutions.add(resolution)
+            histogram = self._histograms.setdefault(series_key, LatencyHistogram())
+            self._lookup[key] = histogram
+            return histogram
+
+    def reset(self):
+        """清除全部统计"""
+        with self._lock:
+            self._histograms = {}
+            self._lookup = {}
+            self._resolutions = {}
+
+    def _items(self):
+        with self._lock:
+            items = list(self._histograms.items())
+        return sorted(items, key=lambda item: item[0])
+
+    def get_summary(self):
+        """
+        获取各阶段耗时的汇总
+
+        Returns:
+            列表，每项包含stage、model、resolution、count、mean_ms、min_ms、max_ms和p50_ms/p95_ms/p99_ms
+        """
+        summary = []
+        for (stage, model, resolution), histogram in self._items():
+            counts, count, total, minimum, maximum = histogram.snapshot()
+            if count == 0:
+                continue
+            entry = {
+                'stage': stage,
+                'model': model,
+                'resolution': resolution,
+                'count': count,
+                'mean_ms': _to_ms(total / count),
+                'min_ms': _to_ms(minimum),
+                'max_ms': _to_ms(maximum)
+            }
+            for quantile in QUANTILES:
+                value = estimate_quantile(counts, count, quantile, minimum, maximum)
+                entry[f'p{int(quantile * 100)}_ms'] = _to_ms(value)
+            summary.append(entry)
+        return summary
+
+    def render_prometheus(self):
+        """
+        以Prometheus文本格式(0.0.4)导出
+
+        yolo_stage_duration_seconds为直方图(桶、总和、样本数)，
+        yolo_stage_duration_quantile_seconds为进程内估算的分位数
+
+        Returns:
+            文本
+        """
+        items = [(labels, histogram.snapshot()) for labels, histogram in self._items()]
+        lines = [
+            '# HELP yolo_stage_duration_seconds Duration of each detection pipeline stage.',
+            '# TYPE yolo_stage_duration_seconds histogram'
+        ]
+        for (stage, model, resolution), (counts, count, total, _, _) in items:
+            labels = _format_labels(stage=stage, model=model, resolution=resolution)
+            cumulative = 0
+            position = 0
+            for index in _EXPORT_INDEXES:
+                cumulative += sum(counts[position:index + 1])
+                position = index + 1
+                bound = f'{_BUCKET_BOUNDS[index]:.6g}'
+                lines.append(f'yolo_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'yolo_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'yolo_stage_duration_seconds_sum{{{labels}}} {_format_float(total)}')
+            lines.append(f'yolo_stage_duration_seconds_count{{{labels}}} {count}')
+
+        lines.append('# HELP yolo_stage_duration_quantile_seconds Estimated quantiles of each detection '
+                     'pipeline stage since process start.')
+        lines.append('# TYPE yolo_stage_duration_quantile_seconds gauge')
+        for (stage, model, resolution), (counts, count, _, minimum, maximum) in items:
+            if count == 0:
+                continue
+            for quantile in QUANTILES:
+                labels = _format_labels(stage=stage, model=model, resolution=resolution, quantile=str(quantile))
+                value = estimate_quantile(counts, count, quantile, minimum, maximum)
+                lines.append(f'yolo_stage_duration_quantile_seconds{{{labels}}} {_format_float(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _to_ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def _format_float(value):
+    return f'{float(value):.9g}'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(**labels):
+    return ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items())
+
+
+# 进程内的全局注册表
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """获取进程内的全局指标注册表"""
+    return _registry
+
+
+class _FrameTrace:
+    """当前线程中一次检测的阶段耗时和标签"""
+
+    __slots__ = ('durations', 'model', 'resolution', 'depth', 'started')
+
+    def __init__(self):
+        self.durations = {}
+        self.model = None
+        self.resolution = None
+        self.depth = 0
+        self.started = 0
+
+
+_local = threading.local()
+
+
+@contextmanager
+def trace_frame():
+    """
+    在一次检测的范围内收集各阶段耗时，结束时连同total阶段写入全局注册表
+
+    可以嵌套使用，只有最外层在结束时写入
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        trace = _local.trace = _FrameTrace()
+    if trace.depth == 0:
+        trace.durations = {}
+        trace.model = None
+        trace.resolution = None
+        trace.started = time.perf_counter_ns()
+    trace.depth += 1
+    try:
+        yield trace
+    finally:
+        trace.depth -= 1
+        if trace.depth == 0:
+            _flush(trace, time.perf_counter_ns() - trace.started)
+
+
+def traced(func):
+    """装饰器：在trace_frame()范围内执行函数，函数的整个执行时间计为total阶段"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with trace_frame():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _flush(trace, total_ns):
+    # 没有记录到任何阶段(如请求参数无效)时不计入
+    if not trace.durations:
+        return
+    for stage_name, duration_ns in trace.durations.items():
+        _registry.observe(stage_name, trace.model, trace.resolution, duration_ns)
+    _registry.observe(STAGE_TOTAL, trace.model, trace.resolution, total_ns)
+
+
+def set_trace_labels(model=None, resolution=None):
+    """
+    设置当前线程检测跟踪的模型名称和输入分辨率标签，没有进行中的跟踪时忽略
+
+    Args:
+        model: 模型名称
+        resolution: 输入分辨率，可以是'宽x高'字符串或(宽, 高)
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is None or trace.depth == 0:
+        return
+    if model is not None:
+        trace.model = model
+    if resolution is not None:
+        trace.resolution = resolution if isinstance(resolution, str) else f'{resolution[0]}x{resolution[1]}'
+
+
+def record_stage(stage_name, duration_ns, model=None, resolution=None):
+    """
+    记录一个阶段的耗时：有进行中的跟踪时累加到跟踪中，否则直接写入注册表
+
+    Args:
+        stage_name: 阶段名称
+        duration_ns: 耗时(纳秒)
+        model: 没有进行中的跟踪时使用的模型名称
+        resolution: 没有进行中的跟踪时使用的分辨率
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is not None and trace.depth > 0:
+        trace.durations[stage_name] = trace.durations.get(stage_name, 0) + duration_ns
+    else:
+        _registry.observe(stage_name, model, resolution, duration_ns)
+
+
+class stage:
+    """
+    计时上下文管理器
+
+    用法：
+        with stage(STAGE_NMS):
+            ...
+    """
+
+    __slots__ = ('name', 'model', 'resolution', '_start')
+
+    def __init__(self, name, model=None, resolution=None):
+        self.name = name
+        self.model = model
+        self.resolution = resolution
+        self._start = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record_stage(self.name, time.perf_counter_ns() - self._start, self.model, self.resolution)
+        return False
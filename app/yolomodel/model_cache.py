@@ -0,0 +1,287 @@
+"""
+优化模型缓存模块，持久化ONNX Runtime图优化后的模型，加快模型切换和启动速度
+"""
+import os
+import sys
+import json
+import hashlib
+import platform
+import threading
+import onnxruntime as ort
+
+from .runtime import validate_runtime_config, build_session_options
+from .logger import get_logger
+
+# 缓存清单文件名
+MANIFEST_NAME = 'manifest.json'
+
+
+class ModelCache:
+    """
+    优化模型缓存
+
+    缓存键由源模型文件哈希、ONNX Runtime版本、运行平台和会话配置共同决定。
+    源文件的修改时间或大小变化时重新计算哈希，哈希变化时删除旧的优化模型。
+    """
+
+    def __init__(self, cache_dir):
+        """
+        初始化模型缓存
+
+        Args:
+            cache_dir: 缓存目录路径
+        """
+        self.cache_dir = cache_dir
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        self.logger = get_logger("YOLO", "info")
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _load_manifest(self):
+        """读取缓存清单"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        """原子写入缓存清单"""
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _hash_file(model_path):
+        """计算文件的SHA256哈希"""
+        digest = hashlib.sha256()
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _remove_artifacts(self, keys):
+        """删除指定缓存键对应的优化模型文件"""
+        for key in keys:
+            artifact_path = os.path.join(self.cache_dir, f"{key}.onnx")
+            try:
+                if os.path.exists(artifact_path):
+                    os.remove(artifact_path)
+                    self.logger.info(f"已删除过期的优化模型: {artifact_path}")
+            except OSError as e:
+                self.logger.warning(f"删除过期的优化模型失败: {str(e)}")
+
+    def fingerprint(self, model_path):
+        """
+        获取模型文件指纹，修改时间和大小未变化时复用已记录的哈希
+
+        Args:
+            model_path: 模型文件路径
+
+        Returns:
+            包含mtime、size和sha256的字典
+        """
+        model_path = os.path.abspath(model_path)
+        stat = os.stat(model_path)
+
+        with self._lock:
+            manifest = self._load_manifest()
+            entry = manifest.get(model_path)
+            if entry and entry.get('mtime') == stat.st_mtime and entry.get('size') == stat.st_size:
+                return {'mtime': entry['mtime'], 'size': entry['size'], 'sha256': entry['sha256']}
+
+            sha256 = self._hash_file(model_path)
+
+            # 源文件内容变化时清除旧的优化模型
+            if entry and entry.get('sha256') != sha256:
+                self._remove_artifacts(entry.get('artifacts', []))
+                entry = None
+
+            manifest[model_path] = {
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'sha256': sha256,
+                'artifacts': entry.get('artifacts', []) if entry else []
+            }
+            self._save_manifest(manifest)
+
+        return {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': sha256}
+
+    def cache_key(self, model_path, runtime_config=None):
+        """
+        计算模型与会话配置对应的缓存键
+
+        Args:
+            model_path: 模型文件路径
+            runtime_config: 模型的runtime配置
+
+        Returns:
+            缓存键字符串
+        """
+        runtime_config = validate_runtime_config(runtime_config)
+        key_source = json.dumps({
+            'sha256': self.fingerprint(model_path)['sha256'],
+            'ort_version': ort.__version__,
+            'platform': f"{platform.system()}-{platform.machine()}",
+            'runtime': runtime_config
+        }, sort_keys=True)
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()[:32]
+
+    def _record_artifact(self, model_path, key):
+        """在清单中记录模型对应的优化模型"""
+        model_path = os.path.abspath(model_path)
+        with self._lock:
+            manifest = self._load_manifest()
+            entry = manifest.get(model_path)
+            if entry is not None and key not in entry.setdefault('artifacts', []):
+                entry['artifacts'].append(key)
+                self._save_manifest(manifest)
+
+    def get_cached_path(self, model_path, runtime_config=None):
+        """
+        获取已缓存的优化模型路径
+
+        Returns:
+            优化模型路径，未缓存时返回None
+        """
+        key = self.cache_key(model_path, runtime_config)
+        artifact_path = os.path.join(self.cache_dir, f"{key}.onnx")
+        return artifact_path if os.path.exists(artifact_path) else None
+
+    def create_session(self, model_path, runtime_config=None):
+        """
+        创建推理会话，优先从缓存加载优化后的模型
+
+        Args:
+            model_path: 原始ONNX模型文件路径
+            runtime_config: 模型的runtime配置
+
+        Returns:
+            (ort.InferenceSession实例, 优化模型路径, 是否命中缓存)
+        """
+        options, providers, provider_options = build_session_options(runtime_config)
+        key = self.cache_key(model_path, runtime_config)
+        artifact_path = os.path.join(self.cache_dir, f"{key}.onnx")
+
+        if os.path.exists(artifact_path):
+            try:
+                # 缓存的模型已经过图优化，跳过重复优化
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+                session = ort.InferenceSession(artifact_path, sess_options=options,
+                                               providers=providers, provider_options=provider_options)
+                self.logger.info(f"从缓存加载优化模型: {artifact_path}")
+                return session, artifact_path, True
+            except Exception as e:
+                self.logger.warning(f"加载缓存的优化模型失败，将重新生成: {str(e)}")
+                self._remove_artifacts([key])
+                options, providers, provider_options = build_session_options(runtime_config)
+
+        # 先写入临时文件，生成完成后再原子替换，避免并发读到不完整的文件
+        tmp_path = os.path.join(self.cache_dir, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp.onnx")
+        options.optimized_model_filepath = tmp_path
+        session = ort.InferenceSession(model_path, sess_options=options,
+                                       providers=providers, provider_options=provider_options)
+        try:
+            os.replace(tmp_path, artifact_path)
+            self._record_artifact(model_path, key)
+            self.logger.info(f"已缓存优化模型: {artifact_path}")
+        except OSError as e:
+            self.logger.warning(f"写入优化模型缓存失败: {str(e)}")
+            artifact_path = None
+
+        return session, artifact_path, False
+
+    def warm(self, model_path, runtime_config=None):
+        """
+        预热缓存，确保模型与配置对应的优化模型已生成
+
+        Returns:
+            True表示新生成，False表示已存在
+        """
+        if self.get_cached_path(model_path, runtime_config):
+            return False
+        self.create_session(model_path, runtime_config)
+        return True
+
+
+# 每个缓存目录共享一个实例，保证清单读写互斥
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_model_cache(cache_dir):
+    """
+    获取指定目录的模型缓存实例
+
+    Args:
+        cache_dir: 缓存目录路径
+
+    Returns:
+        ModelCache实例
+    """
+    cache_dir = os.path.abspath(cache_dir)
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = ModelCache(cache_dir)
+        return _caches[cache_dir]
+
+
+def warm_models(models, root_dir, cache_dir):
+    """
+    为模型列表预热优化模型缓存
+
+    Args:
+        models: config.json中的models列表
+        root_dir: 解析相对模型路径的根目录
+        cache_dir: 缓存目录路径
+
+    Returns:
+        每个模型的预热结果列表
+    """
+    cache = get_model_cache(cache_dir)
+    results = []
+
+    for model in models:
+        model_path = model.get('path', '')
+        if not os.path.isabs(model_path):
+            model_path = os.path.join(root_dir, model_path)
+
+        result = {'name': model.get('name'), 'path': model_path}
+        if not os.path.exists(model_path):
+            result.update({'status': 'error', 'message': f'模型文件不存在: {model_path}'})
+        else:
+            try:
+                built = cache.warm(model_path, model.get('runtime'))
+                result['status'] = 'built' if built else 'cached'
+                result['cached_path'] = cache.get_cached_path(model_path, model.get('runtime'))
+            except Exception as e:
+                result.update({'status': 'error', 'message': str(e)})
+        results.append(result)
+
+    return results
+
+
+def main(argv=None):
+    """命令行入口：python -m app.yolomodel.model_cache [config.json]"""
+    import argparse
+    from app.utils.path_utils import get_base_path, get_model_cache_dir
+
+    parser = argparse.ArgumentParser(description='预热ONNX Runtime优化模型缓存')
+    parser.add_argument('config', nargs='?', default=os.path.join(get_base_path(), 'config.json'),
+                        help='配置文件路径')
+    parser.add_argument('--cache-dir', default=get_model_cache_dir(),
+                        help='缓存目录路径')
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    results = warm_models(config.get('models', []), get_base_path(), args.cache_dir)
+    for result in results:
+        print(f"{result['name']}: {result['status']} {result.get('message', result.get('cached_path', ''))}")
+    return 0 if all(r['status'] != 'error' for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+非极大值抑制模块，直接在float32数组上执行向量化NMS，支持按类别抑制、预筛选top-k和Soft-NMS
+"""
+import numpy as np
+
+from .decoders import get_decoder_names
+
+# Soft-NMS的分数衰减方式
+SOFT_NMS_METHODS = ('gaussian', 'linear')
+
+# 默认的后处理配置
+DEFAULT_NMS_CONFIG = {
+    'class_agnostic': False,
+    'pre_nms_topk': 3000,
+    'max_det': 300,
+    'soft_nms': False,
+    'soft_nms_method': 'gaussian',
+    'soft_nms_sigma': 0.5
+}
+
+_THRESHOLD_KEYS = ('conf_threshold', 'iou_threshold')
+_BOOL_KEYS = ('class_agnostic', 'soft_nms')
+_INT_KEYS = ('pre_nms_topk', 'max_det')
+_KNOWN_KEYS = set(DEFAULT_NMS_CONFIG) | set(_THRESHOLD_KEYS) | {'decoder'}
+
+
+def validate_nms_config(nms_config):
+    """
+    校验并规范化模型的后处理配置
+
+    Args:
+        nms_config: config.json中models[].postprocess字段，可以为None
+
+    Returns:
+        规范化后的配置字典（只包含用户显式设置的项）
+
+    Raises:
+        ValueError: 配置项名称、类型或取值无效
+    """
+    if nms_config is None:
+        return {}
+    if not isinstance(nms_config, dict):
+        raise ValueError("postprocess配置必须是对象")
+
+    unknown = set(nms_config) - _KNOWN_KEYS
+    if unknown:
+        raise ValueError(f"未知的postprocess配置项: {', '.join(sorted(unknown))}")
+
+    normalized = {}
+
+    for key in _THRESHOLD_KEYS:
+        if key in nms_config:
+            value = nms_config[key]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1:
+                raise ValueError(f"{key} 必须是0到1之间的数值")
+            normalized[key] = float(value)
+
+    for key in _BOOL_KEYS:
+        if key in nms_config:
+            value = nms_config[key]
+            if not isinstance(value, bool):
+                raise ValueError(f"{key} 必须是布尔值")
+            normalized[key] = value
+
+    for key in _INT_KEYS:
+        if key in nms_config:
+            value = nms_config[key]
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ValueError(f"{key} 必须是非负整数，0表示不限制")
+            normalized[key] = value
+
+    if 'soft_nms_method' in nms_config:
+        method = str(nms_config['soft_nms_method']).lower()
+        if method not in SOFT_NMS_METHODS:
+            raise ValueError(f"soft_nms_method 必须是 {', '.join(SOFT_NMS_METHODS)} 之一")
+        normalized['soft_nms_method'] = method
+
+    if 'soft_nms_sigma' in nms_config:
+        sigma = nms_config['soft_nms_sigma']
+        if isinstance(sigma, bool) or not isinstance(sigma, (int, float)) or sigma <= 0:
+            raise ValueError("soft_nms_sigma 必须是正数")
+        normalized['soft_nms_sigma'] = float(sigma)
+
+    if 'decoder' in nms_config:
+        decoder = nms_config['decoder']
+        if decoder not in get_decoder_names():
+            raise ValueError(f"decoder 必须是 {', '.join(get_decoder_names())} 之一")
+        normalized['decoder'] = decoder
+
+    return normalized
+
+
+def top_k_indices(scores, k):
+    """
+    取分数最高的k个下标（按分数降序）
+
+    使用argpartition只对前k个元素排序，k为0或不小于元素数量时对全部元素排序
+
+    Args:
+        scores: 一维分数数组
+        k: 保留数量
+
+    Returns:
+        下标数组
+    """
+    if k and len(scores) > k:
+        indices = np.argpartition(-scores, k - 1)[:k]
+        return indices[np.argsort(-scores[indices], kind='stable')]
+    return np.argsort(-scores, kind='stable')
+
+
+def offset_boxes_by_class(boxes, class_ids):
+    """
+    按类别平移边界框，使不同类别的框互不重叠，从而一次NMS完成按类别抑制
+
+    Args:
+        boxes: (N, 4) x1y1x2y2格式的边界框
+        class_ids: (N,) 类别ID
+
+    Returns:
+        平移后的边界框
+    """
+    if len(boxes) == 0:
+        return boxes
+    max_coordinate = boxes.max() + 1
+    return boxes + (class_ids.astype(boxes.dtype) * max_coordinate)[:, np.newaxis]
+
+
+def _box_areas(boxes):
+    """计算边界框面积"""
+    return np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+
+
+def _iou_with(index, candidates, boxes, areas):
+    """计算第index个框与候选框之间的IoU"""
+    x1 = np.maximum(boxes[index, 0], boxes[candidates, 0])
+    y1 = np.maximum(boxes[index, 1], boxes[candidates, 1])
+    x2 = np.minimum(boxes[index, 2], boxes[candidates, 2])
+    y2 = np.minimum(boxes[index, 3], boxes[candidates, 3])
+    intersection = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+    union = areas[index] + areas[candidates] - intersection
+    return intersection / np.maximum(union, np.finfo(np.float32).eps)
+
+
+def nms(boxes, scores, iou_threshold, max_det=0):
+    """
+    贪心NMS
+
+    框按分数降序排列后按列连续存放，每轮用一次向量化计算得到当前框与其后所有框的IoU并标记抑制；
+    剩余部分中被抑制的框超过一半时压缩数组，减少后续的计算量
+
+    Args:
+        boxes: (N, 4) x1y1x2y2格式的边界框
+        scores: (N,) 置信度分数
+        iou_threshold: IoU阈值
+        max_det: 最多保留的框数量，0表示不限制
+
+    Returns:
+        保留的下标数组（按分数降序）
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    keep = []
+    order = np.argsort(-scores, kind='stable')
+    x1, y1, x2, y2 = boxes[order].T.copy()
+    areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+
+    while True:
+        count = order.size
+        suppressed = np.zeros(count, dtype=bool)
+        current = 0
+
+        while True:
+            keep.append(order[current])
+            following = current + 1
+            if (max_det and len(keep) >= max_det) or following >= count:
+                return np.array(keep, dtype=np.int64)
+
+            # 当前框与其后所有框的交集面积
+            inter = np.minimum(x2[current], x2[following:])
+            inter -= np.maximum(x1[current], x1[following:])
+            np.maximum(inter, 0, out=inter)
+            height = np.minimum(y2[current], y2[following:])
+            height -= np.maximum(y1[current], y1[following:])
+            np.maximum(height, 0, out=height)
+            inter *= height
+
+            # IoU > 阈值 等价于 交集 > 阈值 * 并集，避免除法
+            rest = suppressed[following:]
+            rest |= inter > iou_threshold * (areas[current] + areas[following:] - inter)
+
+            offset = np.argmin(rest)
+            if rest[offset]:
+                return np.array(keep, dtype=np.int64)
+            current = following + offset
+
+            if np.count_nonzero(rest) * 2 > rest.size:
+                break
+
+        # 压缩：只保留尚未处理且未被抑制的框
+        live = np.flatnonzero(~suppressed[current:]) + current
+        order = order[live]
+        x1, y1, x2, y2, areas = x1[live], y1[live], x2[live], y2[live], areas[live]
+
+
+def soft_nms(boxes, scores, iou_threshold, sigma=0.5, method='gaussian', score_threshold=0.001, max_det=0):
+    """
+    Soft-NMS，按与已保留框的IoU衰减其余框的分数，而不是直接剔除
+
+    Args:
+        boxes: (N, 4) x1y1x2y2格式的边界框
+        scores: (N,) 置信度分数
+        iou_threshold: linear方式下开始衰减的IoU阈值
+        sigma: gaussian方式的衰减系数
+        method: 'gaussian'或'linear'
+        score_threshold: 衰减后低于该分数的框被丢弃
+        max_det: 最多保留的框数量，0表示不限制
+
+    Returns:
+        (保留的下标数组, 对应的衰减后分数)
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    areas = _box_areas(boxes)
+    remaining = np.arange(len(boxes))
+    current_scores = scores.astype(np.float32)
+    keep = []
+    keep_scores = []
+
+    while remaining.size > 0:
+        best = np.argmax(current_scores)
+        index = remaining[best]
+        keep.append(index)
+        keep_scores.append(current_scores[best])
+        if max_det and len(keep) >= max_det:
+            break
+
+        remaining = np.delete(remaining, best)
+        current_scores = np.delete(current_scores, best)
+        if remaining.size == 0:
+            break
+
+        iou = _iou_with(index, remaining, boxes, areas)
+        if method == 'linear':
+            decay = np.where(iou > iou_threshold, 1 - iou, 1)
+        else:
+            decay = np.exp(-(iou * iou) / sigma)
+        current_scores = current_scores * decay
+
+        mask = current_scores >= score_threshold
+        remaining = remaining[mask]
+        current_scores = current_scores[mask]
+
+    return np.array(keep, dtype=np.int64), np.array(keep_scores, dtype=np.float32)
+
+
+def batched_nms(boxes, scores, class_ids, iou_threshold, score_threshold=0.001, nms_config=None):
+    """
+    按配置执行NMS
+
+    Args:
+        boxes: (N, 4) x1y1x2y2格式的边界框
+        scores: (N,) 置信度分数
+        class_ids: (N,) 类别ID
+        iou_threshold: IoU阈值
+        score_threshold: Soft-NMS衰减后的最低分数
+        nms_config: 规范化后的后处理配置，缺省项使用DEFAULT_NMS_CONFIG
+
+    Returns:
+        (保留的下标数组, 对应的分数)
+    """
+    config = dict(DEFAULT_NMS_CONFIG)
+    if nms_config:
+        config.update(nms_config)
+
+    # 预筛选分数最高的候选框，限制NMS的计算量
+    candidates = top_k_indices(scores, config['pre_nms_topk'])
+    candidate_boxes = boxes[candidates]
+    candidate_scores = scores[candidates]
+
+    if not config['class_agnostic']:
+        candidate_boxes = offset_boxes_by_class(candidate_boxes, class_ids[candidates])
+
+    if config['soft_nms']:
+        keep, kept_scores = soft_nms(candidate_boxes, candidate_scores, iou_threshold,
+                                     sigma=config['soft_nms_sigma'], method=config['soft_nms_method'],
+                                     score_threshold=score_threshold, max_det=config['max_det'])
+    else:
+        keep = nms(candidate_boxes, candidate_scores, iou_threshold, max_det=config['max_det'])
+        kept_scores = candidate_scores[keep]
+
+    return candidates[keep], kept_scores
@@ -1,25 +1,56 @@
 """
 后处理模块，负责处理模型输出、坐标转换、非极大值抑制等操作
 """
-import cv2
 import numpy as np
 import time
-from .logger import get_logger
+from .nms import validate_nms_config, batched_nms
+from .decoders import create_decoder
+from .logger import get_logger, SampledMetrics
+from .metrics import stage, STAGE_OUTPUT_DECODE, STAGE_NMS
 
 class YOLOPostprocessor:
     """YOLO后处理器类，处理模型输出"""
     
-    def __init__(self, conf_threshold=0.25, iou_threshold=0.45):
+    def __init__(self, conf_threshold=0.25, iou_threshold=0.45, nms_config=None,
+                 output_shape=None, metadata=None):
         """
         初始化后处理器
         
         Args:
             conf_threshold: 置信度阈值
             iou_threshold: IOU阈值
+            nms_config: 模型的后处理配置(config.json中models[].postprocess)，
+                        其中的conf_threshold和iou_threshold优先于全局阈值
+            output_shape: 模型输出形状，提供时在初始化时绑定解码器
+            metadata: 模型元数据(task、names、num_classes)
         """
-        self.conf_threshold = conf_threshold
-        self.iou_threshold = iou_threshold
+        self.nms_config = validate_nms_config(nms_config)
+        self.conf_threshold = self.nms_config.get('conf_threshold', conf_threshold)
+        self.iou_threshold = self.nms_config.get('iou_threshold', iou_threshold)
         self.logger = get_logger("YOLO", "info")
+        self.metrics = SampledMetrics(self.logger, "后处理")
+        
+        self.metadata = metadata or {}
+        self.decoder = None
+        if output_shape is not None:
+            self.bind_decoder(output_shape, self.metadata)
+    
+    def bind_decoder(self, output_shape, metadata=None):
+        """
+        根据输出形状和模型元数据选定解码器
+        
+        Args:
+            output_shape: 模型输出形状，可以包含动态维度
+            metadata: 模型元数据
+            
+        Returns:
+            解码器实例，无法确定时返回None（将在第一帧按实际形状绑定）
+        """
+        if metadata is not None:
+            self.metadata = metadata
+        self.decoder = create_decoder(output_shape, self.metadata, self.conf_threshold,
+                                      self.nms_config.get('decoder'))
+        return self.decoder
     
     def postprocess(self, model_output, preprocess_params, model_type='yolov8'):
         """
@@ -51,172 +82,37 @@ class YOLOPostprocessor:
         """
         try:
             # 记录处理开始时间
-            start_time = time.time()
-            
-            # 提取预处理参数
-            offset_x = preprocess_params['offset_x']
-            offset_y = preprocess_params['offset_y']
-            scale = preprocess_params['scale']
-            original_width = preprocess_params['original_width']
-            original_height = preprocess_params['original_height']
-            
-            # 检查输出形状，判断是哪种格式的YOLOv8输出
-            output_shape = output.shape
+            start_time = time.perf_counter()
             
-            # 打印出输出形状，用于调试
-            self.logger.info(f"YOLOv8输出形状: {output_shape}")
-            
-            # 处理不同格式的YOLOv8输出
-            if len(output_shape) == 3 and output_shape[1] <= 5:  # 新版本格式 [batch, 5, 8400] - YOLOv8检测
-                self.logger.info(f"检测到YOLOv8-Detect格式输出")
-                # 获取输出并转置 [batch, 5, 8400] -> [batch, 8400, 5]
-                output = np.transpose(output, (0, 2, 1))
-                
-                # 获取第一个批次的预测结果
-                predictions = output[0]  # [8400, 5]
-                
-                # 获取边界框坐标和置信度
-                boxes = predictions[:, 0:4]  # [8400, 4] - 边界框坐标
-                confidences = predictions[:, 4]  # [8400] - 置信度分数
-                
-                # 根据置信度阈值筛选检测结果
-                mask = confidences > self.conf_threshold
-                self.logger.info(f"检测到 {np.sum(mask)} 个目标(置信度 > {self.conf_threshold})")
-                
-                # 应用mask筛选
-                boxes = boxes[mask]  # 重要：这里要更新boxes变量，而不是创建新变量
-                scores = confidences[mask].astype(float)  # 确保是浮点数
-                
-                # 在这种情况下，所有检测对象都是同一类别(0)
-                class_ids = np.zeros(len(scores), dtype=np.int32)
-                
-                if len(scores) == 0:
-                    self.logger.info(f"没有检测到足够置信度的目标")
-                    return [], [], []
-                
-            elif len(output_shape) == 3:  # 新版本格式 [batch, 85, 8400] - YOLOv8分类
-                self.logger.info(f"检测到YOLOv8-Classify/Segment格式输出")
-                # 转置以获得传统格式 [batch, 8400, 85]
-                output = np.transpose(output, (0, 2, 1))
-                
-                # 获取第一个批次
-                predictions = output[0]  # [8400, 85]
-                
-                # 分离边界框和类别概率
-                num_classes = output_shape[1] - 4  # 减去4个边界框坐标
-                boxes = predictions[:, :4]  # 前4列是边界框坐标 (xywh)
-                
-                # 第5列是目标置信度，后续列是类别分数
-                object_conf = predictions[:, 4]
-                
-                # 根据目标置信度筛选
-                mask = object_conf > self.conf_threshold
-                boxes = boxes[mask]
-                filtered_conf = object_conf[mask]
-                
-                if len(filtered_conf) == 0:
-                    self.logger.info(f"没有检测到足够置信度的目标")
-                    return [], [], []
-                
-                # 提取类别分数(第6列及之后)，并与置信度相乘
-                class_scores = predictions[mask, 5:]
-                class_scores *= filtered_conf[:, np.newaxis]
-                
-                # 获取最高类别概率及其索引
-                best_class_scores = np.max(class_scores, axis=1)
-                best_class_ids = np.argmax(class_scores, axis=1)
-                
-                # 再次根据类别分数筛选
-                mask2 = best_class_scores > self.conf_threshold
-                boxes = boxes[mask2]
-                scores = best_class_scores[mask2].astype(float)  # 确保是浮点数
-                class_ids = best_class_ids[mask2]
-                
-                if len(scores) == 0:
-                    self.logger.info(f"没有检测到足够类别置信度的目标")
-                    return [], [], []
-                
-            else:  # 传统格式 [batch, num_detections, 4+1+num_classes]
-                self.logger.info(f"检测到传统YOLOv8格式输出")
-                # 提取置信度分数(第5列)
-                scores = output[:, 4]
-                
-                # 根据置信度阈值筛选检测结果
-                mask = scores >= self.conf_threshold
-                filtered_output = output[mask]
-                filtered_scores = scores[mask]
-                
-                if len(filtered_scores) == 0:
-                    self.logger.info(f"没有检测到足够置信度的目标")
-                    return [], [], []
-                
-                # 提取类别概率(第6列及之后)
-                class_probs = filtered_output[:, 5:]
-                
-                # 获取最高类别概率及其索引
-                class_ids = np.argmax(class_probs, axis=1)
-                class_scores = np.max(class_probs, axis=1)
-                
-                # 计算最终分数(置信度 * 类别概率)
-                scores = filtered_scores * class_scores
-                
-                # 再次根据综合分数筛选
-                mask2 = scores >= self.conf_threshold
-                boxes = filtered_output[mask2, :4]  # 更新boxes变量
-                scores = scores[mask2].astype(float)  # 确保是浮点数
-                class_ids = class_ids[mask2]
-                
-                if len(scores) == 0:
-                    self.logger.info(f"没有检测到足够类别置信度的目标")
-                    return [], [], []
-            
-            # 转换坐标(中心点xy,宽高wh -> 左上角xyxy)
-            boxes = self._xywh2xyxy(boxes)
-            
-            # 从模型输入尺寸缩放回原始图像尺寸
-            boxes = self._rescale_boxes(boxes, offset_x, offset_y, scale, original_width, original_height)
+            # 解码并按置信度筛选
+            with stage(STAGE_OUTPUT_DECODE):
+                decoder = self._get_decoder(output)
+                boxes, scores, class_ids = decoder.decode(output)
+                candidates = len(scores)
+                if candidates > 0:
+                    # 转换坐标(中心点xy,宽高wh -> 左上角xyxy)
+                    boxes = self._xywh2xyxy(boxes)
+                    
+                    # 从模型输入尺寸缩放回原始图像尺寸
+                    boxes = self._rescale_boxes(boxes, preprocess_params['offset_x'], preprocess_params['offset_y'],
+                                                preprocess_params['scale'], preprocess_params['original_width'],
+                                                preprocess_params['original_height'])
             
-            # 确保数据类型正确
-            boxes_list = boxes.tolist()
-            scores_list = scores.tolist()  # 确保是一维列表
+            if self.logger.is_enabled_for('debug'):
+                self.logger.debug(f"{decoder.name} 输出形状: {output.shape}, "
+                                  f"{candidates} 个候选目标(置信度 > {self.conf_threshold})")
             
-            self.logger.info(f"执行NMS: boxes类型: {type(boxes_list)}, scores类型: {type(scores_list)}")
-            self.logger.info(f"boxes长度: {len(boxes_list)}, scores长度: {len(scores_list)}")
+            final_boxes, final_scores, final_class_ids = [], [], []
+            if candidates > 0:
+                with stage(STAGE_NMS):
+                    final_boxes, final_scores, final_class_ids = self._apply_nms(boxes, scores, class_ids)
             
-            if len(boxes_list) > 0 and len(scores_list) > 0:
-                # 确保boxes和scores长度相同
-                if len(boxes_list) != len(scores_list):
-                    self.logger.warning(f"警告: boxes长度({len(boxes_list)})和scores长度({len(scores_list)})不一致，截断到较小长度")
-                    min_len = min(len(boxes_list), len(scores_list))
-                    boxes_list = boxes_list[:min_len]
-                    scores_list = scores_list[:min_len]
-                    boxes = boxes[:min_len]
-                    scores = scores[:min_len]
-                    class_ids = class_ids[:min_len]
-                
-                # 执行非极大值抑制(NMS)
-                indices = cv2.dnn.NMSBoxes(boxes_list, scores_list, self.conf_threshold, self.iou_threshold)
-                
-                if len(indices) > 0:
-                    # OpenCV 4.x返回的indices格式不同
-                    if isinstance(indices, tuple):
-                        final_boxes = boxes[indices]
-                        final_scores = scores[indices]
-                        final_class_ids = class_ids[indices]
-                    else:
-                        indices = indices.flatten()
-                        final_boxes = boxes[indices]
-                        final_scores = scores[indices]
-                        final_class_ids = class_ids[indices]
-                    
-                    process_time = time.time() - start_time
-                    self.logger.info(f"NMS后保留 {len(final_boxes)} 个目标 (处理耗时: {process_time*1000:.2f}ms)")
-                    return final_boxes, final_scores, final_class_ids
-                else:
-                    self.logger.info(f"NMS后没有保留的目标")
+            process_time = (time.perf_counter() - start_time) * 1000
+            self.metrics.record(candidates=candidates, detections=len(final_scores), time_ms=process_time)
+            if self.logger.is_enabled_for('debug'):
+                self.logger.debug(f"NMS后保留 {len(final_scores)} 个目标 (处理耗时: {process_time:.2f}ms)")
             
-            # 如果没有结果或NMS后没有留下的框
-            return [], [], []
+            return final_boxes, final_scores, final_class_ids
         
         except Exception as e:
             # 详细记录错误信息，便于调试
@@ -226,6 +122,84 @@ class YOLOPostprocessor:
             self.logger.error(traceback.format_exc())
             return [], [], []
     
+    def postprocess_batch(self, output, preprocess_params_list):
+        """
+        一个批次的后处理，解码和坐标还原对整个批次向量化执行，NMS逐张图像执行
+        
+        Args:
+            output: 批次维度为B的模型输出，B可以大于图像数量(固定批次模型的补齐行会被忽略)
+            preprocess_params_list: 每张图像的预处理参数
+            
+        Returns:
+            与图像一一对应的(边界框, 置信度分数, 类别ID)列表
+        """
+        count = len(preprocess_params_list)
+        start_time = time.perf_counter()
+        
+        decoder = self._get_decoder(output)
+        boxes, scores, class_ids, batch_index = decoder.decode_batch(output[:count])
+        candidates = len(scores)
+        
+        if candidates > 0:
+            boxes = self._xywh2xyxy(boxes)
+            
+            # 按所属图像取出各候选框的预处理参数，整体还原到原始图像坐标
+            def column(key):
+                values = np.array([params[key] for params in preprocess_params_list])
+                return values[batch_index][:, np.newaxis]
+            
+            boxes = self._rescale_boxes(boxes, column('offset_x'), column('offset_y'), column('scale'),
+                                        column('original_width'), column('original_height'))
+        
+        # 候选框按图像下标升序排列，每张图像对应连续的一段
+        bounds = np.searchsorted(batch_index, np.arange(count + 1))
+        results = []
+        detections = 0
+        for index in range(count):
+            start, end = bounds[index], bounds[index + 1]
+            if start == end:
+                results.append(([], [], []))
+                continue
+            result = self._apply_nms(boxes[start:end], scores[start:end], class_ids[start:end])
+            detections += len(result[1])
+            results.append(result)
+        
+        process_time = (time.perf_counter() - start_time) * 1000
+        self.metrics.record(candidates=candidates, detections=detections, time_ms=process_time)
+        if self.logger.is_enabled_for('debug'):
+            self.logger.debug(f"批次后处理: {count} 张图像, {candidates} 个候选目标, "
+                              f"保留 {detections} 个 (处理耗时: {process_time:.2f}ms)")
+        
+        return results
+    
+    def _get_decoder(self, output):
+        """
+        获取已绑定的解码器
+        
+        加载时输出形状含动态维度无法确定格式时，按第一帧的实际形状绑定一次
+        """
+        decoder = self.decoder
+        if decoder is None:
+            decoder = self.bind_decoder(output.shape)
+            if decoder is None:
+                raise ValueError(f"无法识别的模型输出形状: {output.shape}")
+            self.logger.info(f"按输出形状 {output.shape} 绑定解码器: {decoder.name}")
+        return decoder
+    
+    def _apply_nms(self, boxes, scores, class_ids):
+        """
+        对一张图像的候选框执行非极大值抑制(NMS)，直接在数组上完成，默认按类别抑制
+        
+        Returns:
+            保留的边界框、置信度分数和类别ID，没有保留时为空列表
+        """
+        keep, kept_scores = batched_nms(boxes, np.asarray(scores, dtype=np.float32),
+                                        np.asarray(class_ids), self.iou_threshold,
+                                        self.conf_threshold, self.nms_config)
+        if len(keep) == 0:
+            return [], [], []
+        return boxes[keep], kept_scores.astype(float), np.asarray(class_ids)[keep]
+    
     def _xywh2xyxy(self, boxes):
         """
         将中心点+宽高格式(xywh)转换为左上角+右下角格式(x1y1x2y2)
@@ -270,3 +244,20 @@ class YOLOPostprocessor:
         boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, original_height - 1)
         
         return boxes
+    
+    def map_boxes_to_canvas(self, boxes, preprocess_params):
+        """
+        将原始图像坐标的边界框映射到模型输入尺寸的画布坐标
+        
+        Args:
+            boxes: 原始图像坐标的边界框(x1y1x2y2)
+            preprocess_params: 预处理参数
+            
+        Returns:
+            画布坐标的边界框
+        """
+        boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+        boxes *= preprocess_params['scale']
+        boxes[:, [0, 2]] += preprocess_params['offset_x']
+        boxes[:, [1, 3]] += preprocess_params['offset_y']
+        return boxes
@@ -1,9 +1,18 @@
 """
 预处理模块，负责图像的归一化、调整大小等预处理操作
 """
+import threading
 import cv2
 import numpy as np
 
+from .metrics import stage, STAGE_LETTERBOX, STAGE_NORMALIZE
+
+# 归一化系数 [0-255] -> [0-1]
+_SCALE = np.float32(1.0 / 255.0)
+
+# 每个预处理器最多缓存的输入分辨率数量
+_MAX_CACHED_GEOMETRIES = 32
+
 class ImagePreprocessor:
     """图像预处理器类，处理输入图像使其符合模型要求"""
     
@@ -17,21 +26,29 @@ class ImagePreprocessor:
         """
         self.input_width = input_width
         self.input_height = input_height
+        
+        # 按输入分辨率缓存的缩放几何参数
+        self._geometry_cache = {}
+        # 每个线程独立的预分配输入张量
+        self._local = threading.local()
     
-    def resize_with_padding(self, image, target_width, target_height):
+    def get_letterbox_params(self, img_width, img_height, target_width=None, target_height=None):
         """
-        调整图像大小并添加填充，保持原始宽高比
+        计算保持宽高比缩放并居中填充时的几何参数
         
         Args:
-            image: 原始图像
-            target_width: 目标宽度
-            target_height: 目标高度
+            img_width: 原始图像宽度
+            img_height: 原始图像高度
+            target_width: 目标宽度，默认为模型输入宽度
+            target_height: 目标高度，默认为模型输入高度
             
         Returns:
-            调整大小后的图像和预处理参数
+            预处理参数字典(偏移量、缩放系数、原始尺寸和缩放后尺寸)
         """
-        # 保存原始图像尺寸
-        img_height, img_width = image.shape[:2]
+        if target_width is None:
+            target_width = self.input_width
+        if target_height is None:
+            target_height = self.input_height
         
         # 计算缩放比例
         scale_w = target_width / img_width
@@ -48,42 +65,73 @@ class ImagePreprocessor:
             # 按高度缩放
             scaled_width = int(img_width * scale_h)
             scaled_height = target_height
+        
+        return {
+            'offset_x': (target_width - scaled_width) // 2,
+            'offset_y': (target_height - scaled_height) // 2,
+            'scale': scale,
+            'original_width': img_width,
+            'original_height': img_height,
+            'scaled_width': scaled_width,
+            'scaled_height': scaled_height
+        }
+    
+    def resize_with_padding(self, image, target_width, target_height):
+        """
+        调整图像大小并添加填充，保持原始宽高比
+        
+        Args:
+            image: 原始图像
+            target_width: 目标宽度
+            target_height: 目标高度
             
-        # 缩放图像
-        image_resized = cv2.resize(image, (scaled_width, scaled_height))
+        Returns:
+            调整大小后的图像和预处理参数
+        """
+        # 保存原始图像尺寸
+        img_height, img_width = image.shape[:2]
+        preprocess_params = self.get_letterbox_params(img_width, img_height, target_width, target_height)
+        scaled_width = preprocess_params['scaled_width']
+        scaled_height = preprocess_params['scaled_height']
+        offset_x = preprocess_params['offset_x']
+        offset_y = preprocess_params['offset_y']
+        
+        # 缩放图像（尺寸一致时直接使用原图）
+        if (scaled_width, scaled_height) == (img_width, img_height):
+            image_resized = image
+        else:
+            image_resized = cv2.resize(image, (scaled_width, scaled_height))
         
         # 创建空白画布(输入尺寸)
         canvas = np.zeros((target_height, target_width, 3), dtype=np.uint8)
         
         # 将调整大小的图像粘贴到画布中央
-        offset_x = (target_width - scaled_width) // 2
-        offset_y = (target_height - scaled_height) // 2
         canvas[offset_y:offset_y+scaled_height, offset_x:offset_x+scaled_width] = image_resized
         
-        # 构建预处理参数
-        preprocess_params = {
-            'offset_x': offset_x,
-            'offset_y': offset_y,
-            'scale': scale,
-            'original_width': img_width,
-            'original_height': img_height
-        }
-        
         return canvas, preprocess_params
     
-    def preprocess(self, image):
+    def letterbox(self, image):
         """
-        图像预处理
+        将图像缩放并填充到模型输入尺寸
         
         Args:
             image: OpenCV格式的图像(BGR)
             
         Returns:
-            预处理后的图像，以及预处理参数(用于后续坐标转换)
+            模型输入尺寸的画布图像和预处理参数
         """
-        # 调整图像大小并添加填充
-        canvas, preprocess_params = self.resize_with_padding(image, self.input_width, self.input_height)
+        return self.resize_with_padding(image, self.input_width, self.input_height)
+    
+    def to_tensor(self, canvas):
+        """
+        将模型输入尺寸的画布图像转换为输入张量
         
+        Args:
+            canvas: 模型输入尺寸的图像(BGR)
+            
+        Returns:
+            形状为(1, 3, H, W)的float32张量
+        """
         # 归一化处理 [0-255] -> [0-1]
         input_img = canvas.astype(np.float32) / 255.0
         
@@ -94,4 +142,177 @@ class ImagePreprocessor:
         input_img = np.transpose(input_img, (2, 0, 1))
         input_img = np.expand_dims(input_img, 0)
         
-        return input_img, preprocess_params
+        return input_img
+    
+    def preprocess(self, image):
+        """
+        图像预处理
+        
+        Args:
+            image: OpenCV格式的图像(BGR)
+            
+        Returns:
+            预处理后的图像，以及预处理参数(用于后续坐标转换)
+        """
+        # 调整图像大小并添加填充
+        canvas, preprocess_params = self.letterbox(image)
+        
+        return self.to_tensor(canvas), preprocess_params
+    
+    def get_cached_letterbox_params(self, img_width, img_height):
+        """
+        获取缩放到模型输入尺寸的几何参数，按输入分辨率缓存
+        
+        返回的字典在多次调用间共享，调用方不得修改
+        
+        Args:
+            img_width: 原始图像宽度
+            img_height: 原始图像高度
+            
+        Returns:
+            预处理参数字典
+        """
+        key = (img_width, img_height)
+        params = self._geometry_cache.get(key)
+        if params is None:
+            if len(self._geometry_cache) >= _MAX_CACHED_GEOMETRIES:
+                self._geometry_cache.clear()
+            params = self.get_letterbox_params(img_width, img_height)
+            self._geometry_cache[key] = params
+        return params
+    
+    def _get_thread_buffer(self):
+        """获取当前线程的预分配输入张量(1, 3, H, W)"""
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = np.zeros((1, 3, self.input_height, self.input_width), dtype=np.float32)
+            self._local.buffer = buffer
+            self._local.geometry = None
+        return buffer
+    
+    def _fill_padding(self, out, params):
+        """将画布中图像区域以外的填充条带置零"""
+        offset_x, offset_y = params['offset_x'], params['offset_y']
+        bottom = offset_y + params['scaled_height']
+        right = offset_x + params['scaled_width']
+        out[:, :offset_y, :] = 0
+        out[:, bottom:, :] = 0
+        out[:, offset_y:bottom, :offset_x] = 0
+        out[:, offset_y:bottom, right:] = 0
+    
+    def prepare_into(self, image, out, fill_padding=True):
+        """
+        将图像缩放后直接写入预分配的输入张量，BGR->RGB、归一化和HWC->CHW在一次写入中完成
+        
+        Args:
+            image: OpenCV格式的图像(BGR)
+            out: 形状为(3, H, W)的float32连续数组
+            fill_padding: 是否填充画布中图像区域以外的条带；
+                          同一块缓冲区重复写入相同几何的图像时可以跳过
+            
+        Returns:
+            (预处理参数, 缩放后的uint8图像)
+        """
+        img_height, img_width = image.shape[:2]
+        params = self.get_cached_letterbox_params(img_width, img_height)
+        scaled_width = params['scaled_width']
+        scaled_height = params['scaled_height']
+        offset_x = params['offset_x']
+        offset_y = params['offset_y']
+        
+        # 缩放图像（尺寸一致时直接使用原图）
+        with stage(STAGE_LETTERBOX):
+            if (scaled_width, scaled_height) == (img_width, img_height):
+                resized = image
+            else:
+                resized = cv2.resize(image, (scaled_width, scaled_height))
+            
+            if fill_padding:
+                self._fill_padding(out, params)
+        
+        # 逐通道写入图像区域：输出通道c对应BGR中的第2-c个通道
+        with stage(STAGE_NORMALIZE):
+            region = out[:, offset_y:offset_y + scaled_height, offset_x:offset_x + scaled_width]
+            for channel in range(3):
+                np.multiply(resized[:, :, 2 - channel], _SCALE, out=region[channel], casting='unsafe')
+        
+        return params, resized
+    
+    def prepare(self, image):
+        """
+        使用当前线程的预分配缓冲区进行预处理
+        
+        返回的张量在同一线程下一次调用prepare之前有效，需要保留时请复制
+        
+        Args:
+            image: OpenCV格式的图像(BGR)
+            
+        Returns:
+            (形状为(1, 3, H, W)的连续输入张量, 预处理参数, 缩放后的uint8图像)
+        """
+        buffer = self._get_thread_buffer()
+        img_height, img_width = image.shape[:2]
+        
+        # 同一线程连续处理相同分辨率的图像时，填充条带保持不变
+        geometry = (img_width, img_height)
+        fill_padding = self._local.geometry != geometry
+        params, resized = self.prepare_into(image, buffer[0], fill_padding)
+        self._local.geometry = geometry
+        
+        return buffer, params, resized
+    
+    def prepare_batch(self, images, batch_size=None):
+        """
+        将多张图像写入当前线程的预分配批次张量
+        
+        返回的张量在同一线程下一次调用prepare_batch之前有效，需要保留时请复制
+        
+        Args:
+            images: OpenCV格式的图像(BGR)列表
+            batch_size: 张量的批次维度，大于图像数量时多出的部分为补齐行(内容不保证)，
+                        用于固定批次大小的模型；为None时等于图像数量
+        
+        Returns:
+            (形状为(B, 3, H, W)的连续输入张量, 预处理参数列表, 缩放后的uint8图像列表)
+        """
+        count = len(images)
+        rows = max(count, batch_size or 0)
+        
+        buffer = getattr(self._local, 'batch_buffer', None)
+        if buffer is None or len(buffer) < rows:
+            buffer = np.zeros((rows, 3, self.input_height, self.input_width), dtype=np.float32)
+            self._local.batch_buffer = buffer
+            self._local.batch_geometry = [None] * rows
+        geometries = self._local.batch_geometry
+        
+        params_list = []
+        resized_list = []
+        for index, image in enumerate(images):
+            img_height, img_width = image.shape[:2]
+            
+            # 每个批次位置单独记录几何信息，相同分辨率的图像重复写入时不再填充条带
+            geometry = (img_width, img_height)
+            params, resized = self.prepare_into(image, buffer[index], geometries[index] != geometry)
+            geometries[index] = geometry
+            
+            params_list.append(params)
+            resized_list.append(resized)
+        
+        return buffer[:rows], params_list, resized_list
+
+    def build_canvas(self, resized, params):
+        """
+        由缩放后的图像构建模型输入尺寸的画布(BGR)，用于在画布坐标系下绘制结果
+        
+        Args:
+            resized: prepare返回的缩放后图像
+            params: 预处理参数
+            
+        Returns:
+            模型输入尺寸的uint8画布
+        """
+        canvas = np.zeros((self.input_height, self.input_width, 3), dtype=np.uint8)
+        offset_x, offset_y = params['offset_x'], params['offset_y']
+        canvas[offset_y:offset_y + params['scaled_height'],
+               offset_x:offset_x + params['scaled_width']] = resized
+        return canvas
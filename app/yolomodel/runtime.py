@@ -0,0 +1,224 @@
+"""
+运行时配置模块，负责把模型的runtime配置映射为ONNX Runtime的SessionOptions和执行提供者
+"""
+import onnxruntime as ort
+
+# 图优化级别映射
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+}
+
+# 执行模式映射
+EXECUTION_MODES = {
+    'sequential': ort.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': ort.ExecutionMode.ORT_PARALLEL
+}
+
+# 支持的runtime配置项及其类型
+_INT_KEYS = ('intra_op_num_threads', 'inter_op_num_threads')
+_BOOL_KEYS = ('enable_mem_pattern', 'enable_cpu_mem_arena', 'enable_mem_reuse', 'use_deterministic_compute')
+_KNOWN_KEYS = set(_INT_KEYS) | set(_BOOL_KEYS) | {
+    'graph_optimization_level', 'execution_mode', 'intra_op_cores',
+    'providers', 'provider_options', 'session_config_entries'
+}
+
+
+def validate_runtime_config(runtime_config):
+    """
+    校验并规范化模型的runtime配置
+
+    Args:
+        runtime_config: config.json中models[].runtime字段，可以为None
+
+    Returns:
+        规范化后的配置字典（只包含用户显式设置的项）
+
+    Raises:
+        ValueError: 配置项名称、类型或取值无效
+    """
+    if runtime_config is None:
+        return {}
+    if not isinstance(runtime_config, dict):
+        raise ValueError("runtime配置必须是对象")
+
+    unknown = set(runtime_config) - _KNOWN_KEYS
+    if unknown:
+        raise ValueError(f"未知的runtime配置项: {', '.join(sorted(unknown))}")
+
+    normalized = {}
+
+    for key in _INT_KEYS:
+        if key in runtime_config:
+            value = runtime_config[key]
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ValueError(f"{key} 必须是非负整数")
+            normalized[key] = value
+
+    for key in _BOOL_KEYS:
+        if key in runtime_config:
+            value = runtime_config[key]
+            if not isinstance(value, bool):
+                raise ValueError(f"{key} 必须是布尔值")
+            normalized[key] = value
+
+    if 'graph_optimization_level' in runtime_config:
+        level = str(runtime_config['graph_optimization_level']).lower()
+        if level not in GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"graph_optimization_level 必须是 {', '.join(GRAPH_OPTIMIZATION_LEVELS)} 之一")
+        normalized['graph_optimization_level'] = level
+
+    if 'execution_mode' in runtime_config:
+        mode = str(runtime_config['execution_mode']).lower()
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"execution_mode 必须是 {', '.join(EXECUTION_MODES)} 之一")
+        normalized['execution_mode'] = mode
+
+    if 'intra_op_cores' in runtime_config:
+        cores = runtime_config['intra_op_cores']
+        if not isinstance(cores, list) or not cores or \
+                not all(isinstance(c, int) and not isinstance(c, bool) and c >= 0 for c in cores):
+            raise ValueError("intra_op_cores 必须是非空的CPU核心编号列表")
+        # 调用线程本身也参与intra-op计算，线程池只需要 len(cores) - 1 个线程
+        threads = normalized.get('intra_op_num_threads')
+        if threads is None:
+            normalized['intra_op_num_threads'] = len(cores)
+        elif threads != len(cores):
+            raise ValueError("intra_op_cores 的数量必须与 intra_op_num_threads 一致")
+        normalized['intra_op_cores'] = list(cores)
+
+    if 'providers' in runtime_config:
+        providers = runtime_config['providers']
+        if not isinstance(providers, list) or not providers or \
+                not all(isinstance(p, str) for p in providers):
+            raise ValueError("providers 必须是非空的执行提供者名称列表")
+        available = ort.get_available_providers()
+        missing = [p for p in providers if p not in available]
+        if missing:
+            raise ValueError(f"当前环境不支持的执行提供者: {', '.join(missing)}，可用: {', '.join(available)}")
+        normalized['providers'] = list(providers)
+
+    if 'provider_options' in runtime_config:
+        provider_options = runtime_config['provider_options']
+        if not isinstance(provider_options, dict) or \
+                not all(isinstance(v, dict) for v in provider_options.values()):
+            raise ValueError("provider_options 必须是 {提供者名称: {选项: 值}} 格式的对象")
+        providers = normalized.get('providers', ['CPUExecutionProvider'])
+        extra = [p for p in provider_options if p not in providers]
+        if extra:
+            raise ValueError(f"provider_options 中的提供者未在providers中启用: {', '.join(extra)}")
+        normalized['provider_options'] = {
+            name: {str(k): str(v) for k, v in options.items()}
+            for name, options in provider_options.items()
+        }
+
+    if 'session_config_entries' in runtime_config:
+        entries = runtime_config['session_config_entries']
+        if not isinstance(entries, dict):
+            raise ValueError("session_config_entries 必须是对象")
+        normalized['session_config_entries'] = {str(k): str(v) for k, v in entries.items()}
+
+    return normalized
+
+
+def build_session_options(runtime_config=None):
+    """
+    根据runtime配置构建SessionOptions和执行提供者列表
+
+    Args:
+        runtime_config: 模型的runtime配置
+
+    Returns:
+        (SessionOptions, 执行提供者列表, 执行提供者选项列表)
+    """
+    runtime_config = validate_runtime_config(runtime_config)
+    options = ort.SessionOptions()
+
+    for key in _INT_KEYS + _BOOL_KEYS:
+        if key in runtime_config:
+            setattr(options, key, runtime_config[key])
+
+    if 'graph_optimization_level' in runtime_config:
+        options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[runtime_config['graph_optimization_level']]
+
+    if 'execution_mode' in runtime_config:
+        options.execution_mode = EXECUTION_MODES[runtime_config['execution_mode']]
+
+    if 'intra_op_cores' in runtime_config:
+        # ONNX Runtime的逻辑处理器编号从1开始，每个线程池线程用分号分隔
+        pool_cores = runtime_config['intra_op_cores'][1:]
+        if pool_cores:
+            affinities = ';'.join(str(core + 1) for core in pool_cores)
+            options.add_session_config_entry('session.intra_op.thread_affinities', affinities)
+
+    for key, value in runtime_config.get('session_config_entries', {}).items():
+        options.add_session_config_entry(key, value)
+
+    providers = runtime_config.get('providers', ['CPUExecutionProvider'])
+    provider_options_map = runtime_config.get('provider_options', {})
+    provider_options = [provider_options_map.get(p, {}) for p in providers]
+
+    return options, providers, provider_options
+
+
+def create_session(model_path, runtime_config=None):
+    """
+    按runtime配置创建ONNX Runtime推理会话
+
+    Args:
+        model_path: ONNX模型文件路径
+        runtime_config: 模型的runtime配置
+
+    Returns:
+        ort.InferenceSession实例
+    """
+    options, providers, provider_options = build_session_options(runtime_config)
+    return ort.InferenceSession(model_path, sess_options=options,
+                                providers=providers, provider_options=provider_options)
+
+
+def describe_session(session, runtime_config=None, optimized_offline=False):
+    """
+    获取推理会话当前生效的运行时设置
+
+    Args:
+        session: ort.InferenceSession实例
+        runtime_config: 创建会话使用的runtime配置
+        optimized_offline: 会话是否加载的是缓存中已优化的模型。这种会话以disable级别运行以跳过重复优化，
+                           图优化级别报告生成缓存时使用的级别
+
+    Returns:
+        当前会话设置的字典
+    """
+    options = session.get_session_options()
+    level_names = {v: k for k, v in GRAPH_OPTIMIZATION_LEVELS.items()}
+    mode_names = {v: k for k, v in EXECUTION_MODES.items()}
+
+    optimization_level = options.graph_optimization_level
+    if optimized_offline:
+        optimization_level = build_session_options(runtime_config)[0].graph_optimization_level
+
+    return {
+        'intra_op_num_threads': options.intra_op_num_threads,
+        'inter_op_num_threads': options.inter_op_num_threads,
+        'graph_optimization_level': level_names.get(optimization_level, str(optimization_level)),
+        'optimized_offline': optimized_offline,
+        'execution_mode': mode_names.get(options.execution_mode, str(options.execution_mode)),
+        'enable_mem_pattern': options.enable_mem_pattern,
+        'enable_cpu_mem_arena': options.enable_cpu_mem_arena,
+        'enable_mem_reuse': options.enable_mem_reuse,
+        'use_deterministic_compute': options.use_deterministic_compute,
+        'intra_op_thread_affinities': _get_session_config_entry(options, 'session.intra_op.thread_affinities'),
+        'providers': session.get_providers(),
+        'provider_options': session.get_provider_options()
+    }
+
+
+def _get_session_config_entry(options, key):
+    """读取SessionOptions中的配置项，未设置时返回None"""
+    try:
+        return options.get_session_config_entry(key)
+    except Exception:
+        return None
@@ -4,19 +4,50 @@
 import cv2
 import numpy as np
 
+# 标签字体参数
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_SCALE = 0.5
+LABEL_THICKNESS = 1
+
+def class_color(class_id):
+    """
+    类别的伪随机但确定的颜色（以类别ID为种子，使用独立的随机数生成器，不影响全局np.random状态）
+    
+    Args:
+        class_id: 类别ID
+        
+    Returns:
+        BGR颜色数组
+    """
+    return np.random.RandomState(class_id).randint(0, 255, size=3)
+
 class DetectionVisualizer:
     """检测结果可视化器类"""
     
-    def __init__(self, class_names=None):
+    def __init__(self, class_names=None, enabled=True, min_label_size=0):
         """
         初始化可视化器
         
+        模型加载时为所有类别预先计算调色板和标签文本尺寸，绘制时不再逐框生成颜色和测量文本
+        
         Args:
             class_names: 类别名称列表
+            enabled: 是否绘制检测结果，为False时只返回结构化的检测结果（不渲染模式）
+            min_label_size: 检测框宽或高小于该像素数时只绘制边框，不绘制标签
         """
         self.class_names = class_names or []
+        self.enabled = enabled
+        self.min_label_size = min_label_size
+        
+        # (类别数, 3) BGR调色板
+        self.palette = np.array([class_color(i) for i in range(len(self.class_names))],
+                                dtype=np.uint8).reshape(-1, 3)
+        # 类别ID -> (颜色元组, 标签前缀, 文本宽度, 文本高度)；模型类别以外的ID在首次绘制时加入
+        self._styles = {}
+        for class_id in range(len(self.class_names)):
+            self._styles[class_id] = self._build_style(class_id, tuple(map(int, self.palette[class_id])))
     
-    def draw_detections(self, image, boxes, scores, class_ids):
+    def draw_detections(self, image, boxes, scores, class_ids, copy=True):
         """
         在图像上绘制检测结果
         
@@ -25,37 +56,40 @@ class DetectionVisualizer:
             boxes: 检测到的边界框
             scores: 置信度分数
             class_ids: 类别ID
+            copy: 是否在副本上绘制；为False时直接在传入的图像上绘制（如新建的画布）
             
         Returns:
             标注了检测结果的图像
         """
-        result = image.copy()
+        result = image.copy() if copy else image
+        if len(boxes) == 0:
+            return result
         
-        for i, box in enumerate(boxes):
-            # 提取坐标和置信度
-            x1, y1, x2, y2 = map(int, box)
-            score = scores[i]
-            class_id = class_ids[i]
-            class_name = self.get_class_name(class_id)
-            
-            # 生成不同类别的颜色
-            color = self.generate_color(class_id)
+        # 坐标一次转换为整数（与逐个int()一样向零取整）
+        boxes = np.asarray(boxes).astype(np.int64).tolist()
+        scores = np.asarray(scores, dtype=np.float64).tolist()
+        class_ids = np.asarray(class_ids).astype(np.int64).tolist()
+        styles = self._styles
+        min_label_size = self.min_label_size
+        
+        for (x1, y1, x2, y2), score, class_id in zip(boxes, scores, class_ids):
+            style = styles.get(class_id)
+            if style is None:
+                style = self._get_style(class_id)
+            color, prefix, text_width, text_height = style
             
             # 绘制边界框
             cv2.rectangle(result, (x1, y1), (x2, y2), color, 2)
             
-            # 准备标签文本
-            label = f"{class_name}: {score:.2f}"
-            
-            # 获取文本大小
-            (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+            # 小目标只绘制边框，避免标签遮挡
+            if x2 - x1 < min_label_size or y2 - y1 < min_label_size:
+                continue
             
-            # 绘制标签背景
+            # 绘制标签背景和标签文本
             cv2.rectangle(result, (x1, y1 - text_height - 5), (x1 + text_width, y1), color, -1)
-            
-            # 绘制标签文本
-            cv2.putText(result, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            
+            cv2.putText(result, f"{prefix}{score:.2f}", (x1, y1 - 5), LABEL_FONT, LABEL_SCALE,
+                        (255, 255, 255), LABEL_THICKNESS)
+        
         return result
     
     def get_class_name(self, class_id):
@@ -74,7 +108,7 @@ class DetectionVisualizer:
     
     def generate_color(self, class_id):
         """
-        为类别生成唯一的颜色
+        获取类别的颜色
         
         Args:
             class_id: 类别ID
@@ -82,8 +116,22 @@ class DetectionVisualizer:
         Returns:
             BGR格式的颜色元组
         """
-        # 生成伪随机但确定的颜色
-        np.random.seed(class_id)
-        color = tuple(map(int, np.random.randint(0, 255, size=3)))
-        np.random.seed(None)  # 重置随机数生成器
-        return color
+        return self._get_style(int(class_id))[0]
+    
+    def _get_style(self, class_id):
+        """获取类别的绘制样式，模型类别以外的ID首次使用时计算并缓存"""
+        style = self._styles.get(class_id)
+        if style is None:
+            style = self._build_style(class_id, tuple(map(int, class_color(class_id))))
+            self._styles[class_id] = style
+        return style
+    
+    def _build_style(self, class_id, color):
+        """
+        计算类别的标签前缀和文本尺寸
+        
+        置信度总是格式化为"d.dd"，Hershey字体的数字等宽，所以同一类别所有标签的尺寸相同
+        """
+        prefix = f"{self.get_class_name(class_id)}: "
+        (text_width, text_height), _ = cv2.getTextSize(f"{prefix}0.00", LABEL_FONT, LABEL_SCALE, LABEL_THICKNESS)
+        return color, prefix, text_width, text_height
@@ -0,0 +1,194 @@
+"""
+生成合成的YOLOv8检测模型，用于验证输出解码和测量解码耗时
+
+模型忽略输入，始终输出一个固定的 [1, 4+C, N] 张量：背景候选框的类别分数较低，
+另外按网格放置若干已知的目标（包含类别0），元数据与Ultralytics导出的格式一致。
+需要安装onnx包（仅生成模型时需要，应用运行时不依赖）。
+
+用法: python -m benchmarks.make_synthetic_model [--output synthetic.onnx] [--classes 80] [--verify]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 背景候选框类别分数的上限，低于默认置信度阈值
+BACKGROUND_SCORE = 0.1
+
+
+def plan_detections(num_classes, input_size, count=8):
+    """
+    在输入画布上按网格放置互不重叠的目标，类别从0开始依次分配
+
+    Returns:
+        目标列表，每项为 (cx, cy, w, h, class_id, score)
+    """
+    columns = 4
+    cell = input_size / columns
+    detections = []
+    for i in range(count):
+        cx = cell * (i % columns + 0.5)
+        cy = cell * (i // columns + 0.5)
+        class_id = i % num_classes
+        score = 0.9 - 0.05 * (i % 5)
+        detections.append((cx, cy, cell * 0.5, cell * 0.4, class_id, score))
+    return detections
+
+
+def build_output(num_classes, num_anchors, input_size, detections, seed=0):
+    """
+    构造模型输出张量
+
+    Args:
+        num_classes: 类别数量
+        num_anchors: 候选框数量
+        input_size: 模型输入尺寸
+        detections: plan_detections返回的目标列表
+        seed: 随机种子
+
+    Returns:
+        形状为 (1, 4+C, N) 的float32数组
+    """
+    rng = np.random.default_rng(seed)
+    output = np.empty((1, 4 + num_classes, num_anchors), dtype=np.float32)
+    output[0, 0:2] = rng.uniform(0, input_size, (2, num_anchors))
+    output[0, 2:4] = rng.uniform(4, 32, (2, num_anchors))
+    output[0, 4:] = rng.uniform(0, BACKGROUND_SCORE, (num_classes, num_anchors))
+
+    anchors = rng.choice(num_anchors, len(detections), replace=False)
+    for anchor, (cx, cy, w, h, class_id, score) in zip(anchors, detections):
+        output[0, :4, anchor] = (cx, cy, w, h)
+        output[0, 4 + class_id, anchor] = score
+    return output
+
+
+def make_model(path, num_classes=80, num_anchors=8400, input_size=640, seed=0):
+    """
+    生成合成模型文件
+
+    Args:
+        path: 输出的ONNX文件路径
+        num_classes: 类别数量
+        num_anchors: 候选框数量
+        input_size: 模型输入尺寸
+        seed: 随机种子
+
+    Returns:
+        放置的目标列表，每项为 (cx, cy, w, h, class_id, score)
+    """
+    import onnx
+    from onnx import helper, numpy_helper, TensorProto
+
+    detections = plan_detections(num_classes, input_size)
+    output = build_output(num_classes, num_anchors, input_size, detections, seed)
+
+    # 输出 = 常量 + 0 * mean(输入)，保证输出依赖输入且批次维度可变
+    initializers = [
+        numpy_helper.from_array(output, 'constant_output'),
+        numpy_helper.from_array(np.array(0, dtype=np.float32), 'zero'),
+        numpy_helper.from_array(np.array([1, 2, 3], dtype=np.int64), 'axes'),
+        numpy_helper.from_array(np.array([-1, 1, 1], dtype=np.int64), 'batch_shape')
+    ]
+    nodes = [
+        helper.make_node('ReduceMean', ['images', 'axes'], ['mean'], keepdims=1),
+        helper.make_node('Reshape', ['mean', 'batch_shape'], ['mean_3d']),
+        helper.make_node('Mul', ['mean_3d', 'zero'], ['zeros']),
+        helper.make_node('Add', ['zeros', 'constant_output'], ['output0'])
+    ]
+    inputs = [helper.make_tensor_value_info('images', TensorProto.FLOAT, ['batch', 3, input_size, input_size])]
+    outputs = [helper.make_tensor_value_info('output0', TensorProto.FLOAT, ['batch', 4 + num_classes, num_anchors])]
+
+    graph = helper.make_graph(nodes, 'synthetic_yolov8', inputs, outputs, initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 18)])
+    model.ir_version = 8
+
+    # Ultralytics导出的names为Python字典字符串
+    names = {i: f'class{i}' for i in range(num_classes)}
+    model.metadata_props.add(key='names', value=str(names))
+    model.metadata_props.add(key='task', value='detect')
+
+    onnx.save(model, path)
+    return detections
+
+
+def transposed_decode(output, conf_threshold):
+    """对照实现：先把输出转置为 [N, 4+C] 再按行求最高类别分数"""
+    predictions = np.transpose(output, (0, 2, 1))[0]
+    class_scores = predictions[:, 4:]
+    best_class_scores = np.max(class_scores, axis=1)
+    best_class_ids = np.argmax(class_scores, axis=1)
+    mask = best_class_scores > conf_threshold
+    return predictions[mask, :4], best_class_scores[mask], best_class_ids[mask]
+
+
+def verify(path, detections, input_size, iterations):
+    """
+    用YOLODetector加载合成模型，检查放置的目标全部被正确检出，并对比解码耗时
+
+    Returns:
+        是否通过
+    """
+    from app.yolomodel.detector import YOLODetector
+
+    detector = YOLODetector(path)
+    decoder = detector.postprocessor.decoder
+    print(f"解码器: {decoder.name}, 类别数量: {len(detector.classes)}")
+
+    # 输入与模型尺寸相同时原始坐标即模型坐标
+    image = np.zeros((input_size, input_size, 3), dtype=np.uint8)
+    boxes, scores, class_ids, _ = detector.detect(image, render=False)
+
+    passed = len(scores) == len(detections)
+    for cx, cy, w, h, class_id, score in detections:
+        expected = np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+        found = [i for i in range(len(scores))
+                 if class_ids[i] == class_id and np.allclose(boxes[i], expected, atol=1e-3)
+                 and abs(scores[i] - score) < 1e-5]
+        if not found:
+            print(f"未检出: 类别 {class_id}, 分数 {score:.2f}, 边界框 {expected.round(1).tolist()}")
+            passed = False
+    print(f"检出 {len(scores)} 个目标，期望 {len(detections)} 个: {'通过' if passed else '失败'}")
+
+    output = detector.session.run(detector.output_names, {detector.input_name: detector.preprocessor.prepare(image)[0]})[0]
+    original = output.copy()
+    for name, func in [('转置后解码', lambda: transposed_decode(output, detector.conf_threshold)),
+                       (decoder.name, lambda: decoder.decode(output))]:
+        func()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        print(f"{name:<16}{(time.perf_counter() - start) * 1000 / iterations:>10.3f} ms")
+
+    if not np.array_equal(output, original):
+        print("解码修改了模型输出")
+        passed = False
+    return passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成合成的YOLOv8检测模型')
+    parser.add_argument('--output', default='synthetic_yolov8.onnx', help='输出的ONNX文件路径')
+    parser.add_argument('--classes', type=int, default=80, help='类别数量')
+    parser.add_argument('--anchors', type=int, default=8400, help='候选框数量')
+    parser.add_argument('--size', type=int, default=640, help='模型输入尺寸')
+    parser.add_argument('--verify', action='store_true', help='生成后用检测器验证解码结果')
+    parser.add_argument('--iterations', type=int, default=200, help='解码耗时测试的迭代次数')
+    args = parser.parse_args(argv)
+
+    try:
+        detections = make_model(args.output, args.classes, args.anchors, args.size)
+    except ImportError:
+        print("生成模型需要onnx包: pip install onnx")
+        return 1
+    print(f"已生成 {args.output}: {args.classes} 个类别, {args.anchors} 个候选框, {len(detections)} 个目标")
+
+    if args.verify and not verify(args.output, detections, args.size, args.iterations):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+NMS性能基准测试
+对比原有的列表转换 + cv2.dnn.NMSBoxes路径与NumPy向量化NMS
+
+用法: python -m benchmarks.nms_bench [--iterations 200]
+"""
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.yolomodel.nms import batched_nms
+
+# 候选框数量
+CANDIDATE_COUNTS = [10, 1000, 8000]
+
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.45
+
+
+def make_candidates(count, num_classes=3, image_size=640, seed=0):
+    """
+    生成聚集在若干目标周围的候选框，模拟模型输出经置信度筛选后的分布
+
+    Returns:
+        (x1y1x2y2边界框, 分数, 类别ID)
+    """
+    rng = np.random.default_rng(seed)
+    num_objects = max(1, count // 50)
+    centers = rng.uniform(50, image_size - 50, (num_objects, 2))
+    sizes = rng.uniform(20, 120, (num_objects, 2))
+
+    owner = rng.integers(0, num_objects, count)
+    jitter = rng.normal(0, 4, (count, 4))
+    cx = centers[owner, 0] + jitter[:, 0]
+    cy = centers[owner, 1] + jitter[:, 1]
+    w = sizes[owner, 0] + jitter[:, 2]
+    h = sizes[owner, 1] + jitter[:, 3]
+
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1).astype(np.float32)
+    scores = rng.uniform(CONF_THRESHOLD, 1.0, count).astype(np.float32)
+    class_ids = (owner % num_classes).astype(np.int64)
+    return boxes, scores, class_ids
+
+
+def legacy_nms(boxes, scores, class_ids):
+    """原有路径：转换为Python列表后调用cv2.dnn.NMSBoxes（原代码直接传入x1y1x2y2格式）"""
+    boxes_list = boxes.tolist()
+    scores_list = scores.astype(float).tolist()
+    indices = cv2.dnn.NMSBoxes(boxes_list, scores_list, CONF_THRESHOLD, IOU_THRESHOLD)
+    return np.array(indices).flatten()
+
+
+def opencv_xywh_nms(boxes, scores, class_ids):
+    """参考实现：按cv2.dnn.NMSBoxes要求传入x,y,w,h格式，保留数量可与向量化NMS直接对比"""
+    xywh = np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1)
+    indices = cv2.dnn.NMSBoxes(xywh.tolist(), scores.astype(float).tolist(), CONF_THRESHOLD, IOU_THRESHOLD)
+    return np.array(indices).flatten()
+
+
+def make_vectorized_nms(nms_config):
+    """返回使用指定配置的向量化NMS函数"""
+    def run(boxes, scores, class_ids):
+        keep, _ = batched_nms(boxes, scores, class_ids, IOU_THRESHOLD, CONF_THRESHOLD, nms_config)
+        return keep
+    return run
+
+
+def measure(func, args, iterations):
+    """
+    测量单次调用的平均耗时
+
+    Returns:
+        (平均耗时ms, 保留的框数量)
+    """
+    kept = len(func(*args))
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(*args)
+    return (time.perf_counter() - start) * 1000 / iterations, kept
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='NMS性能基准测试')
+    parser.add_argument('--iterations', type=int, default=200, help='每项测试的迭代次数')
+    args = parser.parse_args(argv)
+
+    variants = [
+        ('cv2.dnn.NMSBoxes', legacy_nms),
+        ('cv2(xywh)', opencv_xywh_nms),
+        ('numpy', make_vectorized_nms({'class_agnostic': True, 'pre_nms_topk': 0, 'max_det': 0})),
+        ('numpy+按类别', make_vectorized_nms({'pre_nms_topk': 0, 'max_det': 0})),
+        ('numpy+top-k', make_vectorized_nms({})),
+        ('soft-nms+top-k', make_vectorized_nms({'soft_nms': True}))
+    ]
+
+    print(f"迭代次数: {args.iterations}")
+    print(f"{'候选框':<8}{'实现':<20}{'耗时(ms)':>10}{'保留':>8}")
+    for count in CANDIDATE_COUNTS:
+        candidates = make_candidates(count)
+        for name, func in variants:
+            elapsed, kept = measure(func, candidates, args.iterations)
+            print(f"{count:<8}{name:<20}{elapsed:>10.3f}{kept:>8}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+检测结果绘制性能基准测试
+对比原有的逐框生成颜色(重置全局随机种子) + 测量文本的绘制路径与预先计算调色板和文本尺寸的可视化器
+
+用法: python -m benchmarks.render_bench [--boxes 500] [--iterations 20]
+"""
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.yolomodel.visualizer import DetectionVisualizer
+
+# 4K帧
+FRAME_WIDTH = 3840
+FRAME_HEIGHT = 2160
+
+# 类别数量(与COCO相同)
+NUM_CLASSES = 80
+
+
+def legacy_draw(image, boxes, scores, class_ids, class_names):
+    """原有路径：每个框重置全局随机种子生成颜色、格式化标签并测量文本尺寸"""
+    result = image.copy()
+    for i, box in enumerate(boxes):
+        x1, y1, x2, y2 = map(int, box)
+        class_id = class_ids[i]
+        class_name = class_names[class_id]
+
+        np.random.seed(class_id)
+        color = tuple(map(int, np.random.randint(0, 255, size=3)))
+        np.random.seed(None)
+
+        cv2.rectangle(result, (x1, y1), (x2, y2), color, 2)
+        label = f"{class_name}: {scores[i]:.2f}"
+        (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        cv2.rectangle(result, (x1, y1 - text_height - 5), (x1 + text_width, y1), color, -1)
+        cv2.putText(result, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    return result
+
+
+def make_detections(count, seed=0):
+    """
+    生成4K帧上大小不一的检测框（约一半小于64像素）
+
+    Returns:
+        (x1y1x2y2边界框, 分数, 类别ID)
+    """
+    rng = np.random.default_rng(seed)
+    sizes = rng.uniform(16, 400, (count, 2)).astype(np.float32)
+    x1 = rng.uniform(0, FRAME_WIDTH - sizes[:, 0])
+    y1 = rng.uniform(20, FRAME_HEIGHT - sizes[:, 1])
+    boxes = np.stack([x1, y1, x1 + sizes[:, 0], y1 + sizes[:, 1]], axis=1).astype(np.float32)
+    scores = rng.uniform(0.25, 1.0, count).astype(np.float32)
+    class_ids = rng.integers(0, NUM_CLASSES, count)
+    return boxes, scores, class_ids
+
+
+def measure(func, iterations):
+    """
+    测量单次调用的平均耗时
+
+    Returns:
+        (平均耗时ms, p95耗时ms)
+    """
+    func()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings = np.array(timings)
+    return timings.mean(), np.percentile(timings, 95)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='检测结果绘制性能基准测试')
+    parser.add_argument('--boxes', type=int, default=500, help='检测框数量')
+    parser.add_argument('--iterations', type=int, default=20, help='每项测试的迭代次数')
+    parser.add_argument('--min-label-size', type=int, default=64, help='小于该尺寸的检测框不绘制标签')
+    args = parser.parse_args(argv)
+
+    class_names = [f"class{i}" for i in range(NUM_CLASSES)]
+    image = np.random.default_rng(1).integers(0, 256, (FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+    boxes, scores, class_ids = make_detections(args.boxes)
+
+    visualizer = DetectionVisualizer(class_names)
+    small_label_visualizer = DetectionVisualizer(class_names, min_label_size=args.min_label_size)
+
+    # 绘制结果必须与原有路径逐像素一致，且不改变全局随机数状态
+    expected = legacy_draw(image, boxes, scores, class_ids, class_names)
+    state = np.random.get_state()[1].copy()
+    actual = visualizer.draw_detections(image, boxes, scores, class_ids)
+    if not np.array_equal(expected, actual):
+        raise AssertionError("绘制结果不一致")
+    if not np.array_equal(state, np.random.get_state()[1]):
+        raise AssertionError("可视化器改变了全局随机数状态")
+
+    cases = [
+        ('原有', lambda: legacy_draw(image, boxes, scores, class_ids, class_names)),
+        ('预计算', lambda: visualizer.draw_detections(image, boxes, scores, class_ids)),
+        (f'小框无标签(<{args.min_label_size}px)',
+         lambda: small_label_visualizer.draw_detections(image, boxes, scores, class_ids)),
+        ('仅复制图像', lambda: image.copy())
+    ]
+
+    print(f"图像: {FRAME_WIDTH}x{FRAME_HEIGHT}, 检测框: {args.boxes}, 迭代次数: {args.iterations}")
+    print(f"{'路径':<24}{'平均(ms)':>12}{'p95':>10}")
+    for name, func in cases:
+        mean, p95 = measure(func, args.iterations)
+        print(f"{name:<24}{mean:>12.3f}{p95:>10.3f}")
+    print("不渲染模式(model.render.enabled为false)下不复制也不绘制图像，耗时为0")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,12 @@ const detectionState = {
     currentModelInfo: null
 };
 
+// 二进制帧协议版本
+const FRAME_PROTOCOL_VERSION = 1;
+
+// 各模型的类别名称（随该模型的第一条二进制结果发送一次）
+const modelClasses = {};
+
 /**
  * 初始化Socket.IO连接
  */
@@ -71,6 +77,43 @@ function initSocketConnection() {
         }
     });
     
+    // 二进制检测结果事件，解包后按JSON结果的格式分发
+    socket.on('detection_packed', (data) => {
+        const results = unpackDetections(data);
+        const detail = {
+            success: true,
+            results: results,
+            rule_name: data.rule_name,
+            request_id: data.request_id,
+            image_size: data.image_size,
+            coordinate_space: data.coordinate_space,
+            result_image: data.result_image_data
+                ? URL.createObjectURL(new Blob([data.result_image_data], { type: 'image/jpeg' }))
+                : null
+        };
+        
+        document.dispatchEvent(new CustomEvent('detection:results', { detail: detail }));
+    });
+    
+    // 等待中的检测请求被同一客户端的新请求替换
+    socket.on('detection_dropped', (data) => {
+        console.debug('检测请求已被新请求替换:', data);
+        document.dispatchEvent(new CustomEvent('detection:dropped', { detail: data }));
+    });
+
+    // 服务器等待队列已满，请求被拒绝
+    socket.on('server_busy', (data) => {
+        console.warn('服务器繁忙:', data);
+        document.dispatchEvent(new CustomEvent('detection:busy', { detail: data }));
+        showNotification('服务器繁忙，请稍后重试', 'warning');
+    });
+
+    // 规则通过状态变化事件（视频源或带track_rule的连续检测请求，只在状态变化时发送）
+    socket.on('rule_state', (data) => {
+        console.log('规则状态变化:', data);
+        document.dispatchEvent(new CustomEvent('rule:state', { detail: data }));
+    });
+
     // 检测错误事件
     socket.on('detection_error', (data) => {
         console.error('检测错误:', data.error);
@@ -118,6 +161,88 @@ function performDetection(imagePath, ruleName) {
     return true;
 }
 
+/**
+ * 直接发送图像数据进行检测，不经过上传和磁盘
+ * @param {Blob|ArrayBuffer} imageData - JPEG/PNG编码的图像数据
+ * @param {string} ruleName - 逻辑规则名称（可选）
+ * @param {Object} options - packed为false时使用JSON结果，returnImage为true时返回标注图像
+ */
+function performImageDetection(imageData, ruleName, options = {}) {
+    if (!socket) {
+        showNotification('WebSocket连接未建立，请刷新页面', 'warning');
+        return false;
+    }
+    
+    const detectData = {
+        image: imageData,
+        return_image: Boolean(options.returnImage),
+        request_id: options.requestId
+    };
+    if (ruleName) {
+        detectData.rule_name = ruleName;
+    }
+    if (options.packed !== false) {
+        detectData.protocol = FRAME_PROTOCOL_VERSION;
+    }
+    
+    socket.emit('detect_image', detectData);
+    return true;
+}
+
+/**
+ * 将二进制检测结果解包为与JSON结果相同格式的列表
+ * 数组字段为小端字节序：boxes float32×4、class_ids uint16、scores float16、roi_ids int16(-1表示不在ROI内)
+ * @param {Object} data - detection_packed事件数据
+ * @returns {Array} 检测结果列表
+ */
+function unpackDetections(data) {
+    if (data.classes) {
+        modelClasses[data.model] = data.classes;
+    }
+    const classes = modelClasses[data.model] || [];
+    
+    const boxes = new DataView(data.boxes);
+    const classIds = new DataView(data.class_ids);
+    const scores = new DataView(data.scores);
+    const roiIds = data.roi_ids ? new DataView(data.roi_ids) : null;
+    
+    const results = [];
+    for (let i = 0; i < data.count; i++) {
+        const classId = classIds.getUint16(i * 2, true);
+        const roiId = roiIds ? roiIds.getInt16(i * 2, true) : -1;
+        const detection = {
+            bbox: [0, 1, 2, 3].map(k => boxes.getFloat32((i * 4 + k) * 4, true)),
+            score: float16ToNumber(scores.getUint16(i * 2, true)),
+            class_id: classId,
+            class_name: classes[classId] !== undefined ? classes[classId] : `Unknown-${classId}`,
+            roi_id: roiId >= 0 ? roiId : null
+        };
+        if (roiId >= 0) {
+            detection.roi_config = data.roi_config;
+        }
+        results.push(detection);
+    }
+    return results;
+}
+
+/**
+ * 将IEEE 754半精度浮点数的位模式转换为数值
+ * @param {number} bits - 16位无符号整数
+ * @returns {number} 数值
+ */
+function float16ToNumber(bits) {
+    const sign = bits & 0x8000 ? -1 : 1;
+    const exponent = (bits >> 10) & 0x1f;
+    const fraction = bits & 0x03ff;
+    if (exponent === 0) {
+        return sign * Math.pow(2, -14) * (fraction / 1024);
+    }
+    if (exponent === 0x1f) {
+        return fraction ? NaN : sign * Infinity;
+    }
+    return sign * Math.pow(2, exponent - 15) * (1 + fraction / 1024);
+}
+
 /**
  * 检查检测前置条件
  * @returns {boolean} 是否可以执行检测
@@ -146,6 +271,7 @@ function isModelLoaded() {
 window.DetectionCore = {
     init: initSocketConnection,
     detect: performDetection,
+    detectImage: performImageDetection,
     canDetect: canPerformDetection,
     getCurrentModel: getCurrentModelInfo,
     isModelLoaded: isModelLoaded